@@ -1,38 +1,158 @@
+from __future__ import annotations
+
 import os
 import io
 import sys
 import re
+import glob
+import math
+import time
+import argparse
 import zipfile
-import difflib
 import shutil
 import sqlite3
-import pandas as pd
+import hashlib
+import logging
+import contextlib
+import subprocess
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from docx import Document
+from typing import TYPE_CHECKING
 
 import copy
-import pandas as pd
-from docx.document import Document as _Document
-from docx.table import Table
-from docx.shared import Pt
+# pandas、python-docx、difflib 只在生成报告和查询时用到，在用到的函数里再导入，
+# 只入库时不必付出这部分启动耗时（见 bench 子命令）
+if TYPE_CHECKING:
+    # 只供类型注解使用，运行时不导入
+    import pandas as pd
+    from docx.document import Document as _Document
 
 #import pytz
 
 # === 配置区域 === #
 # ZIP_FILE_PATH = 'data/202504巡检记录.zip'
 EXTRACT_FOLDER = 'output/unzipped_files'
+# 入库方式：'zip' 直接从压缩包逐个读取成员，不落地解压；'extract' 先解压到 EXTRACT_FOLDER 再逐个读取
+INGEST_MODE = 'zip'
+# 文件解析进程数：1 为串行；大于 1 时多进程并行解析，由主进程统一写库（例如 os.cpu_count()）
+PARSE_WORKERS = 1
+# 超过这个大小（字节）的巡检文件不整体读入内存：先分块计算内容哈希，再从文件或压缩包成员流中逐行解析
+STREAM_PARSE_BYTES = 32 * 1024 * 1024
+# 写库事务粒度：'file' 每个文件提交一次（出错只影响该文件）；'run' 整次运行只提交一次
+WRITE_TRANSACTION = 'file'
 DB_PATH = 'db/files_info.db'
+# 数据库默认保留并增量入库（按文件内容哈希跳过未变化的文件）；True 时清空所有表重新入库
+REBUILD_DATABASE = False
+# 历史巡检保留策略：最新一次巡检前 HISTORY_FULL_MONTHS 个月内的批次全部保留，
+# 更早的每个季度只保留最后一次，超过 HISTORY_MAX_MONTHS 个月的删除
+HISTORY_FULL_MONTHS = 12
+HISTORY_MAX_MONTHS = 60
 ZIP_FILE_PATH = None  # 最终结果
 DATA_DIR = 'data'
 TEMPLATE_FILE = os.path.join(DATA_DIR, 'ZH-GBase8a集群-月度巡检报告-模板.docx')
 TEMPLATE_FILE_OUT = Path("output/reports")
 TEMPLATE_FILE_OUT.mkdir(parents=True, exist_ok=True)
-# 全局共享字典
-report_data = {}
+# 报告生成进程数：1 为逐个系统生成；大于 1 时多进程并行生成各系统的报告
+RENDER_WORKERS = 1
+# watch 子命令：没有目录事件时的轮询间隔（秒）；压缩包大小和修改时间保持不变
+# WATCH_SETTLE_SECONDS 秒后才认为上传完成并入库
+WATCH_POLL_SECONDS = 30
+WATCH_SETTLE_SECONDS = 10
+# bench pipeline 的规模（每个系统的计算节点数）和结果库，结果按规模和阶段与上次对比
+BENCH_SIZES = (10, 100, 1000)
+BENCH_DB_PATH = 'db/bench.db'
+# 某阶段耗时比上次多出这个比例时提示性能回退
+BENCH_TOLERANCE = 0.2
+# bench malformed：截断、缺结束标记、超长行等异常巡检文件每个的解析耗时上限（秒），超出时返回非 0
+MALFORMED_PARSE_SECONDS = 1.0
+# --profile 时各阶段的 pstats 文件和内存汇总写到报告目录下的 profile 目录；
+# 汇总中每个阶段列出的自身耗时最多的函数数和新增内存最多的代码行数
+PROFILE_DIR = os.path.join(TEMPLATE_FILE_OUT, 'profile')
+PROFILE_TOP = 8
+# 日志：默认级别（DEBUG 时才输出各项诊断的完整 DataFrame）、run/ingest/report 写入的日志文件和格式；
+# watch/query/bench 的日志直接输出到终端。级别和文件可用 --log-level / --log-file 覆盖
+LOG_LEVEL = 'INFO'
+LOG_FILE = 'output.txt'
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(processName)s %(message)s'
+# ingest 子命令的启动耗时预算（秒，含解释器启动）：bench 子命令按此检查，超出时返回非 0
+INGEST_STARTUP_BUDGET = 0.25
 #shanghai_time = datetime.now(pytz.timezone('Asia/Shanghai')).strftime('%Y-%m-%d %H:%M:%S')
 # === 配置区域结束 === #
 
+# === 日志 === #
+logger = logging.getLogger("inspection")
+_log_queue = None
+_log_listener = None
+
+def setup_logging(level=None, log_file=None):
+    """
+    配置分级日志。各处（包括解析、报告子进程）只把日志记录放进队列，由后台的 QueueListener
+    线程格式化并写入 log_file（为 None 时写到终端），写文件不会阻塞解析、诊断和子进程。
+    """
+    global _log_queue, _log_listener
+    import logging.handlers, multiprocessing
+    stop_logging()
+    if log_file:
+        handler = logging.FileHandler(log_file, mode="w", encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    # 用进程间队列，子进程通过 init_worker_logging 接到同一个队列
+    _log_queue = multiprocessing.Queue()
+    _log_listener = logging.handlers.QueueListener(_log_queue, handler)
+    _log_listener.start()
+    init_worker_logging(_log_queue, level or LOG_LEVEL)
+
+def stop_logging():
+    """停止后台写日志的线程，已入队的日志全部写出后返回"""
+    global _log_queue, _log_listener
+    if _log_listener:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_queue.close()
+        _log_queue = _log_listener = None
+
+def init_worker_logging(log_queue, level):
+    """把本进程的日志接到 log_queue；可作为进程池的 initializer，未配置日志时不做处理"""
+    import logging.handlers
+    if log_queue is None:
+        return
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+def worker_logging_args():
+    """进程池 initializer 所需的日志参数 (队列, 级别)"""
+    return _log_queue, logger.level
+
+@contextlib.contextmanager
+def capture_logs():
+    """
+    暂时把日志收集到内存，with 结束后 yield 出的列表中为已格式化、可跨进程传递的记录；
+    报告子进程用它按系统收集日志，交回主进程后由 replay_logs 按顺序输出。
+    """
+    import logging.handlers, queue
+    records = []
+    buffer = queue.SimpleQueue()
+    saved = logger.handlers, logger.propagate
+    logger.handlers = [logging.handlers.QueueHandler(buffer)]
+    logger.propagate = False
+    try:
+        yield records
+    finally:
+        logger.handlers, logger.propagate = saved
+        while not buffer.empty():
+            records.append(buffer.get())
+
+def replay_logs(records):
+    for record in records:
+        logger.handle(record)
+
+
 def list_zip_files():
     """列出data目录下所有zip文件"""
     if not os.path.isdir(DATA_DIR):
@@ -65,13 +185,16 @@ def manual_input_zip():
         else:
             print("路径无效或不是ZIP文件，请重新输入。")
 
-def confirm_if_not_expected(filename):
-    """文件名不包含‘巡检记录’时，需要用户确认"""
+def confirm_if_not_expected(filename, assume_yes=False):
+    """文件名不包含‘巡检记录’时，需要用户确认；assume_yes 时只提示不询问"""
     if '巡检记录' not in filename:
-        print(f"\n警告：你选择的文件名 “{filename}” 不包含 '巡检记录' 字样。")
-        confirm = input("是否继续使用该文件？请输入 yes 或 y 确认：").strip().lower()
+        logger.warning(f"警告：你选择的文件名 “{filename}” 不包含 '巡检记录' 字样。")
+        if assume_yes:
+            logger.warning("已指定 --yes，继续使用该文件。")
+            return
+        confirm = input(f"文件名 “{filename}” 不包含 '巡检记录' 字样，是否继续使用该文件？请输入 yes 或 y 确认：").strip().lower()
         if confirm not in ['y', 'yes']:
-            print("操作已取消，请重新运行。")
+            logger.error("操作已取消，请重新运行。")
             exit(1)
 
 def get_zip_file_path():
@@ -81,7 +204,7 @@ def get_zip_file_path():
 
     if len(zip_files) == 1:
         chosen = os.path.join(DATA_DIR, zip_files[0])
-        print(f"检测到一个ZIP文件，使用：{chosen}")
+        logger.info(f"检测到一个ZIP文件，使用：{chosen}")
     elif len(zip_files) > 1:
         chosen = choose_from_multiple(zip_files)
     else:
@@ -89,23 +212,70 @@ def get_zip_file_path():
 
     confirm_if_not_expected(os.path.basename(chosen))
     ZIP_FILE_PATH = chosen
-    print(f"\n最终使用的ZIP文件路径：{ZIP_FILE_PATH}")
+    logger.info(f"最终使用的ZIP文件路径：{ZIP_FILE_PATH}")
     return ZIP_FILE_PATH
 
+def expand_archive_args(patterns):
+    """展开命令行给出的压缩包路径和通配符，按给定顺序去重；通配符匹配结果按文件名排序"""
+    archives = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                logger.warning(f"⚠️ 没有匹配的压缩包：{pattern}")
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in archives:
+                archives.append(path)
+    return archives
+
+def resolve_archives(patterns, assume_yes=False):
+    """确定本次要入库的压缩包列表。
+
+    命令行给出路径/通配符时不再交互；未给出时，assume_yes 下使用 data 目录中的
+    全部压缩包，否则沿用原来的交互选择。
+    """
+    global ZIP_FILE_PATH
+    if not patterns and not assume_yes:
+        return [get_zip_file_path()]
+
+    if patterns:
+        archives = expand_archive_args(patterns)
+    else:
+        archives = [os.path.join(DATA_DIR, name) for name in sorted(list_zip_files())]
+
+    if not archives:
+        logger.error("❌ 没有找到需要处理的压缩包")
+        exit(1)
+    for path in archives:
+        if not (os.path.isfile(path) and path.lower().endswith('.zip')):
+            logger.error(f"❌ 路径无效或不是ZIP文件：{path}")
+            exit(1)
+        confirm_if_not_expected(os.path.basename(path), assume_yes)
+
+    ZIP_FILE_PATH = archives[-1]
+    logger.info(f"本次处理 {len(archives)} 个ZIP文件：")
+    for path in archives:
+        logger.info(f"  {path}")
+    return archives
+
 def initialize_project_directories():
     """初始化项目所需的目录结构，如果不存在则创建。"""
     paths_to_create = [
         os.path.dirname(ZIP_FILE_PATH) if ZIP_FILE_PATH else DATA_DIR,
-        EXTRACT_FOLDER,
         os.path.dirname(DB_PATH)
     ]
+    # 流式读取压缩包时不需要解压目录
+    if INGEST_MODE == 'extract':
+        paths_to_create.append(EXTRACT_FOLDER)
 
     for path in paths_to_create:
         if path and not os.path.exists(path):
             os.makedirs(path, exist_ok=True)
-            print(f"已创建目录：{path}")
+            logger.info(f"已创建目录：{path}")
         else:
-            print(f"目录已存在：{path}")
+            logger.info(f"目录已存在：{path}")
 
 def clear_folder(folder_path):
     """删除文件夹内所有内容，但保留文件夹本身"""
@@ -127,14 +297,26 @@ def extract_zip(zip_path, extract_to):
 
     # 判断目标文件夹是否为空，不空则清空
     if os.listdir(extract_to):
-        print(f"[!] 目标文件夹 {extract_to} 非空，正在清空...")
+        logger.warning(f"[!] 目标文件夹 {extract_to} 非空，正在清空...")
         clear_folder(extract_to)
 
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
         zip_ref.extractall(extract_to)
     
-    print(f"[✓] 解压完成，文件解压到：{extract_to}")
+    logger.info(f"[✓] 解压完成，文件解压到：{extract_to}")
+
+
+def list_zip_members(zip_path):
+    """列出压缩包内所有文件成员（跳过目录），不解压"""
+    if not os.path.exists(zip_path):
+        raise FileNotFoundError(f"找不到压缩包: {zip_path}")
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        return [info.filename for info in zip_ref.infolist() if not info.is_dir()]
 
+def decode_report(data):
+    """按 utf-8 解码并统一换行符（与文本模式 open 读取的结果一致）"""
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
 
 def get_all_files(root_folder):
     """获取解压后的所有文件路径（相对路径）"""
@@ -149,23 +331,151 @@ def extract_system_name(filename):
     """从文件名中提取 system_name（__ 前面的部分）"""
     return filename.split("__")[0] if "__" in filename else ""
 
-def init_database(db_path):
-    """初始化 SQLite 数据库和表结构"""
+# === 数值规范化 === #
+# 容量单位按 1024 进位，兼容 free/df/du -h 输出的 K/M/G/T/P 以及 Gi、GB、0B 写法
+SIZE_UNITS = {'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([BKMGTP]?)(?:i?B|i)?\s*$', re.IGNORECASE)
+# 参数值只认纯数字和 K/M/G/T/P 加可选 B 的写法，10B、1Gi 之类不换算，参数诊断结果与原来一致
+PARAM_VALUE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)(?:\s*([KMGTP])B?)?\s*$', re.IGNORECASE)
+
+def convert_size(value, pattern, default_unit='B'):
+    """按 pattern 取出数值和单位并换算为字节，无法转换返回 None"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    match = pattern.match(str(value))
+    if not match:
+        return None
+    unit = (match.group(2) or default_unit).upper()
+    return float(match.group(1)) * SIZE_UNITS[unit]
+
+def parse_size(text, default_unit='B'):
+    """把 '31G'、'731M'、'4.0K'、'0B'、'15Gi' 等换算为字节数，没有单位时按 default_unit，无法解析返回 None"""
+    value = convert_size(text, SIZE_RE, default_unit)
+    return None if value is None else int(round(value))
+
+def smart_convert(value, default_unit='B'):
+    """
+    智能转换为数值（单位转字节），无法转换返回 None。
+    普通数字按 default_unit 换算，默认即原值；用于参数值这类可能带小数的场合，按 PARAM_VALUE_RE 解析。
+    """
+    return convert_size(value, PARAM_VALUE_RE, default_unit)
+
+def parse_size_series(values, default_unit='B', pattern=SIZE_RE):
+    """
+    convert_size 的整列版本：一次 str.extract 取出数值和单位，查表换算为字节，
+    无法解析的为 NaN。诊断环节统一用它换算 du/df 里的容量字符串，参数值传入 PARAM_VALUE_RE。
+    """
+    import pandas as pd
+    values = pd.Series(values, dtype=object)
+    parts = values.astype(str).str.extract(pattern.pattern, flags=re.IGNORECASE)
+    units = parts[1].fillna("").str.upper().replace("", default_unit)
+    return pd.to_numeric(parts[0], errors="coerce") * units.map(SIZE_UNITS).astype(float)
+
+def parse_kb(text):
+    """巡检文本中的集群空间汇总值以 KB 为单位"""
+    return parse_size(text, 'K')
+
+def parse_percent(text):
+    """把 '41%' 转为 41.0，无法解析返回 None"""
+    if text is None:
+        return None
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*%?\s*$', str(text))
+    return float(match.group(1)) if match else None
+
+# 与原始字符串并存的类型化数值列：(列名, 类型, 由原始列计算的 SQL 表达式)。
+# 入库时由提取函数直接写入，这里的表达式用于旧库迁移时回填
+TYPED_COLUMNS = {
+    "machine_using": [
+        ("mem_total_bytes", "INTEGER", "size_bytes(mem_total)"),
+        ("mem_used_bytes", "INTEGER", "size_bytes(mem_used)"),
+        ("mem_free_bytes", "INTEGER", "size_bytes(mem_free)"),
+        ("mem_shared_bytes", "INTEGER", "size_bytes(msm_shared)"),
+        ("mem_buff_cache_bytes", "INTEGER", "size_bytes(mem_buff_cache)"),
+        ("mem_available_bytes", "INTEGER", "size_bytes(mem_available)"),
+        ("swap_total_bytes", "INTEGER", "size_bytes(swap_total)"),
+        ("swap_used_bytes", "INTEGER", "size_bytes(swap_used)"),
+        ("swap_free_bytes", "INTEGER", "size_bytes(swap_free)"),
+        ("disk_size_bytes", "INTEGER", "size_bytes(disk_size)"),
+        ("disk_used_bytes", "INTEGER", "size_bytes(disk_used)"),
+        ("disk_avail_bytes", "INTEGER", "size_bytes(disk_avail)"),
+        ("disk_use_pct", "REAL", "percent(disk_use_per)"),
+    ],
+    "clusters_disk_using": [
+        ("disk_total_bytes", "INTEGER", "kb_bytes(disk_total)"),
+        ("disk_used_bytes", "INTEGER", "kb_bytes(disk_used)"),
+        ("disk_avail_bytes", "INTEGER", "kb_bytes(disk_avail)"),
+        ("disk_use_pct", "REAL", "percent(disk_use_per)"),
+    ],
+    "clusters_logs": [
+        ("log_used_bytes", "INTEGER", "size_bytes(log_used)"),
+    ],
+    "cluster_variables": [
+        ("var_reference_value", "REAL", "smart_value(var_reference)"),
+        ("var_actual_value", "REAL", "smart_value(var_actual)"),
+    ],
+}
+
+def add_typed_columns(conn):
+    """给第 2 版的旧库补上类型化数值列，并用入库时相同的解析函数回填"""
+    conn.create_function("size_bytes", 1, parse_size, deterministic=True)
+    conn.create_function("kb_bytes", 1, parse_kb, deterministic=True)
+    conn.create_function("percent", 1, parse_percent, deterministic=True)
+    conn.create_function("smart_value", 1, smart_convert, deterministic=True)
+    for table, columns in TYPED_COLUMNS.items():
+        for column, column_type, _ in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        assignments = ", ".join(f"{column} = {expr}" for column, _, expr in columns)
+        conn.execute(f"UPDATE {table} SET {assignments}")
+    logger.info("[✓] 已为旧数据库补充数值列")
+
+# 数据库表结构版本，表结构变化时递增；第 2 版之前的旧库会被重建，之后的版本就地迁移
+SCHEMA_VERSION = 3
+# 存放解析结果的事实表，每行通过 run_id 归属到一次巡检
+FACT_TABLES = [
+    "machines",
+    "machine_using",
+    "clusters_disk_using",
+    "clusters_process",
+    "clusters_logs",
+    "auto_start",
+    "cluster_variables",
+    "data_clusters",
+    "instances",
+    "sys_clusters",
+]
+
+# 报告查询路径上的复合索引。run_id 已唯一确定系统和巡检日期，放在最前面做等值过滤，
+# 随后是 cluster_name（coor / 计算集群）和关联用的 ip_address
+FACT_INDEXES = {
+    "machines": "run_id, cluster_name, ip_address",
+    "machine_using": "run_id, cluster_name, ip_address",
+    "clusters_disk_using": "run_id, cluster_name",
+    "clusters_process": "run_id, cluster_name, ip_address",
+    "clusters_logs": "run_id, cluster_name, ip_address",
+    "auto_start": "run_id, cluster_name, ip_address",
+    "cluster_variables": "run_id, cluster_name, ip_address",
+    "data_clusters": "run_id, cluster_name",
+    "instances": "run_id, cluster_name, ip_address",
+    "sys_clusters": "run_id",
+}
+
+def init_database(db_path, rebuild=None):
+    """初始化 SQLite 数据库和表结构。
+
+    已有数据默认保留，用于增量入库；rebuild=True 或表结构版本过旧时删除旧表重建。
+    """
+    rebuild = REBUILD_DATABASE if rebuild is None else rebuild
     conn = sqlite3.connect(db_path)
 
     cursor = conn.cursor()
-    # 删除旧表（如果存在）
-    cursor.execute("DROP TABLE IF EXISTS files")
-    cursor.execute("DROP TABLE IF EXISTS machines")
-    cursor.execute("DROP TABLE IF EXISTS machine_using")
-    cursor.execute("DROP TABLE IF EXISTS clusters_disk_using")
-    cursor.execute("DROP TABLE IF EXISTS clusters_process")
-    cursor.execute("DROP TABLE IF EXISTS clusters_logs")
-    cursor.execute("DROP TABLE IF EXISTS auto_start")
-    cursor.execute("DROP TABLE IF EXISTS cluster_variables")
-    cursor.execute("DROP TABLE IF EXISTS data_clusters")
-    cursor.execute("DROP TABLE IF EXISTS instances")
-    cursor.execute("DROP TABLE IF EXISTS sys_clusters")
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if rebuild or version < 2:
+        # 删除旧表（如果存在）
+        cursor.execute("DROP VIEW IF EXISTS current_runs")
+        for table in ["files", "inspection_runs"] + FACT_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        # 重建后的表已是最新结构，不再执行后面的就地迁移
+        version = SCHEMA_VERSION
 
     # 文件记录表
     cursor.execute('''
@@ -174,14 +484,44 @@ def init_database(db_path):
             system_name TEXT,
             filename TEXT NOT NULL,
             fullpath TEXT NOT NULL,
+            archive TEXT,
+            content_hash TEXT,
+            size INTEGER,
             imported_at TEXT DEFAULT (datetime('now', 'localtime'))
         )
     ''')
 
+    # 各阶段耗时记录表：与巡检数据无关，重建数据库时保留
+    cursor.execute(STAGE_METRICS_TABLE_SQL)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_metrics_key ON stage_metrics(stage, system_name)")
+
+    # 巡检批次表：同一系统同一巡检日期为一个批次，所有事实表通过 run_id 引用
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inspection_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            system_name TEXT NOT NULL,
+            inspection_date TEXT NOT NULL,
+            archive TEXT,
+            file_id INTEGER,
+            imported_at TEXT DEFAULT (datetime('now', 'localtime')),
+            UNIQUE(system_name, inspection_date)
+        )
+    ''')
+
+    # 每个系统最新一次巡检，报告只读取该批次的数据
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS current_runs AS
+        SELECT r.* FROM inspection_runs r
+        WHERE r.inspection_date = (
+            SELECT MAX(inspection_date) FROM inspection_runs WHERE system_name = r.system_name
+        )
+    ''')
+
     # 机器信息表
     cursor.execute('''
-        CREATE TABLE machines (
+        CREATE TABLE IF NOT EXISTS machines (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT NOT NULL,
@@ -192,14 +532,15 @@ def init_database(db_path):
             cpu_physical_core INTEGER,
             serverip_list TEXT,
             notes TEXT,
-            UNIQUE(system_name,ip_address)
+            UNIQUE(run_id,ip_address)
         );
     ''')
 
     # 机器资源使用表
     cursor.execute('''
-        CREATE TABLE machine_using (
+        CREATE TABLE IF NOT EXISTS machine_using (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT NOT NULL,
@@ -218,29 +559,48 @@ def init_database(db_path):
             disk_avail TEXT,
             disk_use_per TEXT,
             disk_mounted TEXT,
+            mem_total_bytes INTEGER,
+            mem_used_bytes INTEGER,
+            mem_free_bytes INTEGER,
+            mem_shared_bytes INTEGER,
+            mem_buff_cache_bytes INTEGER,
+            mem_available_bytes INTEGER,
+            swap_total_bytes INTEGER,
+            swap_used_bytes INTEGER,
+            swap_free_bytes INTEGER,
+            disk_size_bytes INTEGER,
+            disk_used_bytes INTEGER,
+            disk_avail_bytes INTEGER,
+            disk_use_pct REAL,
             notes TEXT,
-            UNIQUE(system_name,ip_address)
+            UNIQUE(run_id,ip_address)
         );
     ''')
 
     # 集群磁盘资源使用表
     cursor.execute('''
-        CREATE TABLE clusters_disk_using (
+        CREATE TABLE IF NOT EXISTS clusters_disk_using (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             disk_total TEXT,
             disk_used TEXT,
             disk_avail TEXT,
             disk_use_per TEXT,
+            disk_total_bytes INTEGER,
+            disk_used_bytes INTEGER,
+            disk_avail_bytes INTEGER,
+            disk_use_pct REAL,
             notes TEXT
         );
     ''')
 
     # 集群进程表
     cursor.execute('''
-        CREATE TABLE clusters_process (
+        CREATE TABLE IF NOT EXISTS clusters_process (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT,
@@ -251,21 +611,24 @@ def init_database(db_path):
 
     # 集群进程表
     cursor.execute('''
-        CREATE TABLE clusters_logs (
+        CREATE TABLE IF NOT EXISTS clusters_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT,
             log_used TEXT,
             log_path TEXT,
+            log_used_bytes INTEGER,
             notes TEXT
         );
     ''')
 
     # 集群进程表
     cursor.execute('''
-        CREATE TABLE auto_start (
+        CREATE TABLE IF NOT EXISTS auto_start (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT,
@@ -276,8 +639,9 @@ def init_database(db_path):
 
     # 集群参数表
     cursor.execute('''
-        CREATE TABLE cluster_variables (
+        CREATE TABLE IF NOT EXISTS cluster_variables (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             ip_address TEXT,
@@ -285,14 +649,17 @@ def init_database(db_path):
             var_reference TEXT,
             config_file TEXT,
             var_actual TEXT,
+            var_reference_value REAL,
+            var_actual_value REAL,
             notes TEXT
         );
     ''')
 
     # 计算集群信息表
     cursor.execute('''
-        CREATE TABLE data_clusters (
+        CREATE TABLE IF NOT EXISTS data_clusters (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             cluster_state TEXT,
@@ -311,8 +678,9 @@ def init_database(db_path):
 
     # 实例表
     cursor.execute('''
-        CREATE TABLE instances (
+        CREATE TABLE IF NOT EXISTS instances (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             cluster_name TEXT NOT NULL,
             namenode TEXT,
@@ -328,8 +696,9 @@ def init_database(db_path):
 
     # 系统信息表
     cursor.execute('''
-        CREATE TABLE sys_clusters (
+        CREATE TABLE IF NOT EXISTS sys_clusters (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES inspection_runs(run_id),
             system_name TEXT NOT NULL,
             ma_one_ip TEXT,
             gbase_version TEXT,
@@ -339,153 +708,955 @@ def init_database(db_path):
         );
     ''')
 
+    if version == 2:
+        add_typed_columns(conn)
+
+    for table, columns in FACT_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_key ON {table}({columns})")
+
+    # 清理上次中断时还未处理完的文件记录
+    cursor.execute("DELETE FROM files WHERE content_hash IS NULL")
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    conn.commit()
+    conn.close()
+    logger.info("[✓] 数据库初始化完成")
+
+
+# === 阶段耗时记录 === #
+STAGE_METRICS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS stage_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recorded_at TEXT DEFAULT (datetime('now', 'localtime')),
+        stage TEXT NOT NULL,
+        system_name TEXT,
+        filename TEXT,
+        run_id INTEGER,
+        seconds REAL NOT NULL,
+        rows INTEGER,
+        bytes INTEGER
+    )
+'''
+
+class StageMetrics:
+    """收集一个文件或一个系统各阶段的耗时、数据行数和字节数。
+
+    只在内存中记录，不访问数据库，可以随解析或报告结果从子进程交回主进程，
+    再由 save_stage_metrics 或写库会话统一写入 stage_metrics 表。系统名、
+    run_id 往往在阶段执行后才知道，写入时统一补到每条记录上。
+    """
+
+    def __init__(self, system_name=None, filename=None):
+        self.system_name = system_name
+        self.filename = filename
+        self.run_id = None
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None, bytes=None):
+        """计时一个阶段；行数、字节数可在 with 块中写入 yield 出的 dict。开启 --profile 时同时剖析该阶段"""
+        counts = {"rows": rows, "bytes": bytes}
+        owner = self.system_name or self.filename or "run"
+        profiling = _profiler.profile(owner, name) if _profiler else contextlib.nullcontext()
+        started = time.perf_counter()
+        try:
+            with profiling:
+                yield counts
+        finally:
+            self.records.append((name, time.perf_counter() - started, counts["rows"], counts["bytes"]))
+
+    def rows(self):
+        return [(name, self.system_name, self.filename, self.run_id, seconds, rows, size)
+                for name, seconds, rows, size in self.records]
+
+class StageProfiler:
+    """
+    --profile 模式：StageMetrics 的每个阶段再用 cProfile 和 tracemalloc 剖析。
+
+    每个阶段在 out_dir/<系统名或文件名>/ 下写一个 pstats 文件（可用 python -m pstats 或
+    snakeviz 查看），并在同目录的 profile.txt 追加该阶段的耗时、内存峰值增长、自身耗时最多的
+    函数和新增内存最多的代码行。每个阶段开始时清空 tracemalloc 的记录，只取阶段结束时的快照，
+    避免对全部已分配内存反复做快照比较。
+
+    阶段嵌套时（如 parse 与各提取函数）外层暂停剖析，内层结束后恢复：外层的 pstats 只含
+    它自己的部分；内存峰值和新增量包含内层，新增内存的代码行只统计最后一个内层之后的部分。
+    """
+
+    def __init__(self, out_dir):
+        import tracemalloc
+        self.out_dir = out_dir
+        self.stack = []
+        self.count = 0
+        tracemalloc.start()
+
+    def close(self):
+        import tracemalloc
+        tracemalloc.stop()
+
+    @staticmethod
+    def restart_tracing():
+        import tracemalloc
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def profile(self, owner, stage):
+        import cProfile, tracemalloc
+        if self.stack:
+            outer = self.stack[-1]
+            outer["profile"].disable()
+            current, peak = tracemalloc.get_traced_memory()
+            outer["peak"] = max(outer["peak"], outer["retained"] + peak)
+            outer["retained"] += current
+        self.count += 1
+        # retained：之前各段（被清空前）留下的内存；peak：阶段内相对开始时的内存峰值
+        frame = {"profile": cProfile.Profile(), "peak": 0, "retained": 0, "seq": self.count}
+        self.stack.append(frame)
+        self.restart_tracing()
+        started = time.perf_counter()
+        frame["profile"].enable()
+        try:
+            yield
+        finally:
+            frame["profile"].disable()
+            seconds = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            frame["peak"] = max(frame["peak"], frame["retained"] + peak)
+            frame["retained"] += current
+            self.stack.pop()
+            self.write(owner, stage, frame, seconds, tracemalloc.take_snapshot())
+            if self.stack:
+                outer = self.stack[-1]
+                outer["peak"] = max(outer["peak"], outer["retained"] + frame["peak"])
+                outer["retained"] += frame["retained"]
+                self.restart_tracing()
+                outer["profile"].enable()
+
+    def write(self, owner, stage, frame, seconds, snapshot):
+        import pstats, tracemalloc
+        folder = os.path.join(self.out_dir, re.sub(r'[\\/:*?"<>|]', '_', owner))
+        os.makedirs(folder, exist_ok=True)
+        pstats_path = os.path.join(folder, f"{frame['seq']:04d}-{stage}.pstats")
+        frame["profile"].dump_stats(pstats_path)
+
+        stats = pstats.Stats(frame["profile"]).stats
+        hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:PROFILE_TOP]
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        allocations = snapshot.statistics('lineno')[:PROFILE_TOP]
+
+        lines = [f"[{frame['seq']:04d}] {stage}  {seconds:.4f}s  内存峰值 +{frame['peak'] / 1024:.0f} KiB  "
+                 f"结束时新增 {frame['retained'] / 1024:.0f} KiB  -> {os.path.basename(pstats_path)}",
+                 "  自身耗时最多的函数："]
+        for (path, lineno, func), (_, calls, tottime, cumtime, _) in hottest:
+            lines.append(f"    {tottime:9.4f}s  累计 {cumtime:9.4f}s  {calls:>7} 次  {func} ({os.path.basename(path)}:{lineno})")
+        lines.append("  新增内存最多的代码行：")
+        for stat in allocations:
+            where = stat.traceback[0]
+            lines.append(f"    {stat.size / 1024:9.1f} KiB  {stat.count:>7} 块  {where.filename}:{where.lineno}")
+        with open(os.path.join(folder, "profile.txt"), "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n\n")
+
+_profiler = None
+
+def enable_profiling(out_dir=None):
+    """开启 --profile 模式，清空上次的剖析结果"""
+    global _profiler
+    out_dir = out_dir or PROFILE_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    clear_folder(out_dir)
+    _profiler = StageProfiler(out_dir)
+    return _profiler
+
+def disable_profiling():
+    global _profiler
+    if _profiler:
+        _profiler.close()
+        _profiler = None
+
+def insert_stage_metrics(cursor, metrics_list):
+    cursor.executemany(
+        "INSERT INTO stage_metrics (stage, system_name, filename, run_id, seconds, rows, bytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [row for metrics in metrics_list for row in metrics.rows()])
+
+def save_stage_metrics(db_path, metrics_list):
+    """把若干 StageMetrics 的记录写入 stage_metrics 表（表不存在时先创建）"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(STAGE_METRICS_TABLE_SQL)
+    insert_stage_metrics(cursor, metrics_list)
     conn.commit()
     conn.close()
-    print("[✓] 数据库初始化完成")
 
 
 def insert_files_to_db(db_path, file_list, extract_root):
-    """将文件路径插入数据库"""
+    """将文件路径插入数据库，返回新文件记录的 id 列表"""
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
+    file_ids = []
     for file in file_list:
         full_path = os.path.join(extract_root, file)
         system_name = extract_system_name(file)
         cursor.execute("INSERT INTO files (system_name, filename, fullpath) VALUES (?, ?, ?)", (system_name, file, full_path))
+        file_ids.append(cursor.lastrowid)
 
     conn.commit()
     conn.close()
-    print(f"[✓] 成功写入 {len(file_list)} 个文件记录到数据库")
+    logger.info(f"[✓] 成功写入 {len(file_list)} 个文件记录到数据库")
+    return file_ids
+
+def register_archive(db_path, zip_path, extract_to):
+    """
+    把一个压缩包中的文件登记到 files 表，extract 方式下先解压到 extract_to；登记耗时记入 stage_metrics。
+    返回登记的文件记录 id 列表。
+    """
+    metrics = StageMetrics(filename=os.path.basename(zip_path))
+    with metrics.stage("register", bytes=os.path.getsize(zip_path)) as counts:
+        if INGEST_MODE == 'zip':
+            file_ids = insert_zip_members_to_db(db_path, zip_path)
+        else:
+            with metrics.stage("extract_zip", bytes=counts["bytes"]):
+                extract_zip(zip_path, extract_to)
+            file_ids = insert_files_to_db(db_path, get_all_files(extract_to), extract_to)
+        counts["rows"] = len(file_ids)
+    save_stage_metrics(db_path, [metrics])
+    return file_ids
+
+def insert_zip_members_to_db(db_path, zip_path):
+    """将压缩包内的成员记录插入数据库：archive 为压缩包路径，filename 为成员名；返回新文件记录的 id 列表"""
+    members = list_zip_members(zip_path)
 
-def process_each_file_from_db(db_path):
-    """从 files 表中读取每个 fullpath，并逐个处理文件"""
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT id, filename, fullpath FROM files")
-    rows = cursor.fetchall()
+    file_ids = []
+    for member in members:
+        full_path = os.path.join(zip_path, member)
+        system_name = extract_system_name(member)
+        cursor.execute("INSERT INTO files (system_name, filename, fullpath, archive) VALUES (?, ?, ?, ?)", (system_name, member, full_path, zip_path))
+        file_ids.append(cursor.lastrowid)
 
-    for row in rows:
-        file_id, filename, fullpath = row
+    conn.commit()
+    conn.close()
+    logger.info(f"[✓] 成功写入压缩包 {zip_path} 中 {len(members)} 个文件记录到数据库")
+    return file_ids
 
-        # 这里是你要对每个文件执行的操作
-        try:
-            with open(fullpath, 'r', encoding='utf-8') as f:
-                print(f"[{file_id}] 读取文件 {filename} 成功：{fullpath}, ")
-                # 你可以在这里做进一步分析
-                operating_file(fullpath)
-                
+class RowBatch:
+    """按顺序记录待执行的 SQL 和数据行，接口与 cursor.executemany 一致。
 
+    解析函数只往 RowBatch 里写，不碰数据库，因此可以在子进程里解析，
+    再把整批数据交回主进程按原顺序写库。相邻的同一条 SQL 合并为一次
+    executemany，减少语句执行次数。
 
-        except FileNotFoundError:
-            print(f"[{file_id}] ❌ 文件不存在：{fullpath}")
-        except Exception as e:
-            print(f"[{file_id}] ⚠️ 处理异常：{e}")
+    解析时还不知道巡检批次，约定每条 SQL 的最后一个参数是 run_id，
+    由 apply 在写库时补到每行末尾。
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def executemany(self, sql, rows):
+        rows = [tuple(row) for row in rows]
+        if self.statements and self.statements[-1][0] == sql:
+            self.statements[-1][1].extend(rows)
+        else:
+            self.statements.append((sql, rows))
+
+    def mark(self):
+        """记录当前位置，配合 rollback_to 丢弃之后追加的数据"""
+        if not self.statements:
+            return 0, 0
+        return len(self.statements), len(self.statements[-1][1])
+
+    def rollback_to(self, mark):
+        count, last_rows = mark
+        del self.statements[count:]
+        if count:
+            del self.statements[-1][1][last_rows:]
+
+    def apply(self, cursor, run_id):
+        for sql, rows in self.statements:
+            if rows:
+                cursor.executemany(sql, [row + (run_id,) for row in rows])
+
+    def row_count(self):
+        return sum(len(rows) for _, rows in self.statements)
+
+class WriteSession:
+    """写库会话：整次入库只打开一个连接，所有文件的 RowBatch 都经它写入。
+
+    granularity='file' 时每个文件一个事务；'run' 时整次运行一个事务，
+    close() 时统一提交。无论哪种粒度，每个文件都在 isolate() 的保存点里写入，
+    某个文件写入失败只回滚这个文件。
+    """
+
+    def __init__(self, db_path, granularity=None):
+        self.granularity = granularity or WRITE_TRANSACTION
+        if self.granularity not in ('file', 'run'):
+            raise ValueError(f"不支持的事务粒度: {self.granularity}")
+        self.conn = sqlite3.connect(db_path)
+        # WAL + NORMAL：提交时不再每次都强制刷盘，入库不受 fsync 延迟限制
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.cursor = self.conn.cursor()
+        # 本会话各文件的 StageMetrics，由 flush_metrics 写入
+        self.metrics = []
+
+    def write(self, batch, run_id):
+        batch.apply(self.cursor, run_id)
+
+    @contextlib.contextmanager
+    def isolate(self):
+        """单个文件的写入放在保存点里：出错时回滚到保存点并抛出异常，不影响其他文件"""
+        if not self.conn.in_transaction:
+            # 先开事务，保存点嵌套在事务里，释放保存点时不会提前提交
+            self.cursor.execute("BEGIN")
+        self.cursor.execute("SAVEPOINT write_file")
+        try:
+            yield
+        except BaseException:
+            self.cursor.execute("ROLLBACK TO write_file")
+            self.cursor.execute("RELEASE write_file")
+            raise
+        self.cursor.execute("RELEASE write_file")
+        if self.granularity == 'file':
+            self.conn.commit()
+
+    def ingested_files(self):
+        """已成功入库的 (文件名, 内容哈希)；文件名带巡检日期，内容相同但日期不同的仍算新巡检"""
+        self.cursor.execute("SELECT filename, content_hash FROM files WHERE content_hash IS NOT NULL")
+        return set(self.cursor.fetchall())
+
+    def begin_run(self, file_id, system_name, inspection_date):
+        """取得该系统该巡检日期的批次 run_id。
+
+        批次已存在（同一次巡检的文件内容有变化）时删除旧数据和旧文件记录后复用，
+        否则新建批次，历史批次保持不变。
+        """
+        self.cursor.execute(
+            "SELECT run_id, file_id FROM inspection_runs WHERE system_name = ? AND inspection_date = ?",
+            (system_name, inspection_date))
+        row = self.cursor.fetchone()
+        if row is None:
+            self.cursor.execute(
+                "INSERT INTO inspection_runs (system_name, inspection_date, archive, file_id) "
+                "VALUES (?, ?, (SELECT archive FROM files WHERE id = ?), ?)",
+                (system_name, inspection_date, file_id, file_id))
+            return self.cursor.lastrowid
+
+        run_id, old_file_id = row
+        for table in FACT_TABLES:
+            self.cursor.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+        if old_file_id is not None and old_file_id != file_id:
+            self.cursor.execute("DELETE FROM files WHERE id = ?", (old_file_id,))
+        self.cursor.execute(
+            "UPDATE inspection_runs SET archive = (SELECT archive FROM files WHERE id = ?), file_id = ?, "
+            "imported_at = datetime('now', 'localtime') WHERE run_id = ?",
+            (file_id, file_id, run_id))
+        return run_id
+
+    def flush_metrics(self):
+        insert_stage_metrics(self.cursor, self.metrics)
+        self.metrics.clear()
+
+    def finish_file(self, file_id, content_hash, size):
+        """记录文件内容哈希和大小；content_hash 为 None 表示需要下次重新解析"""
+        self.cursor.execute("UPDATE files SET content_hash = ?, size = ? WHERE id = ?", (content_hash, size, file_id))
+
+    def drop_file(self, file_id):
+        self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        if self.granularity == 'file':
+            self.conn.commit()
+
+    def drop_unfinished(self, file_ids):
+        """删除其中还没有内容哈希的文件记录（处理中断或失败的），返回删除的条数"""
+        self.cursor.executemany("DELETE FROM files WHERE id = ? AND content_hash IS NULL", [(i,) for i in file_ids])
+        count = self.cursor.rowcount
+        self.conn.commit()
+        return count
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.conn.rollback()
+        self.close()
+
+def prune_inspection_runs(db_path, full_months=None, max_months=None):
+    """按保留策略删除过期或被降采样的巡检批次及其数据，返回删除的批次数"""
+    full_months = HISTORY_FULL_MONTHS if full_months is None else full_months
+    max_months = HISTORY_MAX_MONTHS if max_months is None else max_months
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        WITH ranked AS (
+            SELECT run_id, inspection_date,
+                   MAX(inspection_date) OVER (PARTITION BY system_name) AS newest,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY system_name, strftime('%Y', inspection_date),
+                                    (CAST(strftime('%m', inspection_date) AS INTEGER) + 2) / 3
+                       ORDER BY inspection_date DESC
+                   ) AS quarter_rank
+            FROM inspection_runs
+        )
+        SELECT run_id FROM ranked
+        WHERE inspection_date < date(newest, ?)
+          AND (quarter_rank > 1 OR inspection_date < date(newest, ?))
+    """, (f"-{full_months} months", f"-{max_months} months"))
+    run_ids = cursor.fetchall()
+
+    if run_ids:
+        for table in FACT_TABLES + ["inspection_runs"]:
+            cursor.executemany(f"DELETE FROM {table} WHERE run_id = ?", run_ids)
+        conn.commit()
+        # 文件记录保留，已入库过的旧压缩包再次出现时仍按哈希跳过
+        cursor.execute("VACUUM")
+        logger.info(f"[✓] 按保留策略清理 {len(run_ids)} 个历史巡检批次")
 
     conn.close()
+    return len(run_ids)
 
-# ====== 文件内容处理函数 ====== #
-def read_file(file_path):
-    # 读取文件内容
-    with open(file_path, 'r', encoding="utf-8") as file:
-        #return file.readlines()
-        return file.read()
+def query_system_trend(system_name, db_path):
+    """按巡检日期列出某个系统的历史指标，一条 SQL 读出所有批次"""
+    import pandas as pd
+    sql = """
+    select r.inspection_date, r.archive,
+           (select count(*) from machines m where m.run_id = r.run_id) as nodes,
+           (select sum(disk_total_bytes) from clusters_disk_using d where d.run_id = r.run_id and d.cluster_name <> 'coor') as disk_total_bytes,
+           (select sum(disk_used_bytes) from clusters_disk_using d where d.run_id = r.run_id and d.cluster_name <> 'coor') as disk_used_bytes,
+           (select sum(tables_count) from data_clusters dc where dc.run_id = r.run_id) as tables_count,
+           (select gbase_version from sys_clusters sc where sc.run_id = r.run_id) as gbase_version
+    from inspection_runs r
+    where r.system_name = ?
+    order by r.inspection_date
+    """
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(sql, conn, params=(system_name,))
+    conn.close()
+    return df
+
+_zip_refs = {}
+
+def open_zip_cached(zip_path):
+    if zip_path not in _zip_refs:
+        _zip_refs[zip_path] = zipfile.ZipFile(zip_path, 'r')
+    return _zip_refs[zip_path]
+
+def close_cached_zips():
+    for zip_ref in _zip_refs.values():
+        zip_ref.close()
+    _zip_refs.clear()
 
-def extract_blocks(text, pattern):
-    # 使用 re.findall 查找匹配项
-    match = re.search(pattern, text, re.DOTALL | re.MULTILINE)
-    return match.group(1).strip() if match else None
+# 解析结果：status 为 'parsed' / 'unchanged' / 'not_found'
+ParsedFile = namedtuple('ParsedFile', 'file_id filename fullpath status content_hash size system_name inspection_date batch error metrics')
 
+# 子进程中可见的已入库文件，用于提前跳过未变化的文件
+_known_files = set()
+
+def set_known_files(files):
+    global _known_files
+    _known_files = set(files)
+
+def init_parse_worker(files, log_queue, log_level):
+    set_known_files(files)
+    init_worker_logging(log_queue, log_level)
+
+def parse_inspection_date(filename):
+    """从文件名中提取巡检日期（YYYY-MM-DD），没有日期时按入库当天计"""
+    match = re.search(r'\d{4}-\d{2}-\d{2}', filename)
+    return match.group(0) if match else datetime.now().strftime('%Y-%m-%d')
+
+def read_source_bytes(filename, fullpath, archive):
+    """读取文件原始内容：压缩包成员或磁盘文件"""
+    if archive:
+        return open_zip_cached(archive).read(filename)
+    with open(fullpath, 'rb') as f:
+        return f.read()
+
+def source_size(filename, fullpath, archive):
+    """文件原始大小，压缩包成员取目录中记录的解压后大小，不读取内容"""
+    if archive:
+        return open_zip_cached(archive).getinfo(filename).file_size
+    return os.path.getsize(fullpath)
+
+def open_source(filename, fullpath, archive):
+    """以二进制流打开文件，压缩包成员边读边解压"""
+    if archive:
+        return open_zip_cached(archive).open(filename)
+    return open(fullpath, 'rb')
+
+def hash_source(filename, fullpath, archive, chunk_size=1024 * 1024):
+    """分块计算文件的内容哈希，返回 (哈希, 字节数)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open_source(filename, fullpath, archive) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def iter_report_lines(stream):
+    """把二进制流按 utf-8 逐行解码，换行符的统一方式与 decode_report 相同，逐个返回不含换行符的行"""
+    for line in io.TextIOWrapper(stream, encoding='utf-8', newline=None):
+        yield line[:-1] if line.endswith('\n') else line
+
+def parse_file_job(row):
+    """读取并解析 files 表中的一条记录，返回 ParsedFile，可在子进程中执行。
+
+    超过 STREAM_PARSE_BYTES 的文件不整体读入：读取阶段只分块计算哈希，
+    内容有变化时再从文件流逐行解析，内存占用与文件大小无关。
+    """
+    file_id, filename, fullpath, archive = row
+    metrics = StageMetrics(filename=filename)
+
+    try:
+        with metrics.stage("read") as counts:
+            if source_size(filename, fullpath, archive) > STREAM_PARSE_BYTES:
+                data = None
+                content_hash, size = hash_source(filename, fullpath, archive)
+            else:
+                data = read_source_bytes(filename, fullpath, archive)
+                content_hash, size = None, len(data)
+            counts["bytes"] = size
+    except (FileNotFoundError, KeyError):
+        return ParsedFile(file_id, filename, fullpath, 'not_found', None, None, None, None, None, None, metrics)
+
+    content_hash = content_hash or hashlib.sha256(data).hexdigest()
+    if (filename, content_hash) in _known_files:
+        return ParsedFile(file_id, filename, fullpath, 'unchanged', content_hash, size, None, None, None, None, metrics)
+
+    logger.info(f"[{file_id}] 读取文件 {filename} 成功：{fullpath}, ")
+    with metrics.stage("parse", bytes=size) as counts:
+        if data is None:
+            with open_source(filename, fullpath, archive) as stream:
+                system_name, batch, error = parse_lines(iter_report_lines(stream), fullpath, metrics)
+        else:
+            system_name, batch, error = parse_content(decode_report(data), fullpath, metrics)
+        counts["rows"] = batch.row_count()
+    metrics.system_name = system_name
+    return ParsedFile(file_id, filename, fullpath, 'parsed', content_hash, size,
+                      system_name, parse_inspection_date(filename), batch, error, metrics)
+
+def write_parsed_file(session, result, ingested):
+    """主进程中写入单个文件的解析结果，并输出异常信息，返回写入的系统名（跳过时为 None）。
+
+    文件名和内容哈希都已入库的文件直接跳过；新文件或内容变化的文件先删除
+    该系统同一巡检批次的旧数据再写入。ingested 为已入库文件集合，写入后同步更新。
+    各阶段耗时交给 session，随写库会话一起入库。
+    """
+    session.metrics.append(result.metrics)
+    if result.status == 'not_found':
+        logger.error(f"[{result.file_id}] ❌ 文件不存在：{result.fullpath}")
+        session.drop_file(result.file_id)
+        return
+
+    if (result.filename, result.content_hash) in ingested:
+        logger.info(f"[{result.file_id}] 文件内容未变化，跳过：{result.fullpath}")
+        session.drop_file(result.file_id)
+        return
+
+    try:
+        with result.metrics.stage("db_write", rows=result.batch.row_count(), bytes=result.size), session.isolate():
+            run_id = session.begin_run(result.file_id, result.system_name, result.inspection_date)
+            # 解析出错的文件不记录哈希，下次运行会重新解析
+            session.finish_file(result.file_id, None if result.error else result.content_hash, result.size)
+            session.write(result.batch, run_id)
+    except Exception as e:
+        # 这个文件的写入已回滚，删掉文件记录，继续处理其他文件
+        logger.error(f"[{result.file_id}] ❌ 写入失败，已跳过：{result.fullpath}：{e}")
+        session.drop_file(result.file_id)
+        return
+    result.metrics.run_id = run_id
+    if result.error:
+        logger.warning(f"[{result.file_id}] ⚠️ 处理异常：{result.fullpath}：{result.error}")
+    else:
+        ingested.add((result.filename, result.content_hash))
+    return result.system_name
+
+def process_each_file_from_db(db_path, workers=None, granularity=None, session=None, file_ids=None):
+    """从 files 表中读取本次登记的文件（尚无内容哈希的记录）并解析入库，返回有数据写入的系统名集合。
+
+    workers 大于 1 时使用进程池并行解析，解析结果按 files 表顺序交由主进程
+    单线程写库，写入结果与串行方式完全一致。整个过程共用一个 WriteSession，
+    granularity 决定按文件还是按整次运行提交事务；传入 session 时沿用它且不关闭。
+    传入 file_ids 时只处理其中的文件记录，之前遗留的未完成记录不受影响。
+    """
+    workers = workers or PARSE_WORKERS
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT id, filename, fullpath, archive FROM files WHERE content_hash IS NULL ORDER BY id")
+    rows = cursor.fetchall()
+    conn.close()
+    if file_ids is not None:
+        wanted = set(file_ids)
+        rows = [row for row in rows if row[0] in wanted]
+
+    written = set()
+    with (contextlib.nullcontext(session) if session is not None else WriteSession(db_path, granularity)) as session:
+        ingested = session.ingested_files()
+        if workers > 1 and len(rows) > 1:
+            logger.info(f"[✓] 使用 {workers} 个进程并行解析 {len(rows)} 个文件")
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_parse_worker,
+                                     initargs=(ingested,) + worker_logging_args()) as executor:
+                # map 按提交顺序返回结果，保证写库顺序与串行一致
+                for result in executor.map(parse_file_job, rows):
+                    written.add(write_parsed_file(session, result, ingested))
+        else:
+            set_known_files(ingested)
+            for row in rows:
+                written.add(write_parsed_file(session, parse_file_job(row), ingested))
+            close_cached_zips()
+        session.flush_metrics()
+        # 入库后更新统计信息，让查询规划器按当前数据量选择索引
+        session.cursor.execute("ANALYZE")
+        session.conn.commit()
+    written.discard(None)
+    return written
+
+# ====== 文件内容处理函数 ====== #
 def get_cluster_name(file_content):
-    # 获取集群名
-    first_line = file_content.splitlines()[0]
+    # 获取集群名（只取第一行，不拆分全文）
+    end = file_content.find('\n')
+    first_line = file_content if end == -1 else file_content[:end]
     specific_char = "GBase 8a Cluster"
     result = first_line.split(specific_char)[0]
     result = result.rstrip()
     return result
 
-def extract_vc_names(text):
-    # 获取VC名称
-    pattern = r"=+ Data Machine Information\s+'([^']+)'"
-    return re.findall(pattern, text)
+# === 巡检文本单次扫描提取 === #
+# 段落标题
+COOR_MACHINE = "Coordinator Machine Information"
+COOR_CLUSTER = "Coordinator GBase Cluster Information"
+COOR_VARIABLES = "Coordinator GBase Cluster variables"
+DATA_MACHINE = "Data Machine Information"
+DATA_CLUSTER = "Data GBase Cluster Information"
+DATA_VARIABLES = "Data GBase Cluster variables"
+
+# 逐行识别三类行：
+#   ======Coordinator Machine Information======
+#   ====== Data Machine Information 'vc1' ======   /   ====== Data GBase Cluster variables vc1 ======
+#   * 物理内存使用情况：                             （子项标题，标题中不含 *，避免把 crontab 行当成子项）
+#   GBase 8a Cluster Coordinator Inscpection End now （段落结束标记）
+# 行尾空白由 inspection_token() 先去掉，正则里不再有可以互相让位的相邻可变长部分，
+# 超长行（长空白、长横线等）的匹配耗时与行长成正比
+INSPECTION_TOKEN_RE = re.compile(
+    r"(?:"
+    r"=+[ \t]*(?P<title>(?:Coordinator|Data) (?:Machine Information|GBase Cluster Information|GBase Cluster variables))"
+    r"(?:[ \t]+'?(?P<vc>[^'\s=]+)'?)?[ \t]*=+"
+    r"|[ \t]*\* (?P<label>[^*]*?)[：:]?"
+    r"|(?P<end>GBase 8a Cluster .*?Inscpection End.*)"
+    r")$"
+)
+
+def inspection_token(line):
+    """识别段落标题、子项标题和段落结束标记行，其他行返回 None"""
+    return INSPECTION_TOKEN_RE.match(line.rstrip(" \t\r"))
+
+# Field 的 until 参数：子项内容一直取到段落结束
+ITEM_TO_END = object()
+
+# 提取字段：title 段落中 item 子项的内容（item 为 None 时取整个段落）逐行交给 parser() 创建的行解析器。
+# until 为 None 时取到下一个子项；为子项名时取到该子项之前，中间的子项一并取入，结束子项不出现时
+# 取到下一个段落标题或结束标记为止；ITEM_TO_END 取到段落结束。同一段落或子项重复出现时只取第一个。
+Field = namedtuple('Field', 'title item parser until', defaults=[None])
+
+# 提取器：fields 为 {字段名: Field}，build(found) 在扫描结束后把字段的解析结果组装成
+# [(输出名, 数据行列表), ...]，按 outputs[输出名] 的 SQL 写入（最后一个参数 run_id 由 RowBatch 补上）
+Extractor = namedtuple('Extractor', 'name fields outputs build')
+
+def insert_ignore_sql(table, columns):
+    """按列名生成 INSERT OR IGNORE 语句，run_id 为最后一个参数"""
+    placeholders = ", ".join("?" * (len(columns) + 1))
+    return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}, run_id) VALUES ({placeholders})"
+
+class FieldScope:
+    """当前段落里的一段内容范围，范围相同的字段共用一个，每行依次交给各字段的解析器。
+
+    解析器看到的行与整段内容 strip() 后再按行拆分一致：去掉首尾的空白行，
+    首行去掉行首空白，末行去掉行尾空白。末行要等范围结束才能确定，所以总是
+    暂存最近一个非空行和它之后的空白行（连续相同的空白行只记一次和次数）。
+    解析器出错时把异常记到 errors 并不再分发给它。
+    """
 
-def extract_ip_tuples(text, system_name):
-    """提取IP地址和集群名的元组列表"""
-    results = []
-    lines = text.strip().splitlines()
-    
-    for line in lines:
-        match = re.match(r"(\w+)\s+(\d{1,3}(?:\.\d{1,3}){3}):", line)
-        if match:
-            cluster_name = match.group(1)   # e.g., 'coor'
-            ip_address = match.group(2)     # e.g., '10.174.68.202'
-            results.append((system_name, cluster_name, ip_address))
-    
-    return results
+    def __init__(self, vc, until, fields, errors):
+        self.until = until
+        self.errors = errors
+        # [((提取器名, 字段名, vc名), 解析器), ...]
+        self.parsers = [((name, field_name, vc), field.parser())
+                        for name, field_name, field in fields if name not in errors]
+        self.pending = None
+        # [[空白行, 连续次数], ...]
+        self.blanks = []
+
+    def feed(self, line):
+        if not line.strip():
+            if self.pending is not None:
+                if self.blanks and self.blanks[-1][0] == line:
+                    self.blanks[-1][1] += 1
+                else:
+                    self.blanks.append([line, 1])
+            return
+        if self.pending is None:
+            self.pending = line.lstrip()
+            return
+        self._deliver(self.pending)
+        if self.blanks:
+            for blank, count in self.blanks:
+                for _ in range(count):
+                    self._deliver(blank)
+            self.blanks.clear()
+        self.pending = line
+
+    def close(self):
+        """结束范围，返回 ([(键, 解析器), ...], 内容是否为空)"""
+        empty = self.pending is None
+        if not empty:
+            self._deliver(self.pending.rstrip())
+        return self.parsers, empty
+
+    def _deliver(self, line):
+        failed = False
+        for key, parser in self.parsers:
+            try:
+                parser.feed(line)
+            except Exception as e:
+                self.errors.setdefault(key[0], e)
+                failed = True
+        if failed:
+            self.parsers = [entry for entry in self.parsers if entry[0][0] not in self.errors]
+
+class InspectionScan:
+    """
+    按行驱动的扫描状态机：跟踪当前段落（标题, vc）和子项，把每一行只分发给
+    关心当前段落或子项的字段解析器。全文只过一遍，提取器增减字段不增加扫描次数。
 
-def get_machine_line(text, pattern1, pattern2):
-    coor_text = extract_blocks(text, pattern1)
-    coor_2_text = extract_blocks(coor_text, pattern2)
-    return coor_2_text.strip() if coor_2_text else None
-
-def get_coor_ip(text):
-    """提取协调节点的IP地址"""
-    coor_pattern = r"^=+Coordinator Machine Information=+\n(.*?)(?=^=+Coordinator GBase Cluster Information=+)"
-    coor_ip_pattern = r"\* 管理节点操作系统版本：\n(.*?)(?=\* )"
-    return get_machine_line(text, coor_pattern, coor_ip_pattern)
-
-def get_data_node_ip(text, vc_name):
-    """提取数据节点的IP地址"""
-    # 使用正则表达式匹配 VC 名称下的数据节点 IP 地址
-    data_pattern = (
-        rf"=+ Data Machine Information\s+'{vc_name}'\s+=+\n"  # 开始
-        r"(.*?)"                                              # 捕获中间内容
-        rf"=+ Data GBase Cluster Information\s+'{vc_name}'\s+=+"  # 结束
-    )
-    data_ip_pattern = r"\* 计算节点操作系统版本：\n(.*?)\* "
-    return get_machine_line(text, data_pattern, data_ip_pattern)
+    某个字段的解析器出错时记下异常并停止向它分发，由 parse_content 在轮到
+    对应提取器时抛出。
+    """
 
-def insert_ip_to_db(text, db_path):
-    """提取IP地址 并插入到数据库"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    def __init__(self, engine):
+        self.engine = engine
+        self.system_name = None
+        self.vc_names = []
+        # (提取器名, 字段名, vc名) -> (解析器, 内容是否为空)
+        self.results = {}
+        # 提取器名 -> 第一个异常
+        self.errors = {}
+        self._seen = set()
+        self._section = None
+        self._labels = set()
+        self._section_scopes = []
+        self._item_scopes = []
+
+    def feed(self, line):
+        if self.system_name is None:
+            self.system_name = get_cluster_name(line)
+
+        m = inspection_token(line)
+        if m is None:
+            for scope in self._section_scopes:
+                scope.feed(line)
+            for scope in self._item_scopes:
+                scope.feed(line)
+            return
+
+        label = m.group('label')
+        if label is not None:
+            if self._section is None:
+                return
+            for scope in self._section_scopes:
+                scope.feed(line)
+            # 子项标题结束默认范围的子项和以它为结束子项的子项，其余的把标题行当作内容
+            still_open = []
+            for scope in self._item_scopes:
+                if scope.until is None or scope.until == label:
+                    self._finish(scope)
+                else:
+                    still_open.append(scope)
+            self._item_scopes = still_open
+            for scope in self._item_scopes:
+                scope.feed(line)
+            if label not in self._labels:
+                self._labels.add(label)
+                self._item_scopes += self._open(self.engine.item_fields.get((self._section[0], label), ()))
+            return
+
+        # 新段落标题或结束标记：关闭当前段落
+        self._close_section()
+        title = m.group('title')
+        if title is None:
+            return
+        key = (title, m.group('vc'))
+        if key in self._seen:
+            return  # 重复的段落只认第一个
+        self._seen.add(key)
+        self._section = key
+        if title == DATA_MACHINE:
+            self.vc_names.append(key[1])
+        self._section_scopes = self._open(self.engine.section_fields.get(title, ()))
+
+    def close(self):
+        """文本结束：关闭最后一个段落"""
+        self._close_section()
+        if self.system_name is None:
+            self.system_name = get_cluster_name('')
+        return self
+
+    def _open(self, groups):
+        return [FieldScope(self._section[1], until, fields, self.errors) for until, fields in groups]
+
+    def _finish(self, scope):
+        parsers, empty = scope.close()
+        for key, parser in parsers:
+            if key[0] not in self.errors:
+                self.results[key] = (parser, empty)
+
+    def _close_section(self):
+        if self._section is None:
+            return
+        # 结束子项缺失（文件截断、格式异常）时子项内容也到此为止，不往后面的段落找
+        for scope in self._item_scopes:
+            self._finish(scope)
+        for scope in self._section_scopes:
+            self._finish(scope)
+        self._section = None
+        self._labels = set()
+        self._section_scopes = []
+        self._item_scopes = []
+
+class ExtractedFields:
+    """某个提取器在一次扫描中得到的字段解析结果，供 Extractor.build 使用"""
+
+    def __init__(self, scan, extractor):
+        self.scan = scan
+        self.extractor = extractor
+        self.system_name = scan.system_name
+        self.vc_names = scan.vc_names
+
+    def get(self, name, vc=None):
+        """返回字段的解析器，对应段落或子项不存在时返回 None"""
+        result = self.scan.results.get((self.extractor.name, name, vc))
+        return result[0] if result else None
+
+    def where(self, name, vc=None, item=True):
+        """字段所在的段落（item 为 True 时带上子项），用于错误信息"""
+        field = self.extractor.fields[name]
+        where = field.title + (f" {vc}" if vc else "")
+        if item and field.item is not None:
+            where += f" 的子项「{field.item}」"
+        return where
+
+    def need(self, name, vc=None, nonempty=False):
+        """同 get()，但段落或子项不存在（nonempty 时还包括内容为空）时报错"""
+        key = (self.extractor.name, name, vc)
+        result = self.scan.results.get(key)
+        if result is None or (nonempty and result[1]):
+            where = self.where(name, vc)
+            raise ValueError(f"巡检文件缺少 {where}" if result is None else f"巡检文件中 {where} 为空")
+        return result[0]
+
+    def need_values(self, name, vc=None):
+        """取 NextLineParser 字段的值，有关键字没出现时报错，保证值的个数与关键字一致"""
+        parser = self.need(name, vc)
+        if parser.missing:
+            raise ValueError(f"巡检文件中 {self.where(name, vc)} 缺少「{'」「'.join(parser.missing)}」")
+        return parser.values
+
+class ExtractionEngine:
+    """
+    把提取器注册表编译成按段落标题和 (段落标题, 子项名) 查找的分发表，
+    表项为 [(until, [(提取器名, 字段名, Field), ...]), ...]，范围相同的字段归为一组。
+    """
 
-    system_name = get_cluster_name(text)
+    def __init__(self, extractors):
+        self.extractors = list(extractors)
+        self.section_fields = {}
+        self.item_fields = {}
+        for extractor in self.extractors:
+            for field_name, field in extractor.fields.items():
+                if field.item is None:
+                    table, key = self.section_fields, field.title
+                else:
+                    table, key = self.item_fields, (field.title, field.item)
+                groups = table.setdefault(key, [])
+                group = next((fields for until, fields in groups if until is field.until or until == field.until), None)
+                if group is None:
+                    group = []
+                    groups.append((field.until, group))
+                group.append((extractor.name, field_name, field))
+
+    def scan(self, lines):
+        """逐行扫描巡检文本（任意可迭代的行，不含换行符），返回 InspectionScan"""
+        scan = InspectionScan(self)
+        for line in lines:
+            scan.feed(line)
+        return scan.close()
 
-    coor_ip_text = get_coor_ip(text)
-    coor_ips = extract_ip_tuples(coor_ip_text, system_name)
+    def extract(self, scan, extractor, cursor):
+        """
+        把一个提取器的结果写入 cursor（或 RowBatch），扫描时出错的提取器在这里抛出异常。
+        数据行的字段数在这里就与 SQL 的列数核对，不等到写库时才因参数个数不符而失败。
+        """
+        if extractor.name in scan.errors:
+            raise scan.errors[extractor.name]
+        for output, rows in extractor.build(ExtractedFields(scan, extractor)):
+            sql = extractor.outputs[output]
+            # 最后一个参数 run_id 由 RowBatch 补上
+            width = sql.count("?") - 1
+            for row in rows:
+                if len(row) != width:
+                    raise ValueError(f"{output} 的数据行有 {len(row)} 个字段，应为 {width}：{list(row)[:4]}")
+            cursor.executemany(sql, rows)
+
+# === 节点 IP 提取 === #
+class IpTupleParser:
+    """提取 (集群名, IP) 列表，如 coor 10.174.68.202: ..."""
+    PATTERN = re.compile(r"(\w+)\s+(\d{1,3}(?:\.\d{1,3}){3}):")
+
+    def __init__(self):
+        self.rows = []
+
+    def feed(self, line):
+        match = self.PATTERN.match(line)
+        if match:
+            cluster_name = match.group(1)   # e.g., 'coor'
+            ip_address = match.group(2)     # e.g., '10.174.68.202'
+            self.rows.append((cluster_name, ip_address))
 
-    # 插入数据
-    print(f"[✓] 正在处理 coor")
-    cursor.executemany("INSERT OR IGNORE INTO machines (system_name, cluster_name, ip_address) VALUES (?, ?, ?)", coor_ips)
-    cursor.executemany("INSERT OR IGNORE INTO machine_using (system_name, cluster_name, ip_address) VALUES (?, ?, ?)", coor_ips)
+# === 机器信息提取开始 === #
+class IpInfoParser:
+    """只匹配 IP 和后面的信息，得到 [[信息, IP], ...]"""
+    PATTERN = re.compile(r"(?<!\S)\S+\s+([\d.]+):\s+(.*)")
 
-    """提取数据节点的IP地址并插入到数据库"""
-    vc_names = extract_vc_names(text)
+    def __init__(self):
+        self.rows = []
 
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_ip_text = get_data_node_ip(text, vc)
-        data_ips = extract_ip_tuples(data_ip_text, system_name)
-        # 插入数据
-        cursor.executemany("INSERT OR IGNORE INTO machines (system_name, cluster_name, ip_address) VALUES (?, ?, ?)", data_ips)
-        cursor.executemany("INSERT OR IGNORE INTO machine_using (system_name, cluster_name, ip_address) VALUES (?, ?, ?)", data_ips)
+    def feed(self, line):
+        match = self.PATTERN.search(line)
+        if match:
+            self.rows.append([match.group(2), match.group(1)])
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入IP记录到数据库")
+class IpListParser:
+    """
+    serverip_list 目前有问题，该列置空：只收集去重排序后的 IP，得到 [['', IP], ...]
+    """
 
-# === 机器信息提取开始 === #
-def extract_cluster_ip_machie_info(text):
-    # 只匹配 IP 和 后面的信息
-    pattern = r"\S+\s+([\d.]+):\s+(.*)"
-    matches = re.findall(pattern, text)
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.ips = set()
 
-    # 转成 list，再封装成 tuple 返回
-    # result = [list(match) for match in matches]
-    result = [[os, ip] for ip, os in matches]
-    return tuple(result)
+    def feed(self, line):
+        self.ips.update(re.findall(self.pattern, line))
+
+    @property
+    def rows(self):
+        return [['', ip] for ip in sorted(self.ips)]
 
 def merge_by_ip_multi(*lists):
     merged_dict = {}
@@ -502,391 +1673,238 @@ def merge_by_ip_multi(*lists):
     # 最后再把 IP 加回末尾
     return [data + [ip] for ip, data in merged_dict.items()]
 
-
-def get_coor_os(text):
-    """提取协调节点的系统版本信息"""
-    # 操作系统
-    coor_pattern = r"^=+Coordinator Machine Information=+\n(.*?)(?=^=+Coordinator GBase Cluster Information=+)"
-    coor_os_pattern = r"\* 管理节点操作系统版本：\n(.*?)(?=\* )"
-    os_lines = get_machine_line(text, coor_pattern, coor_os_pattern)
-    os_versions = extract_cluster_ip_machie_info(os_lines) if os_lines else None
-
-    # 主机名
-    coor_hostname_pattern = r"\* Hostname：\n(.*?)(?=\* )"
-    hostname_lines = get_machine_line(text, coor_pattern, coor_hostname_pattern)
-    hostname = extract_cluster_ip_machie_info(hostname_lines) if os_lines else None
-
-    # cpu model name
-    coor_cpu1_pattern = r"\* CPU model name信息:\n(.*?)(?=\* )"
-    cpu1_lines = get_machine_line(text, coor_pattern, coor_cpu1_pattern)
-    cpu1 = extract_cluster_ip_machie_info(cpu1_lines) if os_lines else None
-    # cpu1 = extract_cluster_ip_machie_info(cpu1_lines) if os_lines else None
-    
-    # cpu 逻辑核心数
-    coor_cpu2_pattern = r"\* CPU 逻辑核数信息：\n(.*?)(?=\* )"
-    cpu2_lines = get_machine_line(text, coor_pattern, coor_cpu2_pattern)
-    cpu2 = extract_cluster_ip_machie_info(cpu2_lines) if os_lines else None
-
-    # cpu 物理核心数
-    coor_cpu3_pattern = r"\* CPU 物理核数：\n(.*?)(?=\* )"
-    cpu3_lines = get_machine_line(text, coor_pattern, coor_cpu3_pattern)
-    cpu3 = extract_cluster_ip_machie_info(cpu3_lines) if os_lines else None 
-
-    # serverip_list
-    """目前有问题，该列置空，正常再添加"""
-    coor_iplist_pattern = r"\* 服务器IP地址列表\n(.*?)(?=\* )"
-    # iplist_lines = get_machine_line(text, coor_pattern, coor_iplist_pattern)
-    # iplist = extract_cluster_ip_machie_info(iplist_lines) if os_lines else None 
-
-    # 下面是置空模拟，正常后需要修改
-    pattern_iplist_name = r"coor\s+(\d{1,3}(?:\.\d{1,3}){3}):"
-    iplist_lines = get_machine_line(text, coor_pattern, coor_iplist_pattern)
-    iplist_model = re.findall(pattern_iplist_name, iplist_lines)
-    unique_ips = sorted(set(iplist_model)) # 去重并排序
-    iplist = [['', ip] for ip in unique_ips]
-
-    # 合并所有信息
-    merged = merge_by_ip_multi(os_versions, hostname, cpu1, cpu2, cpu3, iplist)
-    return merged
-
-def get_data_node_info(text, vc_name):
-    """提取数据节点的系统版本信息"""
-    
-    data_pattern = (
-        rf"=+ Data Machine Information\s+'{vc_name}'\s+=+\n"  # 开始
-        r"(.*?)"                                              # 捕获中间内容
-        rf"=+ Data GBase Cluster Information\s+'{vc_name}'\s+=+"  # 结束
-    )
-    data_os_pattern = r"\* 计算节点操作系统版本：\n(.*?)\* "
-    os_lines = get_machine_line(text, data_pattern, data_os_pattern)
-    os_versions = extract_cluster_ip_machie_info(os_lines) if os_lines else None    
-
-    # 主机名
-    data_hostname_pattern = r"\* Hostname：\n(.*?)(?=\* )"
-    hostname_lines = get_machine_line(text, data_pattern, data_hostname_pattern)
-    hostname = extract_cluster_ip_machie_info(hostname_lines) if os_lines else None
-
-    # cpu model name
-    data_cpu1_pattern = r"\* CPU model name信息:\n(.*?)(?=\* )"
-    cpu1_lines = get_machine_line(text, data_pattern, data_cpu1_pattern)
-    cpu1 = extract_cluster_ip_machie_info(cpu1_lines) if os_lines else None
-    # cpu1 = extract_cluster_ip_machie_info(cpu1_lines) if os_lines else None
-    
-    # cpu 逻辑核心数
-    data_cpu2_pattern = r"\* CPU 逻辑核数：\n(.*?)(?=\* )"
-    cpu2_lines = get_machine_line(text, data_pattern, data_cpu2_pattern)
-    cpu2 = extract_cluster_ip_machie_info(cpu2_lines) if os_lines else None
-
-
-    # cpu 物理核心数
-    data_cpu3_pattern = r"\* CPU 物理核数：\n(.*?)(?=\* )"
-    cpu3_lines = get_machine_line(text, data_pattern, data_cpu3_pattern)
-    cpu3 = extract_cluster_ip_machie_info(cpu3_lines) if os_lines else None 
-
-    # serverip_list
-    """目前有问题，该列置空，正常再添加"""
-    data_iplist_pattern = r"\* 计算集群IP列表：\n(.*?)(?=\* )"
-    # iplist_lines = get_machine_line(text, data_pattern, data_iplist_pattern)
-    # iplist = extract_cluster_ip_machie_info(iplist_lines) if os_lines else None 
-
-    # 下面是置空模拟，正常后需要修改
-    pattern_iplist_name = r"\s+(\d{1,3}(?:\.\d{1,3}){3}):"
-    iplist_lines = get_machine_line(text, data_pattern, data_iplist_pattern)
-    iplist_model = re.findall(pattern_iplist_name, iplist_lines)
-    unique_ips = sorted(set(iplist_model)) # 去重并排序
-    iplist = [['', ip] for ip in unique_ips]
-    # print(f"获取到 {vc_name} 的IP地址列表：{iplist}")
-
-    # 合并所有信息
-    merged = merge_by_ip_multi(os_versions, hostname, cpu1, cpu2, cpu3, iplist)
-    return merged
-
-
-def get_machine_info(text, db_path):
-    """从文件内容中提取机器信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # 提取协调节点信息
-    get_coor_info = get_coor_os(text)
-
-    # coor节点的os信息插入数据库
-    print(f"[✓] 正在处理 coor：")
-    cursor.executemany(
-        """
-        UPDATE machines 
-        SET os_version = ?, hostname = ?, cpu_model_name = ?, cpu_logic_core = ?, cpu_physical_core = ?, serverip_list = ?
-        WHERE ip_address = ?
-        """, 
-        get_coor_info)
-    
-    """提取数据节点的IP地址并插入到数据库"""
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_info = get_data_node_info(text, vc)
-        # print(f"获取到 {vc} 的数据节点信息：{data_info}")
-        # 插入数据
-        cursor.executemany(
-            """
-            UPDATE machines 
-            SET os_version = ?, hostname = ?, cpu_model_name = ?, cpu_logic_core = ?, cpu_physical_core = ?, serverip_list = ?
-            WHERE ip_address = ?
-            """, 
-            data_info)
-
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入数据节点的机器信息到数据库")
+def machine_fields(prefix, title, labels, iplist_pattern):
+    """一个集群（coor 或 VC）的系统信息和资源使用字段，labels 依次为各子项名"""
+    os_label, hostname, cpu_model, cpu_logic, cpu_physical, iplist, mem, swap, disk = labels
+    return {
+        prefix + "ips": Field(title, os_label, IpTupleParser),
+        prefix + "os": Field(title, os_label, IpInfoParser),
+        prefix + "hostname": Field(title, hostname, IpInfoParser),
+        prefix + "cpu_model": Field(title, cpu_model, IpInfoParser),
+        prefix + "cpu_logic": Field(title, cpu_logic, IpInfoParser),
+        prefix + "cpu_physical": Field(title, cpu_physical, IpInfoParser),
+        prefix + "iplist": Field(title, iplist, partial(IpListParser, iplist_pattern)),
+        prefix + "mem": Field(title, mem, partial(UsageParser, MEM_RE)),
+        prefix + "swap": Field(title, swap, partial(UsageParser, SWAP_RE)),
+        prefix + "disk": Field(title, disk, partial(UsageParser, DF_RE, min_values=6)),
+    }
+
+def cluster_info_rows(found, prefix, vc):
+    """按 IP 合并一个集群的系统版本、主机名、CPU 和 IP 列表，某个节点缺项时报错"""
+    lists = [found.need(prefix + "os", vc, nonempty=True).rows]
+    lists += [found.need(prefix + name, vc).rows for name in ("hostname", "cpu_model", "cpu_logic", "cpu_physical", "iplist")]
+    rows = merge_by_ip_multi(*lists)
+    for row in rows:
+        if len(row) - 1 != len(lists):
+            raise ValueError(f"巡检文件中 {found.where(prefix + 'os', vc, item=False)} 节点 {row[-1]} 的"
+                             f"系统信息有 {len(row) - 1} 项，应为 {len(lists)}")
+    return rows
 
 # === machine信息提取结束 === #
 
 # === machine memory,swap,disk 信息提取开始 === #
-def extract_mem_info(text):
-    mem_list = []
-    lines = text.strip().splitlines()
+# 行内查找 IP 的正则都以 (?<!\d) 开头：只从数字串的开头尝试，超长数字串不会逐位重试
+MEM_RE = re.compile(r".*?(?<!\d)(\d+\.\d+\.\d+\.\d+):\s*Mem:\s*(.+)")
+SWAP_RE = re.compile(r".*?(?<!\d)(\d+\.\d+\.\d+\.\d+):\s*Swap:\s*(.+)")
+DF_RE = re.compile(r".*?(?<!\d)(\d+\.\d+\.\d+\.\d+):\s*(.+)")
 
-    for line in lines:
-        match = re.match(r".*?(\d+\.\d+\.\d+\.\d+):\s*Mem:\s*(.+)", line)
-        if match:
-            ip = match.group(1)
-            numbers = match.group(2).split()
-            numbers.append(ip)
-            mem_list.append(numbers)
-    return mem_list
+class UsageParser:
+    """free / df 输出行拆成数值列表，IP 放在最后；df 行至少 6 列"""
 
-def extract_swap_info(text):
-    swap_list = []
-    lines = text.strip().splitlines()
+    def __init__(self, pattern, min_values=0):
+        self.pattern = pattern
+        self.min_values = min_values
+        self.rows = []
 
-    for line in lines:
-        match = re.match(r".*?(\d+\.\d+\.\d+\.\d+):\s*Swap:\s*(.+)", line)
+    def feed(self, line):
+        match = self.pattern.match(line)
         if match:
             ip = match.group(1)
             numbers = match.group(2).split()
-            numbers.append(ip)
-            swap_list.append(numbers)
-    return swap_list
-
-def extract_df_info(text):
-    df_list = []
-    lines = text.strip().splitlines()
+            if len(numbers) >= self.min_values:
+                numbers.append(ip)
+                self.rows.append(numbers)
 
-    for line in lines:
-        match = re.match(r".*?(\d+\.\d+\.\d+\.\d+):\s*(.+)", line)
-        if match:
-            ip = match.group(1)
-            df_data = match.group(2).split()
-            if len(df_data) >= 6:
-                df_data.append(ip)
-                df_list.append(df_data)
-    return df_list
-
-def get_coor_using(text):
-    """提取协调节点的内存，swap，磁盘使用信息"""
-
-    coor_pattern = r"^=+Coordinator Machine Information=+\n(.*?)(?=^=+Coordinator GBase Cluster Information=+)"
-    coor_mem_pattern = r"\ * 物理内存使用情况：\n(.*?)(?=\* )"
-    coor_swap_pattern = r"\ * SWAP内存使用情况：\n(.*?)(?=\* )"
-    coor_disk_pattern = r"\ * 管理节点空间使用情况：\n(.*?)(?=\* )"
-
-    mem_lines = get_machine_line(text, coor_pattern, coor_mem_pattern)
-    swap_lines = get_machine_line(text, coor_pattern, coor_swap_pattern)
-    disk_lines = get_machine_line(text, coor_pattern, coor_disk_pattern)
-
-    mem_use_info = extract_mem_info(mem_lines) if mem_lines else None
-    swap_use_info = extract_swap_info(swap_lines) if swap_lines else None
-    disk_use_info = extract_df_info(disk_lines) if disk_lines else None
-
-    # 合并所有信息
-    merged = merge_by_ip_multi(mem_use_info, swap_use_info, disk_use_info)
-    return merged
-
-def get_data_node_using(text, vc_name):
-    """提取数据节点的内存，swap，磁盘使用信息"""
-    # coor_pattern = r"^=+Coordinator Machine Information=+\n(.*?)(?=^=+Coordinator GBase Cluster Information=+)"
-    data_pattern = (
-        rf"=+ Data Machine Information\s+'{vc_name}'\s+=+\n"  # 开始
-        r"(.*?)"                                              # 捕获中间内容
-        rf"=+ Data GBase Cluster Information\s+'{vc_name}'\s+=+"  # 结束
-    )
-    mem_pattern = r"\ * 物理内存使用情况\n(.*?)(?=\* )"
-    swap_pattern = r"\ * SWAP使用情况：\n(.*?)(?=\* )"
-    disk_pattern = r"\ * 计算集群各节点空间情况：\n(.*?)(?=\* )"
+# 每个节点合并后的内存/swap/磁盘使用值：free 的 Mem 行 6 列、Swap 行 3 列，df 行 6 列
+USAGE_VALUE_COUNT = 15
 
-    mem_lines = get_machine_line(text, data_pattern, mem_pattern)
-    swap_lines = get_machine_line(text, data_pattern, swap_pattern)
-    disk_lines = get_machine_line(text, data_pattern, disk_pattern)
-
-    mem_use_info = extract_mem_info(mem_lines) if mem_lines else None
-    swap_use_info = extract_swap_info(swap_lines) if swap_lines else None
-    disk_use_info = extract_df_info(disk_lines) if disk_lines else None
+def cluster_usage_rows(found, prefix, vc):
+    """按 IP 合并一个集群的内存，swap，磁盘使用信息，值的个数不对时报错"""
+    rows = merge_by_ip_multi(*(found.need(prefix + name, vc, nonempty=True).rows for name in ("mem", "swap", "disk")))
+    for row in rows:
+        if len(row) - 1 != USAGE_VALUE_COUNT:
+            raise ValueError(f"巡检文件中 {found.where(prefix + 'mem', vc, item=False)} 节点 {row[-1]} 的"
+                             f"内存/swap/磁盘使用有 {len(row) - 1} 项，应为 {USAGE_VALUE_COUNT}")
+    return rows
 
-    # 合并所有信息
-    merged = merge_by_ip_multi(mem_use_info, swap_use_info, disk_use_info)
-    return merged
+def with_typed_usage(row):
+    """在内存/swap/磁盘使用行（IP 在最后，值的个数已由 cluster_usage_rows 核对）的 IP 前补上字节数和使用率"""
+    values, ip = row[:-1], row[-1]
+    sizes = [parse_size(v) for v in values[0:9] + values[10:13]]
+    return values + sizes + [parse_percent(values[13]), ip]
 
-def get_machine_using(text, db_path):
-    """从文件内容中提取机器使用信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# === machine memory,swap,disk 信息提取结束 === #
 
-    # 提取协调节点信息
-    get_coor_info = get_coor_using(text)
+# === 节点记录汇总写入 === #
+MACHINE_FIELDS = ["os_version", "hostname", "cpu_model_name", "cpu_logic_core", "cpu_physical_core", "serverip_list"]
+USAGE_FIELDS = [
+    "mem_total", "mem_used", "mem_free", "msm_shared", "mem_buff_cache", "mem_available",
+    "swap_total", "swap_used", "swap_free",
+    "disk_filesystem", "disk_size", "disk_used", "disk_avail", "disk_use_per", "disk_mounted",
+    "mem_total_bytes", "mem_used_bytes", "mem_free_bytes", "mem_shared_bytes", "mem_buff_cache_bytes", "mem_available_bytes",
+    "swap_total_bytes", "swap_used_bytes", "swap_free_bytes",
+    "disk_size_bytes", "disk_used_bytes", "disk_avail_bytes", "disk_use_pct",
+]
+
+def machine_upsert_sql(table, fields):
+    """按 (run_id, ip_address) 写入节点记录，已存在时更新其余字段；run_id 为最后一个参数"""
+    columns = ["system_name", "cluster_name", "ip_address"] + fields
+    placeholders = ", ".join("?" * (len(columns) + 1))
+    updates = ", ".join(f"{field} = excluded.{field}" for field in fields)
+    return (f"INSERT INTO {table} ({', '.join(columns)}, run_id) VALUES ({placeholders}) "
+            f"ON CONFLICT(run_id, ip_address) DO UPDATE SET {updates}")
+
+MACHINES_UPSERT = machine_upsert_sql("machines", MACHINE_FIELDS)
+MACHINE_USING_UPSERT = machine_upsert_sql("machine_using", USAGE_FIELDS)
+
+def fill_machine_records(records, fields, rows):
+    """把按 IP 合并好的行（IP 在最后）填进对应节点的记录，不在节点列表里的 IP 忽略"""
+    for row in rows:
+        values, ip = row[:-1], row[-1]
+        if len(values) != len(fields):
+            raise ValueError(f"{ip} 的字段数为 {len(values)}，应为 {len(fields)}")
+        if ip in records:
+            records[ip].update(zip(fields, values))
 
-    # coor节点的os信息插入数据库
-    print(f"[✓] 正在处理 coor：")
-    cursor.executemany(
-        """
-        UPDATE machine_using 
-        SET
-        mem_total = ? ,
-        mem_used = ? ,
-        mem_free = ? ,
-        msm_shared = ? ,
-        mem_buff_cache = ? ,
-        mem_available = ? ,
-        swap_total = ? ,
-        swap_used = ? ,
-        swap_free = ? ,
-        disk_filesystem = ? ,
-        disk_size = ? ,
-        disk_used = ? ,
-        disk_avail = ? ,
-        disk_use_per = ? ,
-        disk_mounted = ?
-        WHERE ip_address = ?
-        """, 
-        get_coor_info)
-    
-    """提取数据节点的IP地址并插入到数据库"""
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_info = get_data_node_using(text, vc)
-        # 插入数据
-        cursor.executemany(
-            """
-            UPDATE machine_using 
-            SET
-            mem_total = ? ,
-            mem_used = ? ,
-            mem_free = ? ,
-            msm_shared = ? ,
-            mem_buff_cache = ? ,
-            mem_available = ? ,
-            swap_total = ? ,
-            swap_used = ? ,
-            swap_free = ? ,
-            disk_filesystem = ? ,
-            disk_size = ? ,
-            disk_used = ? ,
-            disk_avail = ? ,
-            disk_use_per = ? ,
-            disk_mounted = ?
-            WHERE ip_address = ?
-            """, 
-            data_info)
+def build_machine_records(found):
+    """汇总每个节点的 IP、系统信息和内存/swap/磁盘使用，返回 {ip: 记录}。
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入数据节点的机器内存，swap，disk使用信息到数据库")
+    节点列表取自各集群的操作系统版本段，同一 IP 以先出现的集群为准；
+    系统信息和资源使用按 coor、各 VC 的顺序填入，后出现的覆盖先出现的。
+    """
+    clusters = [("coor_", None)] + [("vc_", vc) for vc in found.vc_names]
+
+    records = {}
+    for prefix, vc in clusters:
+        for cluster_name, ip in found.need(prefix + "ips", vc).rows:
+            records.setdefault(ip, {"cluster_name": cluster_name})
+
+    info_rows, usage_rows = [], []
+    for prefix, vc in clusters:
+        info_rows += cluster_info_rows(found, prefix, vc)
+        usage_rows += cluster_usage_rows(found, prefix, vc)
+
+    fill_machine_records(records, MACHINE_FIELDS, info_rows)
+    fill_machine_records(records, USAGE_FIELDS, [with_typed_usage(row) for row in usage_rows])
+    return records
+
+def get_machine_records(found):
+    """每个节点的 machines 和 machine_using 记录各写入一次"""
+    records = build_machine_records(found)
+
+    keys = [(found.system_name, record["cluster_name"], ip) for ip, record in records.items()]
+    logger.debug(f"[✓] 成功提取 {len(records)} 个节点的机器信息和资源使用")
+    return [
+        ("machines", [key + tuple(record.get(field) for field in MACHINE_FIELDS) for key, record in zip(keys, records.values())]),
+        ("machine_using", [key + tuple(record.get(field) for field in USAGE_FIELDS) for key, record in zip(keys, records.values())]),
+    ]
 
-# === machine memory,swap,disk 信息提取结束 === #
+# === 节点记录汇总写入结束 === #
 
 # === 集群磁盘使用信息提取开始 === #
-def extract_next_line_values_list(text: str, keywords: list, prefix: list) -> list:
-    lines = text.strip().splitlines()
-    results = []
-    for keyword in keywords:
-        for i, line in enumerate(lines):
-            if keyword in line:
-                if i + 1 < len(lines):
-                    results.append(lines[i + 1].strip())
-                else:
-                    results.append('')  # 没有下一行，填空
-                break
-    return prefix + results
-
-
-
-def get_cluster_disk_using(text, db_path):
+class NextLineParser:
+    """每个关键字第一次出现的行的下一行（去空白），没有下一行填空；未出现的关键字不占位"""
+
+    def __init__(self, keywords):
+        self.keywords = keywords
+        self.pattern = re.compile("|".join(map(re.escape, keywords)))
+        self.found = {}
+        self.waiting = []
+
+    def feed(self, line):
+        if self.waiting:
+            for keyword in self.waiting:
+                self.found[keyword] = line.strip()
+            self.waiting = []
+        if self.pattern.search(line):
+            self.waiting = [keyword for keyword in self.keywords
+                            if keyword not in self.found and keyword in line]
+
+    @property
+    def values(self):
+        found = dict(self.found, **{keyword: '' for keyword in self.waiting})
+        return [found[keyword] for keyword in self.keywords if keyword in found]
+
+    @property
+    def missing(self):
+        """没有出现的关键字"""
+        return [keyword for keyword in self.keywords if keyword not in self.found and keyword not in self.waiting]
+
+COOR_DISK_KEYWORDS = ['管理节点总空间之和', '管理节点已使用空间之和', '管理节点剩余用空间之和', '管理集群空间总使用率']
+VC_DISK_KEYWORDS = ['计算集群空间之和', '计算集群已使用空间之和', '计算集群剩余用空间之和', '计算集群空间总使用率']
+
+def disk_using_row(system_name, cluster_name, values):
+    """values 为总空间、已使用、剩余和使用率四项，由 need_values 保证个数"""
+    disk_result = [system_name, cluster_name] + values
+    return disk_result + [parse_kb(v) for v in disk_result[2:5]] + [parse_percent(disk_result[5])]
+
+def get_cluster_disk_using(found):
     """提取集群磁盘使用信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    rows = [disk_using_row(found.system_name, 'coor', found.need_values("coor"))]
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator Machine Information=+\n(.*?)(?=^=+Coordinator GBase Cluster Information=+)"
-    disk_text = extract_blocks(text, coor_pattern)
-    keywords = ['管理节点总空间之和', '管理节点已使用空间之和', '管理节点剩余用空间之和', '管理集群空间总使用率']
+    # 提取数据节点的磁盘使用信息
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        rows.append(disk_using_row(found.system_name, vc, found.need_values("vc", vc)))
 
-    system_name = get_cluster_name(text)
-    prefix = [system_name, 'coor']
-    disk_result = extract_next_line_values_list(disk_text, keywords, prefix)
-    # values = extract_next_line_values_list(disk_text, keywords)
-    cursor.executemany("INSERT OR IGNORE INTO clusters_disk_using (system_name, cluster_name, disk_total, disk_used, disk_avail, disk_use_per) VALUES (?, ?, ?, ?, ?, ?)", [disk_result])
-    
-    """提取数据节点的磁盘使用信息"""
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data Machine Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+"  # 结束
-        )
-        disk_text = extract_blocks(text, data_pattern)
-        keywords = ['计算集群空间之和', '计算集群已使用空间之和', '计算集群剩余用空间之和', '计算集群空间总使用率']
-        prefix = [system_name, vc]
-        disk_result2 = extract_next_line_values_list(disk_text, keywords, prefix)
-        # print(f"[✓] 正在处理计算集群磁盘使用信息：{disk_result2}")
-        cursor.executemany("INSERT OR IGNORE INTO clusters_disk_using (system_name, cluster_name, disk_total, disk_used, disk_avail, disk_use_per) VALUES (?, ?, ?, ?, ?, ?)", [disk_result2])
-
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群磁盘使用信息到数据库")
+    logger.debug(f"[✓] 成功提取集群磁盘使用信息")
+    return [("clusters_disk_using", rows)]
 
 # === 集群磁盘使用信息提取结束 === #
 
 
 # === 提取节点进程 === #
-def extract_ip_process_pairs(text):
-    blocks = re.split(r'-{5,}\s*(\d+\.\d+\.\d+\.\d+)\s*-{5,}', text)
-    results = []
+class ProcessBlockParser:
+    """--------- <IP> --------- 分块的 ps -ef 输出，得到 [[IP, 命令], ...]"""
+    HEADER = re.compile(r'(?<!-)-{5,}\s*(\d+\.\d+\.\d+\.\d+)\s*-{5,}')
 
-    for i in range(1, len(blocks), 2):
-        ip = blocks[i]
-        content = blocks[i + 1]
+    def __init__(self):
+        self.ip = None
+        self.rows = []
 
-        # 匹配 ps -ef 输出中每一行的最后一个字段（即命令部分）
-        lines = content.strip().splitlines()
-        for line in lines:
-            # 避免空行或异常行
-            if not line.strip():
-                continue
+    def feed(self, line):
+        start = 0
+        for match in self.HEADER.finditer(line):
+            self._command(line[start:match.start()])
+            self.ip = match.group(1)
+            start = match.end()
+        self._command(line[start:])
 
-            # 以空格拆分行，前 7 项是 ps 输出的标准字段（uid, pid, ppid, etc），之后都是命令
-            parts = line.split(None, 7)  # 最多分成 8 段
-            if len(parts) < 8:
-                continue  # 不足 8 段说明不是标准 ps -ef 行
+    def _command(self, line):
+        # 避免空行、异常行和第一个 IP 之前的内容
+        if self.ip is None or not line.strip():
+            return
 
-            command = parts[7].strip()
-            results.append([ip, command])
+        # 以空格拆分行，前 7 项是 ps 输出的标准字段（uid, pid, ppid, etc），之后都是命令
+        parts = line.split(None, 7)  # 最多分成 8 段
+        if len(parts) < 8:
+            return  # 不足 8 段说明不是标准 ps -ef 行
 
-    return results
+        command = parts[7].strip()
+        self.rows.append([self.ip, command])
 
+IP_COLON_RE = re.compile(r'(?<!\d)(\d+\.\d+\.\d+\.\d+):')
 
-def extract_ip_command_pairs_linewise(text):
-    result = []
-    lines = text.strip().splitlines()
+class ProcessLineParser:
+    """每行带 IP 前缀的 ps -ef 输出，得到 [[IP, 命令], ...]"""
+
+    def __init__(self):
+        self.rows = []
 
-    for line in lines:
-        ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+):', line)
+    def feed(self, line):
+        ip_match = IP_COLON_RE.search(line)
         if not ip_match:
-            continue
+            return
         ip = ip_match.group(1)
 
         # 获取IP后面的内容
@@ -896,223 +1914,117 @@ def extract_ip_command_pairs_linewise(text):
         fields = after_ip.split(None, 7)
         if len(fields) < 8:
             # 没有足够字段，跳过
-            continue
+            return
 
         command = fields[7].strip()
-        result.append([ip, command])
+        self.rows.append([ip, command])
 
-    return result
-
-def get_cluster_process(text, db_path):
+def get_cluster_process(found):
     """提取集群节点进程信息"""
-    # 这里可以添加对进程信息的提取逻辑
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    system_name = found.system_name
+    rows = [(system_name, 'coor', ip, command) for ip, command in found.need("coor").rows]
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator GBase Cluster Information=+\n(.*?)(?=^=+Coordinator GBase Cluster variables=+)"
-    process_pattern = r"\ * 管理节点进程状态：\n(.*?)(?=\* 管理节点日志大小)"
-    coor_text = extract_blocks(text, coor_pattern)
-    process_line = extract_blocks(coor_text, process_pattern)
-    process_list = extract_ip_process_pairs(process_line)
-
-    system_name = get_cluster_name(text)
-    prefix = [system_name, 'coor']
-    process_list_prefix = [prefix + row for row in process_list]
-    tuple_data = [tuple(row) for row in process_list_prefix]
-  
-
-    # print(f"[✓] 正在处理集群磁盘使用信息：{tuple_data}")
-    cursor.executemany("INSERT OR IGNORE INTO clusters_process (system_name, cluster_name, ip_address, process_cmd) VALUES (?, ?, ?, ?)", tuple_data)
-    
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster variables\s+{vc}\s+=+"  # 结束
-        )
-        data_process_pattern = r"\* Data Cluster 进程状态:\s*(.*?)\s*\* Data Cluster 日志情况:"
-        data_text = extract_blocks(text, data_pattern)
-        process_line2 = extract_blocks(data_text, data_process_pattern)
-        process_list2 = extract_ip_command_pairs_linewise(process_line2)
-        prefix2 = [system_name, vc]
-        process_list_prefix2 = [prefix2 + row for row in process_list2]
-        tuple_data2 = [tuple(row) for row in process_list_prefix2]
-        cursor.executemany("INSERT OR IGNORE INTO clusters_process (system_name, cluster_name, ip_address, process_cmd) VALUES (?, ?, ?, ?)", tuple_data2)
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        rows += [(system_name, vc, ip, command) for ip, command in found.need("vc", vc).rows]
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群进程信息到数据库")
+    logger.debug(f"[✓] 成功提取集群进程信息")
+    return [("clusters_process", rows)]
 
 # === 提取节点进程结束 === #
 
 # === 提取集群日志信息 === #
-def extract_du_info(text):
-    result = []
-    lines = text.strip().splitlines()
+class DuInfoParser:
+    """du 输出，得到 [[IP, 大小, 路径], ...]"""
+    SIZE_PATH = re.compile(r':\s+(\S+)\s+(.+)')
+
+    def __init__(self):
+        self.rows = []
 
-    for line in lines:
+    def feed(self, line):
         # 跳过包含错误信息的行
         if "No such file or directory" in line:
-            continue
+            return
 
-        ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+):', line)
+        ip_match = IP_COLON_RE.search(line)
         if not ip_match:
-            continue
+            return
         ip = ip_match.group(1)
 
         # 提取大小和路径
-        match = re.search(r':\s+(\S+)\s+(.+)', line)
+        match = self.SIZE_PATH.search(line)
         if match:
             size = match.group(1)
             path = match.group(2).strip()
-            result.append([ip, size, path])
-
-    return result
+            self.rows.append([ip, size, path])
 
-def get_cluster_logs(text, db_path):
+def get_cluster_logs(found):
     """提取集群节点日志信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    system_name = found.system_name
+    rows = [(system_name, 'coor', ip, size, path, parse_size(size)) for ip, size, path in found.need("coor").rows]
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator GBase Cluster Information=+\n(.*?)(?=^=+Coordinator GBase Cluster variables=+)"
-    process_pattern = r"\ * 管理节点日志大小：\n(.*?)(?=\ * 自启动设置：)"
-    coor_text = extract_blocks(text, coor_pattern)
-    logs_line = extract_blocks(coor_text, process_pattern)
-    logs_list = extract_du_info(logs_line)
-
-    system_name = get_cluster_name(text)
-    prefix = [system_name, 'coor']
-    logs_list_prefix = [prefix + row for row in logs_list]
-    tuple_data = [tuple(row) for row in logs_list_prefix]
-  
-    cursor.executemany("INSERT OR IGNORE INTO clusters_logs (system_name, cluster_name, ip_address, log_used, log_path) VALUES (?, ?, ?, ?, ?)", tuple_data)
-    
-    """提取数据节点的磁盘使用信息"""
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster variables\s+{vc}\s+=+"  # 结束
-        )
-        data_logs_pattern = r"\* Data Cluster 日志情况:\s*(.*?)\s*\* Data Cluster 自启动："
-        data_text = extract_blocks(text, data_pattern)
-        logs_line2 = extract_blocks(data_text, data_logs_pattern)
-        logs_list2 = extract_du_info(logs_line2)
-        prefix2 = [system_name, vc]
-        logs_list_prefix2 = [prefix2 + row for row in logs_list2]
-        tuple_data2 = [tuple(row) for row in logs_list_prefix2]
-        cursor.executemany("INSERT OR IGNORE INTO clusters_logs (system_name, cluster_name, ip_address, log_used, log_path) VALUES (?, ?, ?, ?, ?)", tuple_data2)
-    
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群日志信息到数据库")
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        rows += [(system_name, vc, ip, size, path, parse_size(size)) for ip, size, path in found.need("vc", vc).rows]
+
+    logger.debug(f"[✓] 成功提取集群日志信息")
+    return [("clusters_logs", rows)]
 
 # === 提取集群日志信息结束 === #
 
 # === 提取自启动信息 === #
-def extract_ip_command_pairs(text):
-    result = []
-    current_ip = None
+class CommandBlockParser:
+    """--------- <IP>--------- 分块的命令行，得到 [[IP, 命令], ...]"""
+    HEADER = re.compile(r'-+\s*(\d+\.\d+\.\d+\.\d+)\s*-+')
 
-    for line in text.strip().splitlines():
+    def __init__(self):
+        self.current_ip = None
+        self.rows = []
+
+    def feed(self, line):
         line = line.strip()
 
         # 匹配 IP 段头：--------- <IP>---------
-        ip_match = re.match(r'-+\s*(\d+\.\d+\.\d+\.\d+)\s*-+', line)
+        ip_match = self.HEADER.match(line)
         if ip_match:
-            current_ip = ip_match.group(1)
-            continue
+            self.current_ip = ip_match.group(1)
+            return
 
         # 非空行且已知当前 IP，就认为是命令行
-        if current_ip and line:
-            result.append([current_ip, line])
+        if self.current_ip and line:
+            self.rows.append([self.current_ip, line])
 
-    return result
+class CommandDataParser:
+    """<IP>: <命令> 形式的行，得到 [[IP, 命令], ...]"""
+    PATTERN = re.compile(r'.*?(?<!\d)(\d+\.\d+\.\d+\.\d+):\s+(.*)')
 
-def extract_ip_command_data_pairs(text):
+    def __init__(self):
+        self.rows = []
 
-    result = []
-    for line in text.strip().splitlines():
-        match = re.match(r'.*?(\d+\.\d+\.\d+\.\d+):\s+(.*)', line)
+    def feed(self, line):
+        match = self.PATTERN.match(line)
         if match:
             ip = match.group(1)
             command = match.group(2)
-            result.append([ip, command])
-    return result
+            self.rows.append([ip, command])
 
-def get_auto_start(text, db_path):
-    # 这里可以添加对进程信息的提取逻辑
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def get_auto_start(found):
+    """提取集群自启动信息，VC 的自启动子项可以缺失"""
+    system_name = found.system_name
+    rows = [(system_name, 'coor', ip, command) for ip, command in found.need("coor").rows]
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator GBase Cluster Information=+\n(.*?)(?=^=+Coordinator GBase Cluster variables=+)"
-    auto_pattern = r"\ * 自启动设置：\n(.*?)(?=\* 监控运维脚本：)"
-    coor_text = extract_blocks(text, coor_pattern)
-    auto_line = extract_blocks(coor_text, auto_pattern)
-    # print(f"[✓] 正在处理集群自启动信息：{auto_line}")
-    process_list = extract_ip_command_pairs(auto_line)
-    # print(f"[✓] 处理后的自启动信息：{process_list}")
-
-    system_name = get_cluster_name(text)
-    prefix = [system_name, 'coor']
-    process_list_prefix = [prefix + row for row in process_list]
-    tuple_data = [tuple(row) for row in process_list_prefix]
-  
-
-    # print(f"[✓] 正在处理集群磁盘使用信息：{tuple_data}")
-    cursor.executemany("INSERT OR IGNORE INTO auto_start (system_name, cluster_name, ip_address, process_start) VALUES (?, ?, ?, ?)", tuple_data)
-    
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster variables\s+{vc}\s+=+"  # 结束
-        )
-        data_text = extract_blocks(text, data_pattern)
-        auto_line2 = re.search(r'\* Data Cluster 自启动：\n(.*)', data_text, re.DOTALL)
-        if auto_line2:
-            result = auto_line2.group(1).strip()
-            auto_list2 = extract_ip_command_data_pairs(result)
-            prefix2 = [system_name, vc]
-            process_list_prefix2 = [prefix2 + row for row in auto_list2]
-            tuple_data2 = [tuple(row) for row in process_list_prefix2]
-            # print(f"[✓] 处理后的自启动信息：{tuple_data2}")
-            cursor.executemany("INSERT OR IGNORE INTO auto_start (system_name, cluster_name, ip_address, process_start) VALUES (?, ?, ?, ?)", tuple_data2)
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        result = found.get("vc", vc)
+        if result is not None:
+            rows += [(system_name, vc, ip, command) for ip, command in result.rows]
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群自启动信息到数据库")
+    logger.debug(f"[✓] 成功提取集群自启动信息")
+    return [("auto_start", rows)]
 
 # === 提取自启动信息结束 === #
 
 # === 提取集群变量信息 === #
-def extract_coordinator_variables_block(text):
-    """
-    提取协调节点的集群变量信息块，直接返回整段文本，不拆行、不做多余处理。
-    """
-    match = re.search(
-        r'={10,}Coordinator GBase Cluster variables={10,}(.*?)GBase 8a Cluster Coordinator Inscpection End now',
-        text,
-        re.DOTALL
-    )
-
-    if match:
-        return match.group(1).strip()  # 返回整个文本块（去首尾空白）
-    else:
-        return ''  # 没有匹配时返回空字符串
-
 def extract_ip_ref_actual_params1(text):
     result = []
     current_param = None  # (参数名, 参考值)
@@ -1158,31 +2070,33 @@ def extract_ip_ref_actual_params1(text):
 
     return result
 
-def extract_ip_ref_actual_params(text):
-    result = []
-    current_ref_param = None
-    current_ref_value = None
+class RefActualParser:
+    """>> 参数=参考值: 行之后的各节点实际值，得到 [[IP, 参数名, 参考值, 配置文件, 实际值], ...]"""
+    REFERENCE = re.compile(r">>\s*([a-zA-Z0-9_]+)=([^\s:]+):")
+    # 包含配置路径的行或不包含配置路径的行（配置路径前的空白由 strip() 去掉）
+    ACTUAL = re.compile(r"^([a-zA-Z0-9_]+)\s+(\d+\.\d+\.\d+\.\d+):(?:([^:]*):)?\s*#?([a-zA-Z0-9_]+)=([^\s]+)")
+
+    def __init__(self):
+        self.current_ref_param = None
+        self.current_ref_value = None
+        self.rows = []
 
-    for line in text.splitlines():
+    def feed(self, line):
         line = line.strip()
         if not line:
-            continue
+            return
 
         # 提取参考值行，例如 >> param=value:
-        ref_match = re.match(r">>\s*([a-zA-Z0-9_]+)=([^\s:]+):", line)
+        ref_match = self.REFERENCE.match(line)
         if ref_match:
-            current_ref_param = ref_match.group(1)
-            current_ref_value = ref_match.group(2)
-            continue
+            self.current_ref_param = ref_match.group(1)
+            self.current_ref_value = ref_match.group(2)
+            return
 
-        # 匹配包含配置路径的行或不包含配置路径的行
-        actual_match = re.match(
-            r"^([a-zA-Z0-9_]+)\s+(\d+\.\d+\.\d+\.\d+):(?:\s*([^:]*):)?\s*#?([a-zA-Z0-9_]+)=([^\s]+)", line
-        )
+        actual_match = self.ACTUAL.match(line)
 
-        if actual_match and current_ref_param:
+        if actual_match and self.current_ref_param:
             # 解析字段
-            prefix = actual_match.group(1)                        # 节点前缀
             ip = actual_match.group(2)                            # IP地址
             config_path = actual_match.group(3) or ''             # 配置路径（可选）
             param_key = actual_match.group(4)                     # 参数名
@@ -1190,189 +2104,162 @@ def extract_ip_ref_actual_params(text):
 
             # 忽略被注释的行（#param=...）
             if line.split(":")[-1].lstrip().startswith("#"):
-                continue
+                return
 
-            result.append([
+            self.rows.append([
                 ip,
                 param_key,
-                current_ref_value,
+                self.current_ref_value,
                 config_path.strip(),
                 actual_value
             ])
 
-    return result
+def variable_rows(system_name, cluster_name, parser):
+    if parser is None:
+        return []
+    return [(system_name, cluster_name, *row, smart_convert(row[2]), smart_convert(row[4])) for row in parser.rows]
 
-def extract_data_cluster_variables_block(text, vc_name):
-    data_pattern = rf"================================ Data GBase Cluster variables\s+{re.escape(vc_name)}\s+={{3,}}(.*?)GBase 8a Cluster Data Cluster '{re.escape(vc_name)}' Inscpection End"
+def get_cluster_variables(found):
+    """提取集群变量信息，变量段落可以缺失"""
+    rows = variable_rows(found.system_name, 'coor', found.get("coor"))
 
-    match = re.search(data_pattern, text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    else:
-        return ''
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        rows += variable_rows(found.system_name, vc, found.get("vc", vc))
 
-def get_cluster_variables(text, db_path):
-    """提取集群变量信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # 提取协调节点信息
-    system_name = get_cluster_name(text)
-    coor_var_result = extract_coordinator_variables_block(text)
-    coor_var_lines = extract_ip_ref_actual_params(coor_var_result)
-    # print(f"[✓] 正在处理协调节点的集群变量信息：{coor_var_lines}")
-    if coor_var_lines:  # 如果 data 非空
-        
-        prefix = [system_name, 'coor']
-        var_list_prefix = [prefix + row for row in coor_var_lines]
-        tuple_data = [tuple(row) for row in var_list_prefix]
-        cursor.executemany("INSERT OR IGNORE INTO cluster_variables (system_name, cluster_name, ip_address, var_name, var_reference, config_file, var_actual) VALUES (?, ?, ?, ?, ?, ?, ?)", tuple_data)
-    
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_text = extract_data_cluster_variables_block(text, vc)
-        data_var_lines = extract_ip_ref_actual_params(data_text)
-        # print(f"[✓] 提取到 {vc} 的集群变量信息：{data_var_lines}")
-        if data_var_lines:  # 如果 data 非空
-        
-            prefix2 = [system_name, vc]
-            var_list_prefix2 = [prefix2 + row for row in data_var_lines]
-            tuple_data2 = [tuple(row) for row in var_list_prefix2]
-            # print(f"[✓] 正在处理 {vc} 的集群变量信息：{tuple_data2}")
-            cursor.executemany("INSERT OR IGNORE INTO cluster_variables (system_name, cluster_name, ip_address, var_name, var_reference, config_file, var_actual) VALUES (?, ?, ?, ?, ?, ?, ?)", tuple_data2)
-        
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群参数变量到数据库")  
+    logger.debug(f"[✓] 成功提取集群参数变量")
+    return [("cluster_variables", rows)]
 # === 提取集群变量信息结束 === #
 
 # === 提取数据集群使用情况 === #
-def extract_cluster_status(text):
-    result = []
-
-    patterns = [
-        r"CLUSTER STATE:\s*([^\s\r\n]+)",             # 提取 CLUSTER STATE
-        r"VIRTUAL CLUSTER MODE:\s*([^\s\r\n]+)"       # 提取 VIRTUAL CLUSTER MODE
+class ClusterStatusParser:
+    """CLUSTER STATE 和 VIRTUAL CLUSTER MODE 第一次出现的值"""
+    PATTERNS = [
+        re.compile(r"CLUSTER STATE:\s*([^\s\r\n]+)"),             # 提取 CLUSTER STATE
+        re.compile(r"VIRTUAL CLUSTER MODE:\s*([^\s\r\n]+)"),      # 提取 VIRTUAL CLUSTER MODE
     ]
 
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        result.append(match.group(1) if match else '')
-
-    return result
-
-def extract_vc_event_counts(text):
-    # 匹配目标段落后下一行
-    pattern = r"Data Cluster DDL&DML&DMLSTORAGE Event信息：\s*\n([^\n]*)"
-    match = re.search(pattern, text)
-    if match:
-        line = match.group(1)
-        # 提取该行中所有 Vc event count:数字
-        return re.findall(r"Vc event count:(\d+)", line)
-    else:
-        return []
-
-def get_data_cluster_using(text, db_path):
+    def __init__(self):
+        self.values = [None] * len(self.PATTERNS)
+
+    def feed(self, line):
+        for i, pattern in enumerate(self.PATTERNS):
+            if self.values[i] is None:
+                match = pattern.search(line)
+                if match:
+                    self.values[i] = match.group(1)
+
+    @property
+    def status(self):
+        return [value or '' for value in self.values]
+
+class EventCountParser:
+    """Data Cluster DDL&DML&DMLSTORAGE Event信息： 之后第一个非空行中所有 Vc event count:数字"""
+    MARK = "Data Cluster DDL&DML&DMLSTORAGE Event信息："
+
+    def __init__(self):
+        self.armed = False
+        self.counts = None
+
+    def feed(self, line):
+        if self.counts is not None:
+            return
+        if self.armed:
+            if line.strip():
+                self.counts = re.findall(r"Vc event count:(\d+)", line)
+            return
+        index = line.find(self.MARK)
+        if index >= 0 and not line[index + len(self.MARK):].strip():
+            self.armed = True
+
+DATA_COUNT_KEYWORDS = ['库的个数', '表的个数', '视图的个数', '存储过程的个数', '函数的个数']
+# DDL、DML、DMLSTORAGE 三个 event 计数
+DATA_EVENT_COUNT = 3
+
+def get_data_cluster_using(found):
     """提取集群使用信息"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    system_name = get_cluster_name(text)
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster variables\s+{vc}\s+=+"  # 结束
-        )
-        data_text = extract_blocks(text, data_pattern)
-        cluster_state = extract_cluster_status(data_text)
-        event_list = extract_vc_event_counts(data_text)
-        keywords = ['库的个数', '表的个数', '视图的个数', '存储过程的个数', '函数的个数']
-        prefix = [system_name, vc]
-        prefix2= prefix + cluster_state
-        data_result2 = extract_next_line_values_list(data_text, keywords, prefix2)
-        data_result3 = data_result2 + event_list
-        # print(f"[✓] 正在处理 {vc} 的数据集群使用信息：{data_result3}")
-        # 提取集群状态
-    
-        cursor.executemany("""
-                           INSERT OR IGNORE INTO data_clusters (
-                           system_name, cluster_name, cluster_state, cluster_mode, 
-                           databases_count, tables_count, views_count, procs_count, funcs_count,
-                           ddl_event, dml_event, dmlstorage_event) 
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                           """, [data_result3])
-
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群信息到数据库")
+    rows = []
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        cluster_state = found.need("state", vc).status
+        event_list = found.need("events", vc).counts or []
+        if len(event_list) != DATA_EVENT_COUNT:
+            raise ValueError(f"巡检文件中 {found.where('events', vc)} 的 event 计数有 {len(event_list)} 个，"
+                             f"应为 {DATA_EVENT_COUNT}")
+        counts = found.need_values("counts", vc)
+        rows.append([found.system_name, vc] + cluster_state + counts + event_list)
+
+    logger.debug(f"[✓] 成功提取集群信息")
+    return [("data_clusters", rows)]
 
 # === 集群使用信息提取结束 === #
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+
 def clean_ansi_escape(s):
-    ansi_escape = re.compile(r'\x1b\[[0-9;]*m')
-    return ansi_escape.sub('', s)
+    return ANSI_ESCAPE_RE.sub('', s)
 
-def extract_gcware_and_coordinator(text):
-    gcware_list = []
-    coordinator_list = []
+class GcwareCoordinatorParser:
+    """gcadmin 输出中的 gcware 表和 coordinator 表"""
 
-    inside_gcware = False
-    inside_coordinator = False
+    def __init__(self):
+        self.gcware_list = []
+        self.coordinator_list = []
+        self.inside_gcware = False
+        self.inside_coordinator = False
 
-    for line in text.splitlines():
+    def feed(self, line):
         line = line.strip()
         line = clean_ansi_escape(line)  # 先清理整行的ANSI码
 
         if "GBASE GCWARE CLUSTER INFORMATION" in line:
-            inside_gcware = True
-            inside_coordinator = False
-            continue
+            self.inside_gcware = True
+            self.inside_coordinator = False
+            return
         elif "GBASE COORDINATOR CLUSTER INFORMATION" in line:
-            inside_gcware = False
-            inside_coordinator = True
-            continue
+            self.inside_gcware = False
+            self.inside_coordinator = True
+            return
         elif "GBASE VIRTUAL CLUSTER INFORMATION" in line:
-            inside_gcware = False
-            inside_coordinator = False
-            continue
+            self.inside_gcware = False
+            self.inside_coordinator = False
+            return
 
         if line.startswith("|") and line.endswith("|") and not set(line) <= set("|-="):
             parts = [p.strip() for p in line.strip('|').split('|')]
 
-            if inside_gcware and len(parts) >= 3 and parts[0].startswith("gcware"):
-                gcware_list.append(parts[:3])
-            elif inside_coordinator and len(parts) >= 4 and parts[0].startswith("coordinator"):
-                coordinator_list.append(parts[:4])
+            if self.inside_gcware and len(parts) >= 3 and parts[0].startswith("gcware"):
+                self.gcware_list.append(parts[:3])
+            elif self.inside_coordinator and len(parts) >= 4 and parts[0].startswith("coordinator"):
+                self.coordinator_list.append(parts[:4])
 
-    return gcware_list, coordinator_list
+class NodeTableParser:
+    """gcadmin 输出中 NodeName ... DataState 表头之后的 node 行"""
+    HEADER = re.compile(r'\| *NodeName *\|.*\| *DataState *\|')
+    SEPARATOR = re.compile(r'^[-=]+$')
 
-def extract_ins_node_info(text):
-    lines = clean_ansi_escape(text).splitlines()
-    node_list = []
-    in_table = False
-    header_indexes = {}
+    def __init__(self):
+        self.node_list = []
+        self.in_table = False
+        self.header_indexes = {}
 
-    for i, line in enumerate(lines):
-        line = line.strip()
+    def feed(self, line):
+        line = clean_ansi_escape(line).strip()
 
         # 寻找表头行
-        if re.match(r'\| *NodeName *\|.*\| *DataState *\|', line):
+        if self.HEADER.match(line):
             headers = [h.strip() for h in line.strip('|').split('|')]
             for idx, header in enumerate(headers):
-                header_indexes[header.lower()] = idx
-            in_table = True
-            continue
+                self.header_indexes[header.lower()] = idx
+            self.in_table = True
+            return
 
-        if in_table:
+        if self.in_table:
             # 表格结束条件：不再以“|”开头
-            if not line.startswith('|') or re.match(r'^[-=]+$', line.replace('|', '').strip()):
-                continue
+            if not line.startswith('|') or self.SEPARATOR.match(line.replace('|', '').strip()):
+                return
 
             parts = [p.strip() for p in line.strip('|').split('|')]
+            header_indexes = self.header_indexes
 
             try:
                 name = parts[header_indexes['nodename']]
@@ -1381,174 +2268,344 @@ def extract_ins_node_info(text):
                 syncserver = parts[header_indexes['syncserver']]
                 datastate = parts[header_indexes['datastate']]
                 if name.startswith("node"):
-                    node_list.append([name, ip, gnode, syncserver, datastate])
+                    self.node_list.append([name, ip, gnode, syncserver, datastate])
             except (KeyError, IndexError):
-                continue  # 跳过不完整或格式不对的行
-
-    return node_list
-
-def get_instances(text, db_path):
-    # 这里可以添加对进程信息的提取逻辑
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+                return  # 跳过不完整或格式不对的行
+
+def get_instances(found):
+    """提取 gcware、coordinator 和各 VC 的 node 实例"""
+    system_name = found.system_name
+    coor = found.need("coor")
+    outputs = [
+        ("gcware", [(system_name, 'coor', *row) for row in coor.gcware_list]),
+        ("coordinator", [(system_name, 'coor', *row) for row in coor.coordinator_list]),
+    ]
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator GBase Cluster Information=+\n(.*?)(?=^=+Coordinator GBase Cluster variables=+)"
-    ins_pattern = r"\ * Coor Cluster拓扑及状态：\n(.*?)(?=\ * Coor Cluster Failover信息：)"
-    coor_text = extract_blocks(text, coor_pattern)
-    ins_line = extract_blocks(coor_text, ins_pattern)
-    # print(f"[✓] 正在处理集群自启动信息：{ins_line}")
-    gcware_info, coordinator_info = extract_gcware_and_coordinator(ins_line)
-    system_name = get_cluster_name(text)
-    prefix = [system_name, 'coor']
-    gcware_info_prefix = [prefix + row for row in gcware_info]
-    coordinator_info_prefix = [prefix + row for row in coordinator_info]
-
-    tuple_gcware = [tuple(row) for row in gcware_info_prefix]
-    tuple_coordinator = [tuple(row) for row in coordinator_info_prefix]
-
-    cursor.executemany("INSERT OR IGNORE INTO instances (system_name, cluster_name, namenode, ip_address, gcware) VALUES (?, ?, ?, ?, ?)", tuple_gcware)
-    cursor.executemany("INSERT OR IGNORE INTO instances (system_name, cluster_name, namenode, ip_address, gcluster, datastate) VALUES (?, ?, ?, ?, ?, ?)", tuple_coordinator)
-
-    vc_names = extract_vc_names(text)
-
-    for vc in vc_names:
-        print(f"[✓] 正在处理 VC：{vc}")
-        data_pattern = (
-            rf"=+ Data GBase Cluster Information\s+'{vc}'\s+=+\n"  # 开始
-            r"(.*?)"                                              # 捕获中间内容
-            rf"=+ Data GBase Cluster variables\s+{vc}\s+=+"  # 结束
-        )
-        data_text = extract_blocks(text, data_pattern)
-        ins_pattern2 = r"\ * Data Cluster 拓扑及状态：\n(.*?)(?=\ * Data Cluster DDL&DML&DMLSTORAGE Event信息：)"
-        ins_line2 = extract_blocks(data_text, ins_pattern2)
-        ins2 = extract_ins_node_info(ins_line2)
-
-        prefix2 = [system_name, vc]
-        ins_list_prefix2 = [prefix2 + row for row in ins2]
-        tuple_data2 = [tuple(row) for row in ins_list_prefix2]
-        cursor.executemany("""
-                           INSERT OR IGNORE INTO instances (
-                           system_name, cluster_name, namenode, ip_address, gnode, syncserver, datastate
-                           ) 
-                           VALUES (?, ?, ?, ?, ?, ?, ?)
-                           """, tuple_data2)
+    for vc in found.vc_names:
+        logger.debug(f"[✓] 正在处理 VC：{vc}")
+        outputs.append(("node", [(system_name, vc, *row) for row in found.need("vc", vc).node_list]))
+
+    logger.debug(f"[✓] 成功提取集群实例信息")
+    return outputs
+
+
+class Coordinator1IpParser:
+    """coordinator1 的 IP"""
+
+    def __init__(self):
+        self.ip = None
+
+    def feed(self, line):
+        if self.ip is None:
+            match = re.search(r'\| *coordinator1 *\| *([\d.]+) *\|', clean_ansi_escape(line))
+            if match:
+                self.ip = match.group(1)
+
+class GbaseVersionParser:
+    """GBase版本号 所在行的下一行（非空行）"""
+
+    def __init__(self):
+        self.armed = False
+        self.version = None
+
+    def feed(self, line):
+        if self.version is not None:
+            return
+        if self.armed and line:
+            self.version = line.strip()
+            return
+        self.armed = "GBase版本号" in line
+
+class TextParser:
+    """原样保留子项内容，去掉末尾单独的 * 行"""
+
+    def __init__(self):
+        self.lines = []
+
+    def feed(self, line):
+        self.lines.append(line)
+
+    @property
+    def text(self):
+        text = "\n".join(self.lines)
+        # 去掉末尾 "\n  *"：从 * 之前那段空白里的第一个换行截断
+        if text.endswith('*'):
+            head = text[:-1].rstrip()
+            newline = text.find('\n', len(head), len(text) - 1)
+            if newline >= 0:
+                text = text[:newline]
+        return text
+
+def get_sys_cluster(found):
+    """提取协调节点信息"""
+    sys_data = [
+        found.system_name,
+        found.need("coordinator1").ip,
+        found.need("version").version,
+        found.need("crontab").text,
+        found.need("failover").text,
+    ]
+    logger.debug(f"[✓] 成功提取集群信息")
+    return [("sys_clusters", [sys_data])]
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群实例信息到数据库")
 
+# === 从文件中提取信息 ===
+# 提取器注册表，按顺序组装和写入；新增指标只需在这里登记字段，不增加对文件的扫描
+FILE_EXTRACTORS = [
+    Extractor(
+        "get_machine_records",
+        {
+            **machine_fields("coor_", COOR_MACHINE, [
+                "管理节点操作系统版本", "Hostname", "CPU model name信息", "CPU 逻辑核数信息", "CPU 物理核数",
+                "服务器IP地址列表", "物理内存使用情况", "SWAP内存使用情况", "管理节点空间使用情况",
+            ], r"coor\s+(\d{1,3}(?:\.\d{1,3}){3}):"),
+            **machine_fields("vc_", DATA_MACHINE, [
+                "计算节点操作系统版本", "Hostname", "CPU model name信息", "CPU 逻辑核数", "CPU 物理核数",
+                "计算集群IP列表", "物理内存使用情况", "SWAP使用情况", "计算集群各节点空间情况",
+            ], r"(?<!\s)\s+(\d{1,3}(?:\.\d{1,3}){3}):"),
+        },
+        {"machines": MACHINES_UPSERT, "machine_using": MACHINE_USING_UPSERT},
+        get_machine_records,
+    ),
+    Extractor(
+        "get_cluster_disk_using",
+        {
+            "coor": Field(COOR_MACHINE, None, partial(NextLineParser, COOR_DISK_KEYWORDS)),
+            "vc": Field(DATA_MACHINE, None, partial(NextLineParser, VC_DISK_KEYWORDS)),
+        },
+        {"clusters_disk_using": insert_ignore_sql("clusters_disk_using", [
+            "system_name", "cluster_name", "disk_total", "disk_used", "disk_avail", "disk_use_per",
+            "disk_total_bytes", "disk_used_bytes", "disk_avail_bytes", "disk_use_pct"])},
+        get_cluster_disk_using,
+    ),
+    Extractor(
+        "get_cluster_process",
+        {
+            "coor": Field(COOR_CLUSTER, "管理节点进程状态", ProcessBlockParser, until="管理节点日志大小"),
+            "vc": Field(DATA_CLUSTER, "Data Cluster 进程状态", ProcessLineParser, until="Data Cluster 日志情况"),
+        },
+        {"clusters_process": insert_ignore_sql("clusters_process", [
+            "system_name", "cluster_name", "ip_address", "process_cmd"])},
+        get_cluster_process,
+    ),
+    Extractor(
+        "get_cluster_logs",
+        {
+            "coor": Field(COOR_CLUSTER, "管理节点日志大小", DuInfoParser, until="自启动设置"),
+            "vc": Field(DATA_CLUSTER, "Data Cluster 日志情况", DuInfoParser, until="Data Cluster 自启动"),
+        },
+        {"clusters_logs": insert_ignore_sql("clusters_logs", [
+            "system_name", "cluster_name", "ip_address", "log_used", "log_path", "log_used_bytes"])},
+        get_cluster_logs,
+    ),
+    Extractor(
+        "get_auto_start",
+        {
+            "coor": Field(COOR_CLUSTER, "自启动设置", CommandBlockParser, until="监控运维脚本"),
+            "vc": Field(DATA_CLUSTER, "Data Cluster 自启动", CommandDataParser, until=ITEM_TO_END),
+        },
+        {"auto_start": insert_ignore_sql("auto_start", [
+            "system_name", "cluster_name", "ip_address", "process_start"])},
+        get_auto_start,
+    ),
+    Extractor(
+        "get_cluster_variables",
+        {
+            "coor": Field(COOR_VARIABLES, None, RefActualParser),
+            "vc": Field(DATA_VARIABLES, None, RefActualParser),
+        },
+        {"cluster_variables": insert_ignore_sql("cluster_variables", [
+            "system_name", "cluster_name", "ip_address", "var_name", "var_reference", "config_file",
+            "var_actual", "var_reference_value", "var_actual_value"])},
+        get_cluster_variables,
+    ),
+    Extractor(
+        "get_data_cluster_using",
+        {
+            "state": Field(DATA_CLUSTER, None, ClusterStatusParser),
+            "events": Field(DATA_CLUSTER, None, EventCountParser),
+            "counts": Field(DATA_CLUSTER, None, partial(NextLineParser, DATA_COUNT_KEYWORDS)),
+        },
+        {"data_clusters": insert_ignore_sql("data_clusters", [
+            "system_name", "cluster_name", "cluster_state", "cluster_mode",
+            "databases_count", "tables_count", "views_count", "procs_count", "funcs_count",
+            "ddl_event", "dml_event", "dmlstorage_event"])},
+        get_data_cluster_using,
+    ),
+    Extractor(
+        "get_instances",
+        {
+            "coor": Field(COOR_CLUSTER, "Coor Cluster拓扑及状态", GcwareCoordinatorParser, until="Coor Cluster Failover信息"),
+            "vc": Field(DATA_CLUSTER, "Data Cluster 拓扑及状态", NodeTableParser, until="Data Cluster DDL&DML&DMLSTORAGE Event信息"),
+        },
+        {
+            "gcware": insert_ignore_sql("instances", ["system_name", "cluster_name", "namenode", "ip_address", "gcware"]),
+            "coordinator": insert_ignore_sql("instances", [
+                "system_name", "cluster_name", "namenode", "ip_address", "gcluster", "datastate"]),
+            "node": insert_ignore_sql("instances", [
+                "system_name", "cluster_name", "namenode", "ip_address", "gnode", "syncserver", "datastate"]),
+        },
+        get_instances,
+    ),
+    Extractor(
+        "get_sys_cluster",
+        {
+            "crontab": Field(COOR_CLUSTER, "监控运维脚本", TextParser, until="Coor Cluster拓扑及状态"),
+            "coordinator1": Field(COOR_CLUSTER, None, Coordinator1IpParser),
+            "failover": Field(COOR_CLUSTER, "Coor Cluster Failover信息", TextParser, until="GBase版本号"),
+            "version": Field(COOR_CLUSTER, None, GbaseVersionParser),
+        },
+        {"sys_clusters": insert_ignore_sql("sys_clusters", [
+            "system_name", "ma_one_ip", "gbase_version", "crontab_always", "failover_info"])},
+        get_sys_cluster,
+    ),
+]
+
+INSPECTION_ENGINE = ExtractionEngine(FILE_EXTRACTORS)
+
+def parse_content(file_content, source, metrics=None):
+    """把已读入的文件内容解析为待写入的 RowBatch，见 parse_lines"""
+    return parse_lines(file_content.split("\n"), source, metrics)
+
+def parse_lines(lines, source, metrics=None):
+    """把逐行给出的文件内容（不含换行符）解析为待写入的 RowBatch，不访问数据库。
+
+    全文按行只扫描一次，行可以来自文件流，扫描中只保留各字段提取出的值，
+    之后各提取器再按顺序组装数据行。各提取器互不依赖：某个提取器出错时只丢弃
+    它已产生的数据，其余提取器照常写入，截断或部分段落异常的文件仍保留能解析的
+    部分。返回 (系统名, batch, 异常信息)，异常信息为各出错提取器的信息，没有时为 None。
+    传入 StageMetrics 时记录扫描耗时，以及每个提取器的耗时和产生的数据行数。
+    """
+    logger.info(f"[✓] 正在处理文件: {source}")
+    batch = RowBatch()
 
-def extract_coordinator1_ip(text):
-    clean_text = clean_ansi_escape(text)
-    match = re.search(r'\| *coordinator1 *\| *([\d.]+) *\|', clean_text)
-    if match:
-        return match.group(1)
-    return None
+    metrics = metrics or StageMetrics()
+    with metrics.stage("parse.scan"):
+        scan = INSPECTION_ENGINE.scan(lines)
 
-def extract_gbase_version(text):
-    match = re.search(r'GBase版本号.*?\n([^\n]+)', text)
-    if match:
-        return match.group(1).strip()
-    return None
-
-def get_sys_cluster(text, db_path):
-    # 这里可以添加对进程信息的提取逻辑
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    errors = []
+    for extractor in INSPECTION_ENGINE.extractors:
+        done = batch.mark()
+        try:
+            with metrics.stage(f"parse.{extractor.name}") as counts:
+                before = batch.row_count()
+                INSPECTION_ENGINE.extract(scan, extractor, batch)
+                counts["rows"] = batch.row_count() - before
+        except Exception as e:
+            batch.rollback_to(done)
+            errors.append(f"{extractor.name}：{e}")
 
-    # 提取协调节点信息
-    coor_pattern = r"^=+Coordinator GBase Cluster Information=+\n(.*?)(?=^=+Coordinator GBase Cluster variables=+)"
-    cron_pattern = r"\ * 监控运维脚本：\n(.*?)(?=\ * Coor Cluster拓扑及状态：)"
-    failover_pattern = r"\ * Coor Cluster Failover信息：\n(.*?)(?=\ * GBase版本号：)"
-    coor_text = extract_blocks(text, coor_pattern)
-    cron_line = extract_blocks(coor_text, cron_pattern)
-    cron_line_new = re.sub(r'\n\s*\*$', '', cron_line.strip())
-    ma_one = extract_coordinator1_ip(coor_text)
-    system_name = get_cluster_name(text)
-    failover_line = extract_blocks(coor_text, failover_pattern)
-    failover_line_new = re.sub(r'\n\s*\*$', '', failover_line.strip())
-    gbase_version = extract_gbase_version(coor_text)
-    sys_data = [system_name, ma_one, gbase_version, cron_line_new, failover_line_new]
-
-    cursor.executemany("INSERT OR IGNORE INTO sys_clusters (system_name, ma_one_ip, gbase_version, crontab_always, failover_info) VALUES (?, ?, ?, ?, ?)", [sys_data])
+    return scan.system_name, batch, "；".join(errors) or None
 
-    conn.commit()
-    conn.close()
-    print(f"[✓] 成功写入集群信息到数据库")
 
+# === 根据每个系统名，进行巡检处理 开始 ===
+class ReportContext:
+    """单个系统的报告上下文：各项诊断把结论写入 data，而不是共享的全局字典，
+    这样系统之间互不串值，也可以放到不同进程里并行生成"""
+
+    def __init__(self, system_name, db_path):
+        self.system_name = system_name
+        self.db_path = db_path
+        self.data = {}
+        self.metrics = StageMetrics(system_name)
+
+    def diagnose(self, check):
+        """执行一项诊断并记录耗时，返回 DataFrame 时同时记录行数"""
+        with self.metrics.stage(f"diagnostics.{check.__name__}") as counts:
+            result = check(self)
+            counts["rows"] = None if result is None else len(result)
+        return result
+
+
+def render_system_job(job):
+    """子进程入口：生成一个系统的报告，日志和阶段耗时收集后交回主进程按顺序输出、入库"""
+    system_name, db_path = job
+    ctx = ReportContext(system_name, db_path)
+    error = None
+    with capture_logs() as records:
+        try:
+            logger.info(f"正在处理：{system_name}")
+            each_auto_inspection(ctx)
+        except Exception as e:
+            error = f"{system_name}: {e}"
+    return records, error, ctx.metrics
 
-# === 从文件中提取信息 ===
-def operating_file(file_path):
-    """对文件进行操作的示例函数"""
-    # 这里可以添加对文件内容的处理逻辑
-    print(f"[✓] 正在处理文件: {file_path}")
-    file_content = read_file(file_path)
-
-    # 提取特定块内容
-    insert_ip_to_db(file_content, DB_PATH)
-    get_machine_info(file_content, DB_PATH)
-    get_machine_using(file_content, DB_PATH)
-    get_cluster_disk_using(file_content, DB_PATH)
-    get_cluster_process(file_content, DB_PATH)
-    get_cluster_logs(file_content, DB_PATH)
-    get_auto_start(file_content, DB_PATH)
-    get_cluster_variables(file_content, DB_PATH)
-    get_data_cluster_using(file_content, DB_PATH)
-    get_instances(file_content, DB_PATH)
-    get_sys_cluster(file_content, DB_PATH)
 
+def inspection_mppsystem(db_path, workers=None, systems=None):
+    """读取每个系统最新一次巡检的系统名（只取文件完整入库的批次），逐个或并行生成报告。
 
-# === 根据每个系统名，进行巡检处理 开始 ===
-def inspection_mppsystem(db_path):
-    """从 sys_clusters 表中读取每个系统名"""
+    解析出错的文件只写入了部分提取器的数据，文件记录没有内容哈希，这样的批次不生成报告。
+    systems 给出时只生成其中的系统。
+    """
+    workers = workers or RENDER_WORKERS
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT system_name FROM sys_clusters")
+    cursor.execute("SELECT r.system_name FROM current_runs r "
+                   "JOIN files f ON f.id = r.file_id AND f.content_hash IS NOT NULL ORDER BY r.run_id")
     rows = cursor.fetchall()
-
-    for row in rows:
-        system_name = row[0]
-        print(f"正在处理：{system_name}")
-        each_auto_inspection(system_name,DB_PATH)
-
     conn.close()
+    if systems is not None:
+        rows = [row for row in rows if row[0] in systems]
+
+    # 各系统的阶段耗时在报告全部生成（或出错）后统一写入 stage_metrics
+    metrics = []
+    try:
+        if workers <= 1 or len(rows) <= 1:
+            for row in rows:
+                ctx = ReportContext(row[0], db_path)
+                metrics.append(ctx.metrics)
+                logger.info(f"正在处理：{ctx.system_name}")
+                each_auto_inspection(ctx)
+            return
+
+        # 报告只读数据库，各系统相互独立；日志按系统顺序回放，与逐个生成时一致
+        jobs = [(row[0], db_path) for row in rows]
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging,
+                                 initargs=worker_logging_args()) as pool:
+            for records, error, system_metrics in pool.map(render_system_job, jobs):
+                replay_logs(records)
+                metrics.append(system_metrics)
+                if error:
+                    raise RuntimeError(error)
+    finally:
+        save_stage_metrics(db_path, metrics)
 
 
 # === 总体运行情况 === 
-def operational_status(system_name,db_path):
+def operational_status(ctx):
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute("select count(*) from machines where system_name = ?", (system_name,))
+    cursor.execute("select count(*) from machines where run_id = (select run_id from current_runs where system_name = ?)", (system_name,))
     row = cursor.fetchone()
     if row:
         all_nodes_count = row[0]
 
-    cursor.execute("select count(*) from machines where system_name = ? and cluster_name = 'coor'", (system_name,))
+    cursor.execute("select count(*) from machines where run_id = (select run_id from current_runs where system_name = ?) and cluster_name = 'coor'", (system_name,))
     row = cursor.fetchone()
     if row:
         coor_nodes_count = row[0]
 
     data_nodes_count = all_nodes_count - coor_nodes_count
 
-    cursor.execute("select gbase_version from sys_clusters where system_name = ?", (system_name,))
+    cursor.execute("select gbase_version from sys_clusters where run_id = (select run_id from current_runs where system_name = ?)", (system_name,))
     row = cursor.fetchone()
     if row:
         gbase_version = row[0]    
 
-    cursor.execute("select cluster_state,cluster_mode from data_clusters where system_name = ? limit 1", (system_name,))
+    cursor.execute("select cluster_state,cluster_mode from data_clusters where run_id = (select run_id from current_runs where system_name = ?) limit 1", (system_name,))
     row = cursor.fetchone()
     if row:
         cluster_state, cluster_mode = row  # 拆包两个值
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     cursor.execute("""
         WITH counts AS (
             SELECT os_version , COUNT(*) AS count
-            FROM machines where system_name = ?
+            FROM machines where run_id = (select run_id from current_runs where system_name = ?)
             GROUP BY os_version 
         )
         SELECT os_version
@@ -1559,12 +2616,12 @@ def operational_status(system_name,db_path):
     if row:
         platform = row[0]
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     cursor.execute("""
         WITH counts AS (
             SELECT cpu_model_name, cpu_logic_core, cpu_physical_core , COUNT(*) AS count
-            FROM machines where system_name = ?
+            FROM machines where run_id = (select run_id from current_runs where system_name = ?)
             GROUP BY cpu_logic_core, cpu_physical_core
         )
         SELECT cpu_model_name, cpu_logic_core, cpu_physical_core
@@ -1575,18 +2632,18 @@ def operational_status(system_name,db_path):
     if row:
         cpu_model_name, cpu_logic_core, cpu_physical_core = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
     match = re.search(r'model name\s*:\s*(.+)', cpu_model_name)
     if match:
         model_name = match.group(1)
         # print("提取到的 model name:", model_name)
     else:
-        print("没有匹配到")
+        logger.warning("没有匹配到")
 
     cursor.execute("""
         WITH counts AS (
             SELECT mem_total, swap_total, COUNT(*) AS count
-            FROM machine_using where system_name = ? and cluster_name = 'coor'
+            FROM machine_using where run_id = (select run_id from current_runs where system_name = ?) and cluster_name = 'coor'
             GROUP BY mem_total, swap_total
         )
         SELECT mem_total, swap_total
@@ -1597,12 +2654,12 @@ def operational_status(system_name,db_path):
     if row:
         cmem, cswap = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     cursor.execute("""
         WITH counts AS (
             SELECT mem_total, swap_total, COUNT(*) AS count
-            FROM machine_using where system_name = ? and cluster_name <> 'coor'
+            FROM machine_using where run_id = (select run_id from current_runs where system_name = ?) and cluster_name <> 'coor'
             GROUP BY mem_total, swap_total
         )
         SELECT mem_total, swap_total
@@ -1613,111 +2670,112 @@ def operational_status(system_name,db_path):
     if row:
         nmem, nswap = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     cursor.execute("""
-select sum(disk_total), sum(disk_used ) from clusters_disk_using where system_name = ? and cluster_name <> 'coor'
+select sum(disk_total_bytes), sum(disk_used_bytes) from clusters_disk_using where run_id = (select run_id from current_runs where system_name = ?) and cluster_name <> 'coor'
                     """,(system_name,))
     row = cursor.fetchone()
     if row:
         ndisk_total, ndisk_used = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
     ndisk_per = (ndisk_used / ndisk_total) * 100
     percent_4 = round(ndisk_per, 4)
-    ndisk_used_tb = ndisk_used / 1024 / 1024 / 1024
+    ndisk_used_tb = ndisk_used / 1024 ** 4
     ndisk_used_tb_4 = round(ndisk_used_tb, 4)
 
     cursor.execute("""
-SELECT sum(databases_count), sum(tables_count), sum(views_count), sum(procs_count), sum(funcs_count) from data_clusters dc where system_name = ?
+SELECT sum(databases_count), sum(tables_count), sum(views_count), sum(procs_count), sum(funcs_count) from data_clusters dc where run_id = (select run_id from current_runs where system_name = ?)
                     """,(system_name,))
     row = cursor.fetchone()
     if row:
         ndbc,ntbc,nviewc,nprocc,nfuncc = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     conn.close()
-    print("=============== 总体运行情况 ==================")
-    print(f"""
+    logger.info("=============== 总体运行情况 ==================")
+    logger.info(f"""
 Name:\t{system_name}\nNodes:\t{all_nodes_count},{coor_nodes_count},{data_nodes_count}\nRelese:\t{gbase_version}
 State:\t{cluster_state}\nMode:\t{cluster_mode}\nPlatform:\t{platform}\nCPU:\tModel Name: {model_name}, Count: {cpu_physical_core}, Cores: {cpu_logic_core}
 CoorMemTotal:\tMEM: {cmem}, Swap: {cswap}\nNodeMemTotal:\tMEM: {nmem}, Swap: {nswap}
 DBSize:\t{ndisk_used_tb_4} ({percent_4}%)
 DBUsed:\tDB num: {ndbc}, Tab num: {ntbc}, View num: {nviewc}, PROC num: {nprocc}, FUNC num: {nfuncc}
         """)
-    report_data['ALL_NODE_C'] = f"ALL: {all_nodes_count}\nGC: {coor_nodes_count}\nGN: {data_nodes_count}"
-    report_data['RELESE'] = gbase_version
-    report_data['GSTATE'] = cluster_state
-    report_data['GMODE'] = cluster_mode
-    report_data['PLATFORM'] = platform
-    report_data['CPU'] = f"{model_name}\n{cpu_physical_core}\n{cpu_logic_core}"
-    report_data['MEMORY'] = f"Coor: {cmem}, Data: {nmem}\nCoor: {cswap}, Data: {nswap}"
-    report_data['DBSIZE'] = f"{ndisk_used_tb_4}\n({percent_4}%)"
-    report_data['DNUM'] = ndbc
-    report_data['TNUM'] = ntbc
-    report_data['VNUM'] = nviewc
-    report_data['PNUM'] = nprocc
-    report_data['FNUM'] = nfuncc
+    ctx.data['ALL_NODE_C'] = f"ALL: {all_nodes_count}\nGC: {coor_nodes_count}\nGN: {data_nodes_count}"
+    ctx.data['RELESE'] = gbase_version
+    ctx.data['GSTATE'] = cluster_state
+    ctx.data['GMODE'] = cluster_mode
+    ctx.data['PLATFORM'] = platform
+    ctx.data['CPU'] = f"{model_name}\n{cpu_physical_core}\n{cpu_logic_core}"
+    ctx.data['MEMORY'] = f"Coor: {cmem}, Data: {nmem}\nCoor: {cswap}, Data: {nswap}"
+    ctx.data['DBSIZE'] = f"{ndisk_used_tb_4}\n({percent_4}%)"
+    ctx.data['DNUM'] = ndbc
+    ctx.data['TNUM'] = ntbc
+    ctx.data['VNUM'] = nviewc
+    ctx.data['PNUM'] = nprocc
+    ctx.data['FNUM'] = nfuncc
 
 
 
 # === 空间可用性 ===
-def data_cluster_used(system_name,db_path):
+def data_cluster_used(ctx):
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("""
-select sum(disk_total), sum(disk_used ) from clusters_disk_using where system_name = ? and cluster_name <> 'coor'
+select sum(disk_total_bytes), sum(disk_used_bytes) from clusters_disk_using where run_id = (select run_id from current_runs where system_name = ?) and cluster_name <> 'coor'
                     """,(system_name,))
     row = cursor.fetchone()
     if row:
         ndisk_total, ndisk_used = row
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
     ndisk_per = (ndisk_used / ndisk_total) * 100
     percent_4 = round(ndisk_per, 4)
-    ndisk_total_tb = ndisk_used / 1024 / 1024 / 1024
+    ndisk_total_tb = ndisk_used / 1024 ** 4
     ndisk_total_tb_4 = round(ndisk_total_tb, 4)
     ndisk_a = ndisk_total_tb * 0.8
     ndisk_a_4 = round(ndisk_a, 4)
-    ndisk_used_tb = ndisk_used / 1024 / 1024 / 1024
+    ndisk_used_tb = ndisk_used / 1024 ** 4
     ndisk_used_tb_4 = round(ndisk_used_tb, 4)
 
     cursor.execute("""
-select count(*) from machines where system_name = ? and cluster_name <> 'coor';
+select count(*) from machines where run_id = (select run_id from current_runs where system_name = ?) and cluster_name <> 'coor';
                     """,(system_name,))
     row = cursor.fetchone()
     if row:
         node_count = row[0]
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
 
     conn.close()
-    print("=============== 集群空间可用性 ==================")
+    logger.info("=============== 集群空间可用性 ==================")
     if ndisk_per > 80:
-        print(f"⚠️ {system_name}: 集群空间大于80%，建议清理空间或者扩容")
-        report_data["ALARM_DISK_USEING"] = "集群空间大于80%，建议清理空间或者扩容"
+        logger.warning(f"⚠️ {system_name}: 集群空间大于80%，建议清理空间或者扩容")
+        ctx.data["ALARM_DISK_USEING"] = "集群空间大于80%，建议清理空间或者扩容"
     else:
-        report_data["ALARM_DISK_USEING"] = "集群空间小于80%，集群空间使用正常"
+        ctx.data["ALARM_DISK_USEING"] = "集群空间小于80%，集群空间使用正常"
 
-    print(f"""
+    logger.info(f"""
 集群共有{node_count}个数据节点，合计{ndisk_total_tb_4}TB存储空间，GBase集群实际可存储空间约为{ndisk_a_4}TB(GBase有效存储空间=总空间*80% )，目前已使用约{ndisk_used_tb_4}TB，约占总空间的{percent_4}%。
         """)
-    dft = get_disk_from_db(system_name,db_path)
-    print(dft)
+    dft = get_disk_from_db(ctx)
+    logger.debug("%s", dft)
 
 
-    report_data['NODE_COUNT'] = node_count
-    report_data['NDOSK_T'] = ndisk_total_tb_4
-    report_data['NDOSK_A'] = ndisk_a_4
-    report_data['NDISK_U'] = ndisk_used_tb_4
-    report_data['PERCENT'] = percent_4
-    # report_data['FNUM'] = nfuncc
+    ctx.data['NODE_COUNT'] = node_count
+    ctx.data['NDOSK_T'] = ndisk_total_tb_4
+    ctx.data['NDOSK_A'] = ndisk_a_4
+    ctx.data['NDISK_U'] = ndisk_used_tb_4
+    ctx.data['PERCENT'] = percent_4
+    # ctx.data['FNUM'] = nfuncc
     return dft
 
 
-def write_df_to_table(doc: _Document, df: pd.DataFrame, table_index: int):
+def write_df_to_table(doc: _Document, df: pd.DataFrame, table_index: int, template=None):
     """
     将 pandas.DataFrame 写入 Word 文档中的指定表格。
     保留表头，使用模板的第二行作为格式样式，将其删除后添加数据行。
@@ -1726,54 +2784,86 @@ def write_df_to_table(doc: _Document, df: pd.DataFrame, table_index: int):
     :param doc: 已打开的 docx.Document 对象
     :param df: pandas.DataFrame，表格数据
     :param table_index: 要写入的表格在文档中的索引（从 0 开始）
+    :param template: CompiledTemplate，给出时按预先记录的位置直接定位表格
     """
-    tables = doc.tables
-    if table_index >= len(tables):
-        raise IndexError(f"文档中不存在索引为 {table_index} 的表格")
-
-    table: Table = tables[table_index]
-
-    if len(table.rows) < 2:
+    from docx.table import Table
+    if template is not None and table_index in template.tables:
+        table: Table = template.table(doc, table_index)
+    else:
+        tables = doc.tables
+        if table_index >= len(tables):
+            raise IndexError(f"文档中不存在索引为 {table_index} 的表格")
+        table: Table = tables[table_index]
+
+    tbl = table._tbl
+    trs = tbl.tr_lst
+    if len(trs) < 2:
         raise ValueError("目标表格必须包含至少两行：表头和一个空模板行")
 
-    # 复制第二行作为样式模板，然后删除它
-    template_row = copy.deepcopy(table.rows[1]._tr)
-    table._tbl.remove(table.rows[1]._tr)
-
     num_cols = len(table.rows[0].cells)
 
-    # 删除旧数据行
-    while len(table.rows) > 1:
-        table._tbl.remove(table.rows[1]._tr)
-
-    # 添加新数据
-    for _, row in df.iterrows():
-        new_tr = copy.deepcopy(template_row)
-        table._tbl.append(new_tr)
-        new_row_cells = table.rows[-1].cells
-
-        for i in range(min(num_cols, len(row))):
-            cell = new_row_cells[i]
-            cell.text = ""  # 清空原模板内容
-
-            # 插入带样式的段落
-            para = cell.paragraphs[0]
-            run = para.add_run(str(row.iloc[i]))
-            run.font.size = Pt(8)  # 字体大小 8 
+    # 第二行作为样式模板，连同旧数据行一起删除
+    template_row = trs[1]
+    for tr in trs[1:]:
+        tbl.remove(tr)
+
+    # 按模板行先做好一行"空白数据行"：单元格已清空并放好 8 号字的 run，
+    # 每行只需复制它再填入文字，结构与逐个单元格 cell.text / add_run 的结果一致
+    prototype, slots = build_row_prototype(template_row, min(num_cols, df.shape[1]))
+
+    # 按列取出文字（与 iterrows 一样按整表公共类型取值），所有行做好后一次追加
+    values = df.to_numpy()
+    columns = [[str(v) for v in values[:, i]] for _, i in slots]
+    rows = []
+    for n in range(len(values)):
+        new_tr = copy.deepcopy(prototype)
+        tcs = new_tr.tc_lst
+        for (k, _), texts in zip(slots, columns):
+            if texts[n]:
+                tcs[k].p_lst[-1].r_lst[-1].text = texts[n]
+        rows.append(new_tr)
+    tbl.extend(rows)
+
+
+def build_row_prototype(template_row, num_cols):
+    """
+    由模板行生成空白数据行，返回 (行元素, [(单元格序号, 列序号)])。
+    跨列合并的单元格对应多个列，与逐列写入一样只保留最后一列的值。
+    """
+    from docx.text.run import Run
+    from docx.shared import Pt
+    prototype = copy.deepcopy(template_row)
+    grid = [k for k, tc in enumerate(prototype.tc_lst) for _ in range(tc.grid_span)]
+    slots = {}
+    for i in range(min(num_cols, len(grid))):
+        slots[grid[i]] = i
+
+    tcs = prototype.tc_lst
+    for k in slots:
+        tc = tcs[k]
+        tc.clear_content()  # 清空原模板内容
+        p = tc.add_p()
+        p.add_r()
+        run = Run(p.add_r(), None)
+        run.font.size = Pt(8)  # 字体大小 8
+    return prototype, sorted(slots.items())
 
 # === 获取机器空间 ===
-def get_disk_from_db(system_name,db_path):
+def get_disk_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # cursor = conn.cursor()
 #     cursor.execute("""
 # select ROW_NUMBER() OVER () AS row_num, m.hostname, m.ip_address, mu.disk_size, mu.disk_used, mu.disk_avail, mu.disk_use_per
-# from machines m join machine_using mu on m.ip_address = mu.ip_address
-# where m.system_name = ? and m.cluster_name <> 'coor';
+# from machines m join machine_using mu on m.run_id = mu.run_id and m.ip_address = mu.ip_address
+# where m.run_id = (select run_id from current_runs where system_name = ?) and m.cluster_name <> 'coor';
 #                     """,(system_name,))
     sql = """
-select ROW_NUMBER() OVER () AS row_num, m.hostname, m.ip_address, mu.disk_size, mu.disk_used, mu.disk_avail, mu.disk_use_per
-from machines m join machine_using mu on m.ip_address = mu.ip_address
-where m.system_name = ? and m.cluster_name <> 'coor';
+select ROW_NUMBER() OVER (order by m.id) AS row_num, m.hostname, m.ip_address, mu.disk_size, mu.disk_used, mu.disk_avail, mu.disk_use_per
+from machines m join machine_using mu on m.run_id = mu.run_id and m.ip_address = mu.ip_address
+where m.run_id = (select run_id from current_runs where system_name = ?) and m.cluster_name <> 'coor'
+order by m.id;
                     """
 
     df = pd.read_sql_query(sql, conn, params=(system_name,))
@@ -1786,23 +2876,44 @@ def extract_hostname_number(host):
     match = re.search(r'(\d+)$', host)
     return int(match.group(1)) if match else float('inf')
 
-def check_row(row):
-    if row["cluster_name"] == "coor":
-        required = ["gclusterd", "gcrecover", "gcmonit", "gcmmonit"]
-    else:
-        required = ["gcmonit", "gcmmonit", "gbased", "gc_sync_server"]
-    
-    missing = [col for col in required if row[col] != 1]
-    if missing:
-        return f"{row['hostname']} ({row['ip']}): 缺少组件 {', '.join(missing)}"
-    return None
-
-def cluster_process_from_db(system_name,db_path):
+def join_alarm_labels(rules, index, sep=", "):
+    """
+    按列拼接告警文字：rules 为 [(标签, 布尔掩码)]，每行按顺序取掩码为 True 的标签，
+    用 sep 连接；一条都不满足的行为空串。
+    """
+    import pandas as pd
+    text = pd.Series("", index=index, dtype=object)
+    for label, mask in rules:
+        text = text.mask(mask, text + label + sep)
+    return text.str.removesuffix(sep)
+
+def check_row(df):
+    """按节点类型检查必需组件，返回告警列：缺组件的行为告警文字，其余为 None"""
+    import pandas as pd
+    coor = df["cluster_name"] == "coor"
+    coor_required = ["gclusterd", "gcrecover", "gcmonit", "gcmmonit"]
+    data_required = ["gcmonit", "gcmmonit", "gbased", "gc_sync_server"]
+
+    # 两个列表合并后各自的相对顺序不变，拼出的组件顺序与逐行检查一致
+    rules = []
+    for col in dict.fromkeys(coor_required + data_required):
+        required = pd.Series(col in data_required, index=df.index)
+        required[coor] = col in coor_required
+        rules.append((col, required & (df[col] != 1)))
+    missing = join_alarm_labels(rules, df.index)
+
+    alarm = df["hostname"].astype(str) + " (" + df["ip_address"].astype(str) + "): 缺少组件 " + missing
+    return alarm.astype(object).where(missing != "", None)
+
+def cluster_process_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # === Step 1: 从数据库中读取数据 ===
     sql = """
     select m.hostname, cp.cluster_name, cp.ip_address, cp.process_cmd from clusters_process cp 
-    join machines m on m.ip_address = cp.ip_address where cp.system_name = ?
+    join machines m on m.run_id = cp.run_id and m.ip_address = cp.ip_address where cp.run_id = (select run_id from current_runs where system_name = ?)
+    order by cp.id
     """
     df = pd.read_sql_query(sql, conn, params=(system_name,))
     conn.close()
@@ -1837,19 +2948,18 @@ def cluster_process_from_db(system_name,db_path):
     # result = result.sort_values(by=['hostname_number'])
     # result = result.drop(columns='hostname_number')  # 排序后可删除辅助列
 
-    print("=============== 集群进程诊断 ==================")
+    logger.info("=============== 集群进程诊断 ==================")
     
-    result["alarm"] = result.apply(check_row, axis=1)
+    result["alarm"] = check_row(result)
     alarms = result[result["alarm"].notnull()][["hostname", "ip_address", "alarm"]]
     if not alarms.empty:
-        print(f"以下主机存在缺失组件：")
-        print(alarms.to_string(index=False))
-        report_data["ALARM_PROCE"] = "主机存在缺失组件"
+        logger.warning("以下主机存在缺失组件：\n%s", alarms.to_string(index=False))
+        ctx.data["ALARM_PROCE"] = "主机存在缺失组件"
     else:
-        print(f"所有主机组件均部署完整。")
-        report_data["ALARM_PROCE"] = "所有主机组件均部署完整"
+        logger.info(f"所有主机组件均部署完整。")
+        ctx.data["ALARM_PROCE"] = "所有主机组件均部署完整"
 
-    print(result)
+    logger.debug("%s", result)
     return result
 
 def extract_log_type(path):
@@ -1870,21 +2980,7 @@ def extract_log_type(path):
     else:
         return None
 
-def size_to_gb(size_str):
-    """将 '5.3M'、'731M' 等字符串转换为 GB 数值"""
-    try:
-        if size_str == "0" or pd.isna(size_str):
-            return 0
-        match = re.match(r"([\d\.]+)([KMGTP])", size_str.upper())
-        if not match:
-            return 0
-        num, unit = float(match.group(1)), match.group(2)
-        factor = {"K": 1/1024/1024, "M": 1/1024, "G": 1, "T": 1024, "P": 1024*1024}
-        return num * factor.get(unit, 0)
-    except:
-        return 0
-
-def check_log_size_alerts(df, log_columns=None, threshold=800, verbose=True):
+def check_log_size_alerts(df, log_columns=None, threshold=800, verbose=True, ctx=None):
     """
     检查 DataFrame 中指定日志列是否超过 threshold（GB），并输出告警。
 
@@ -1893,46 +2989,50 @@ def check_log_size_alerts(df, log_columns=None, threshold=800, verbose=True):
         log_columns  : 要检查的列名列表（默认检查 7 个标准列）
         threshold    : GB 阈值，默认800
         verbose      : 是否打印告警信息，默认True
+        ctx          : ReportContext，告警结论写入其中；为 None 时只打印
 
     返回:
         原始DataFrame的副本，附带 *_gb 列 和 log_alarm 列
     """
+    if ctx is None:
+        ctx = ReportContext(None, None)  # 未传入上下文时结论只打印不保留
     if log_columns is None:
         log_columns = ["system", "express", "gcrecover", "gc_sync_server", "dump", "core", "loader_logs"]
     
     df = df.copy()  # 不修改原始表
 
-    # 转换每列为 GB，并创建 *_gb 列
+    # 转换每列为 GB，并创建 *_gb 列（入库时已换算好的直接使用）
     for col in log_columns:
         gb_col = col + "_gb"
-        df[gb_col] = df[col].apply(size_to_gb)
+        if gb_col not in df.columns:
+            df[gb_col] = parse_size_series(df[col]) / SIZE_UNITS['G']
 
     # 生成告警信息列
-    def get_oversized(row):
-        return ", ".join([col for col in log_columns if row[col + "_gb"] > threshold])
-
-    df["log_alarm"] = df.apply(get_oversized, axis=1)
+    df["log_alarm"] = join_alarm_labels([(col, df[col + "_gb"] > threshold) for col in log_columns], df.index)
 
     # 输出告警
     if verbose:
         alerts = df[df["log_alarm"] != ""]
         if not alerts.empty:
-            print("⚠️ 以下主机存在日志文件超过 {} GB：\n".format(threshold))
-            print(alerts[["hostname", "ip_address", "log_alarm"]].to_string(index=False))
-            report_data["ALARM_LOGS_SIZE"] = f"存在日志文件超过 {threshold} GB"
+            logger.warning("⚠️ 以下主机存在日志文件超过 %s GB：\n%s", threshold,
+                        alerts[["hostname", "ip_address", "log_alarm"]].to_string(index=False))
+            ctx.data["ALARM_LOGS_SIZE"] = f"存在日志文件超过 {threshold} GB"
         else:
-            print("✅ 所有日志文件都未超过 {} GB".format(threshold))
-            report_data["ALARM_LOGS_SIZE"] = f"日志文件正常"
+            logger.info("✅ 所有日志文件都未超过 %s GB", threshold)
+            ctx.data["ALARM_LOGS_SIZE"] = f"日志文件正常"
 
     return df
 
 
-def cluster_logs_from_db(system_name,db_path):
+def cluster_logs_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # === Step 1: 从数据库中读取数据 ===
     sql = """
-    select cl.cluster_name, m.hostname, cl.ip_address, cl.log_used, cl.log_path from clusters_logs cl 
-    join machines m on m.ip_address = cl.ip_address where cl.system_name = ?
+    select cl.cluster_name, m.hostname, cl.ip_address, cl.log_used, cl.log_used_bytes, cl.log_path from clusters_logs cl 
+    join machines m on m.run_id = cl.run_id and m.ip_address = cl.ip_address where cl.run_id = (select run_id from current_runs where system_name = ?)
+    order by cl.id
     """
     df = pd.read_sql_query(sql, conn, params=(system_name,))
     conn.close()
@@ -1952,18 +3052,26 @@ def cluster_logs_from_db(system_name,db_path):
         if log not in pivot.columns:
             pivot[log] = "0"
 
+    # 入库时已换算的字节数，按同样的行列排好后转为 GB
+    sizes = df.pivot_table(index=["hostname", "ip_address"],
+                       columns="log_type",
+                       values="log_used_bytes",
+                       aggfunc="first")
+    sizes = sizes.reindex(index=pivot.index, columns=all_logs) / 1024 ** 3
+    sizes.columns = [log + "_gb" for log in all_logs]
+
     # === Step 5: 重排序并重置索引 ===
     pivot = pivot[all_logs].reset_index()
     # === Step 6: 判断大于800G的 ===
-    check_log_size_alerts(pivot, threshold=800)
+    check_log_size_alerts(pd.concat([pivot, sizes.reset_index(drop=True)], axis=1), threshold=800, ctx=ctx)
     # === Step 7: 输出结果 ===
-    print("=============== 集群日志清理诊断 ==================")
-    print(pivot)
+    logger.info("=============== 集群日志清理诊断 ==================")
+    logger.debug("%s", pivot)
     return pivot
 
 
 
-def check_component_state(df, component_cols=None, datastate_col="datastate", verbose=True):
+def check_component_state(df, component_cols=None, datastate_col="datastate", verbose=True, ctx=None):
     """
     检查组件状态是否异常。
     
@@ -1979,49 +3087,53 @@ def check_component_state(df, component_cols=None, datastate_col="datastate", ve
     返回：
         带 component_alarm 列的 DataFrame
     """
+    import pandas as pd
+    if ctx is None:
+        ctx = ReportContext(None, None)  # 未传入上下文时结论只打印不保留
     if component_cols is None:
         component_cols = ['gcware', 'gcluster', 'gnode', 'syncserver']
     
     df = df.copy()
 
-    def get_alarm(row):
-        problems = []
-        for col in component_cols:
-            val = row.get(col)
-            if val is not None and str(val).strip().upper() != "OPEN":
-                problems.append(col)
-        # DataState 允许为 "0" 或 None
-        val = row.get(datastate_col)
-        if val is not None and str(val).strip() != "0":
-            problems.append(datastate_col.lower())  # 输出字段统一小写
-        return ", ".join(problems) if problems else ""
+    def abnormal(col, normal):
+        # 缺列或值为空都视为正常
+        if col not in df.columns:
+            return pd.Series(False, index=df.index)
+        val = df[col]
+        return val.notna() & (val.astype(str).str.strip().str.upper() != normal)
 
-    df["component_alarm"] = df.apply(get_alarm, axis=1)
+    rules = [(col, abnormal(col, "OPEN")) for col in component_cols]
+    # DataState 允许为 "0" 或 None
+    rules.append((datastate_col.lower(), abnormal(datastate_col, "0")))  # 输出字段统一小写
+    df["component_alarm"] = join_alarm_labels(rules, df.index)
 
     if verbose:
         alerts = df[df["component_alarm"] != ""]
         if not alerts.empty:
-            print("⚠️ 以下节点存在异常组件状态：\n")
-            print(alerts[["namenode", "ip_address", "component_alarm"]].to_string(index=False))
-            report_data["ALARM_INSTANCE"] = "节点存在异常组件状态"
+            logger.warning("⚠️ 以下节点存在异常组件状态：\n%s",
+                        alerts[["namenode", "ip_address", "component_alarm"]].to_string(index=False))
+            ctx.data["ALARM_INSTANCE"] = "节点存在异常组件状态"
         else:
-            print("✅ 所有组件状态正常")
-            report_data["ALARM_INSTANCE"] = "所有组件状态正常"
+            logger.info("✅ 所有组件状态正常")
+            ctx.data["ALARM_INSTANCE"] = "所有组件状态正常"
     
     return df
 
-def cluster_instance_from_db(system_name,db_path):
+def cluster_instance_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # === Step 1: 从数据库中读取数据 ===
     sql = """
-    select namenode, ip_address, gcware, gcluster, gnode, syncserver, datastate  from instances where system_name = ?
+    select namenode, ip_address, gcware, gcluster, gnode, syncserver, datastate  from instances where run_id = (select run_id from current_runs where system_name = ?)
+    order by id
     """
     df = pd.read_sql_query(sql, conn, params=(system_name,))
     conn.close()
-    check_component_state(df)
+    check_component_state(df, ctx=ctx)
     # print(result) 
-    print("=============== 集群实例诊断 ==================")
-    print(df)
+    logger.info("=============== 集群实例诊断 ==================")
+    logger.debug("%s", df)
     return df
 
 
@@ -2050,21 +3162,15 @@ def process_service_logs(df):
         if col not in pivot.columns:
             pivot[col] = 0
 
-    def check_alarm(row):
-        alarms = []
-        if row["cluster_name"] == "coor":
-            if row["gcware_services"] != 1:
-                alarms.append("coor 节点缺少 gcware 服务")
-            if row["gcluster_services"] != 1:
-                alarms.append("coor 节点缺少 gcluster 服务")
-        else:
-            if row["gcluster_services"] != 1:
-                alarms.append("非 coor 节点缺少 gcluster 服务")
-            if row["gcware_services"] == 1:
-                alarms.append("非 coor 节点不应启用 gcware 服务")
-        return ", ".join(alarms)
-
-    pivot["service_alarm"] = pivot.apply(check_alarm, axis=1)
+    coor = pivot["cluster_name"] == "coor"
+    gcware = pivot["gcware_services"] == 1
+    gcluster = pivot["gcluster_services"] == 1
+    pivot["service_alarm"] = join_alarm_labels([
+        ("coor 节点缺少 gcware 服务", coor & ~gcware),
+        ("coor 节点缺少 gcluster 服务", coor & ~gcluster),
+        ("非 coor 节点缺少 gcluster 服务", ~coor & ~gcluster),
+        ("非 coor 节点不应启用 gcware 服务", ~coor & gcware),
+    ], pivot.index)
 
     # 明确列顺序
     column_order = [
@@ -2080,12 +3186,15 @@ def process_service_logs(df):
     return pivot
 
 
-def cluster_auto_start_from_db(system_name,db_path):
+def cluster_auto_start_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # === Step 1: 从数据库中读取数据 ===
     sql = """
     select a.cluster_name, m.hostname, a.ip_address, a.process_start from auto_start a 
-    join machines m on m.ip_address = a.ip_address where a.system_name = ?
+    join machines m on m.run_id = a.run_id and m.ip_address = a.ip_address where a.run_id = (select run_id from current_runs where system_name = ?)
+    order by a.id
     """
     df = pd.read_sql_query(sql, conn, params=(system_name,))
     conn.close()
@@ -2094,90 +3203,69 @@ def cluster_auto_start_from_db(system_name,db_path):
     result = process_service_logs(df)
     alerts = result[result["service_alarm"] != ""]
     if not alerts.empty:
-        print("⚠️ 自启动服务异常，异常节点：")
-        print(alerts[["hostname", "ip_address", "service_alarm"]].to_string(index=False))
-        report_data["ALARM_AUTO_START"] = "自启动服务异常"
+        logger.warning("⚠️ 自启动服务异常，异常节点：\n%s",
+                    alerts[["hostname", "ip_address", "service_alarm"]].to_string(index=False))
+        ctx.data["ALARM_AUTO_START"] = "自启动服务异常"
     else:
-        print("✅ 所有服务自启动状态正常")
-        report_data["ALARM_AUTO_START"] = "服务自启动状态正常"
+        logger.info("✅ 所有服务自启动状态正常")
+        ctx.data["ALARM_AUTO_START"] = "服务自启动状态正常"
     
-    print("=============== 集群自启动诊断 ==================")
-    print(result.to_string(index=False))
+    logger.info("=============== 集群自启动诊断 ==================")
+    logger.debug("%s", result)
     return result
 
 
-def smart_convert(value):
-    """
-    智能转换为数值（单位转字节），无法转换返回 None。
-    """
-    if pd.isna(value):
-        return None
-    try:
-        str_val = str(value).strip()
-        # 普通数字
-        if re.match(r'^\d+(\.\d+)?$', str_val):
-            return float(str_val)
-        # 单位数字（如 30G, 1.2T）
-        match = re.match(r'^([\d.]+)\s*([KMGTP])B?$', str_val, re.IGNORECASE)
-        if match:
-            num = float(match.group(1))
-            unit = match.group(2).upper()
-            unit_map = {
-                'K': 1024,
-                'M': 1024**2,
-                'G': 1024**3,
-                'T': 1024**4,
-                'P': 1024**5
-            }
-            return num * unit_map[unit]
-    except:
-        pass
-    return None
-
-def check_cluster_params(df):
+def check_cluster_params(df, ctx=None):
+    import pandas as pd
+    if ctx is None:
+        ctx = ReportContext(None, None)  # 未传入上下文时结论只打印不保留
     if df.empty:
-        print("⚠️ 没有可用的参数数据，请检查输入数据源。")
+        logger.warning("⚠️ 没有可用的参数数据，请检查输入数据源。")
         return pd.DataFrame()
 
     df = df.copy()
     
-    # 转换
-    df["ref_val"] = df["var_reference"].apply(smart_convert)
-    df["act_val"] = df["var_actual"].apply(smart_convert)
-
-    # 告警判断
-    def alarm_info(row):
-        if pd.isna(row["ref_val"]):
-            return "参考值为空或无效"
-        if pd.isna(row["act_val"]):
-            return "实际值为空或格式无法解析"
-        if abs(row["ref_val"] - row["act_val"]) > 1e-6:
-            return "实际值与参考值不一致"
-        return ""
-
-    df["告警说明"] = df.apply(alarm_info, axis=1)
+    # 转换（入库时已换算好的直接使用）
+    if "ref_val" not in df.columns:
+        df["ref_val"] = parse_size_series(df["var_reference"], pattern=PARAM_VALUE_RE)
+    if "act_val" not in df.columns:
+        df["act_val"] = parse_size_series(df["var_actual"], pattern=PARAM_VALUE_RE)
+
+    # 告警判断：优先级从低到高依次覆盖，每行只保留最先命中的一条
+    ref_val = pd.to_numeric(df["ref_val"], errors="coerce")
+    act_val = pd.to_numeric(df["act_val"], errors="coerce")
+    info = pd.Series("", index=df.index, dtype=object)
+    info = info.mask((ref_val - act_val).abs() > 1e-6, "实际值与参考值不一致")
+    info = info.mask(act_val.isna(), "实际值为空或格式无法解析")
+    info = info.mask(ref_val.isna(), "参考值为空或无效")
+
+    df["告警说明"] = info
     alerts = df[df["告警说明"] != ""]
 
     if alerts.empty:
-        print("✅ 所有集群参数均正常，无异常告警。")
-        report_data["ALARM_VARIABLES"] = "集群参数均正常"
+        logger.info("✅ 所有集群参数均正常，无异常告警。")
+        ctx.data["ALARM_VARIABLES"] = "集群参数均正常"
     else:
-        print("⚠️ 以下集群参数存在异常：")
-        print(alerts[["ip_address", "var_name", "var_reference", "var_actual", "告警说明"]].to_string(index=False))
-        report_data["ALARM_VARIABLES"] = "集群参数存在异常"
+        logger.warning("⚠️ 以下集群参数存在异常：\n%s",
+                    alerts[["ip_address", "var_name", "var_reference", "var_actual", "告警说明"]].to_string(index=False))
+        ctx.data["ALARM_VARIABLES"] = "集群参数存在异常"
     
     return alerts
 
-def cluster_variables_from_db(system_name,db_path):
+def cluster_variables_from_db(ctx):
+    import pandas as pd
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     # === Step 1: 从数据库中读取数据 ===
     sql = """
-    select ip_address, var_name, var_reference, var_actual from cluster_variables where system_name = ?
+    select ip_address, var_name, var_reference, var_actual, var_reference_value as ref_val, var_actual_value as act_val
+    from cluster_variables where run_id = (select run_id from current_runs where system_name = ?)
+    order by id
     """
     dfa = pd.read_sql_query(sql, conn, params=(system_name,))
     conn.close()
-    print("=============== 集群参数诊断 ==================")
-    check_cluster_params(dfa)
+    logger.info("=============== 集群参数诊断 ==================")
+    check_cluster_params(dfa, ctx)
 
 def extract_command_path(line):
     parts = line.split()
@@ -2186,43 +3274,92 @@ def extract_command_path(line):
             return ' '.join(parts[i:])  # 命令部分
     return ''
 
-def check_crontab_entries(reference_text, actual_text, similarity_threshold=0.85):
+CRON_TOKEN_RE = re.compile(r'[\s/;]+')
+
+def index_crontab_commands(actual_lines):
+    """
+    按命令部分去重实际定时任务（相同命令只留第一行，逐行比较时后面的行也不会胜出），
+    并建立 路径片段/单词 → 命令序号 的倒排索引。
+    返回 ([(命令部分, 原始行)], 索引, 每个命令一个已载入的 SequenceMatcher)
+    """
+    import difflib
+    commands = {}
+    for line in actual_lines:
+        commands.setdefault(extract_command_path(line), line)
+    entries = list(commands.items())
+
+    index = {}
+    for pos, (cmd, _) in enumerate(entries):
+        for token in set(CRON_TOKEN_RE.split(cmd)) - {''}:
+            index.setdefault(token, []).append(pos)
+
+    # 被比较的一方固定为实际命令，它的字符索引只建一次
+    matchers = [difflib.SequenceMatcher(None, '', cmd) for cmd, _ in entries]
+    return entries, index, matchers
+
+def best_crontab_match(ref_cmd, entries, index, matchers, similarity_threshold):
+    """
+    找出与参考命令相似度最高且不低于阈值的实际命令，返回 (序号, 相似度)，没有则序号为 None。
+    结果与逐行 SequenceMatcher(None, ref_cmd, act_cmd).ratio() 取最先出现的最大值一致：
+    先比较共享片段多的命令，尽早得到较高的相似度，再用 real_quick_ratio / quick_ratio
+    这两个上界跳过不可能超过当前最好结果（或阈值）的命令。
+    """
+    votes = {}
+    for token in set(CRON_TOKEN_RE.split(ref_cmd)) - {''}:
+        for pos in index.get(token, ()):
+            votes[pos] = votes.get(pos, 0) + 1
+    order = sorted(range(len(entries)), key=lambda pos: (-votes.get(pos, 0), pos))
+
+    best_pos, best_ratio = None, 0
+
+    def beaten(bound, pos):
+        # 低于阈值，或不可能超过当前最好结果（相同相似度时序号靠前的优先）
+        if bound < similarity_threshold:
+            return True
+        return best_pos is not None and (bound < best_ratio or (bound == best_ratio and pos > best_pos))
+
+    for pos in order:
+        matcher = matchers[pos]
+        matcher.set_seq1(ref_cmd)
+        if beaten(matcher.real_quick_ratio(), pos) or beaten(matcher.quick_ratio(), pos):
+            continue
+        ratio = matcher.ratio()
+        if not beaten(ratio, pos):
+            best_pos, best_ratio = pos, ratio
+    return best_pos, best_ratio
+
+def check_crontab_entries(reference_text, actual_text, similarity_threshold=0.85, ctx=None):
+    if ctx is None:
+        ctx = ReportContext(None, None)  # 未传入上下文时结论只打印不保留
     ref_lines = [line.strip() for line in reference_text.strip().splitlines() if line.strip()]
     actual_lines = [line.strip() for line in actual_text.strip().splitlines() if line.strip()]
 
     missing = []
     warnings = []
 
-    for ref_line in ref_lines:
-        if ref_line in actual_lines:
-            continue
-
-        ref_cmd = extract_command_path(ref_line)
-        best_match = None
-        highest_ratio = 0
-
-        for actual_line in actual_lines:
-            act_cmd = extract_command_path(actual_line)
-            # 基于命令部分比较相似度
-            ratio = difflib.SequenceMatcher(None, ref_cmd, act_cmd).ratio()
-            if ratio > highest_ratio:
-                highest_ratio = ratio
-                best_match = actual_line
-
-        if highest_ratio >= similarity_threshold:
-            warnings.append((ref_line, best_match, highest_ratio))
+    # 完全一致的行直接跳过，剩下的才需要建索引做相似度比较
+    exact = set(actual_lines)
+    pending = [line for line in ref_lines if line not in exact]
+    if pending:
+        entries, index, matchers = index_crontab_commands(actual_lines)
+
+    for ref_line in pending:
+        # 基于命令部分比较相似度
+        pos, ratio = best_crontab_match(extract_command_path(ref_line), entries, index, matchers, similarity_threshold)
+        if pos is not None:
+            warnings.append((ref_line, entries[pos][1], ratio))
         else:
             missing.append(ref_line)
 
     lines = []
     if missing:
-        report_data["ALARM_CRON"] = "定时任务有缺失"
+        ctx.data["ALARM_CRON"] = "定时任务有缺失"
         lines.append("❌ 缺失的定时任务（完全未找到）：")
         for line in missing:
             lines.append(f"  MISSING: {line}")
 
     if warnings:
-        report_data["ALARM_CRON"] = "定时任务有差异"
+        ctx.data["ALARM_CRON"] = "定时任务有差异"
         lines.append("\n⚠️ 差异告警（存在相似项但不完全一致）：")
         for ref, match, score in warnings:
             lines.append(f"  WARNING: {ref}")
@@ -2231,28 +3368,29 @@ def check_crontab_entries(reference_text, actual_text, similarity_threshold=0.85
 
     if not missing and not warnings:
         lines.append("✅ 所有定时任务都完全匹配，无缺失无差异。")
-        report_data["ALARM_CRON"] = "所有定时任务都完全正常"
+        ctx.data["ALARM_CRON"] = "所有定时任务都完全正常"
 
     return "\n".join(lines)
 
-def gcluster_script_from_db(system_name,db_path):
+def gcluster_script_from_db(ctx):
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("select gbase_version, crontab_always from sys_clusters where system_name = ?", (system_name,))
+    cursor.execute("select gbase_version, crontab_always from sys_clusters where run_id = (select run_id from current_runs where system_name = ?)", (system_name,))
     row = cursor.fetchone()
     if row:
         gbase_version, crontab_always = row  # 拆包两个值
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     conn.close()
     pattern = r'\bsh\s+always\.sh\b'
     if re.search(pattern, crontab_always):
-        print("✅ always.sh 脚本正在运行")
-        report_data["ALARM_ALWAYS"] = "已启动always.sh运维脚本"
+        logger.info("✅ always.sh 脚本正在运行")
+        ctx.data["ALARM_ALWAYS"] = "已启动always.sh运维脚本"
     else:
-        print("⚠️ always.sh 脚本未运行")
-        report_data["ALARM_ALWAYS"] = "未启动always.sh运维脚本"
+        logger.warning("⚠️ always.sh 脚本未运行")
+        ctx.data["ALARM_ALWAYS"] = "未启动always.sh运维脚本"
 
     crontab_refence = """
 30 1 * * * sh /opt/gbase_workspace/scripts/check_hole_lean/bin/run_test.sh
@@ -2262,8 +3400,8 @@ def gcluster_script_from_db(system_name,db_path):
 0 15 * * * sh /opt/gbase_workspace/scripts/inspection/inspection_gbase.sh
 0 16 25 * * sh /opt/gbase_workspace/scripts/inspection/inspection_pro.sh
 """
-    cron_text = check_crontab_entries(crontab_refence, crontab_always)
-    report_data['CRON_TTEXT'] = cron_text
+    cron_text = check_crontab_entries(crontab_refence, crontab_always, ctx=ctx)
+    ctx.data['CRON_TTEXT'] = cron_text
 
     crontab_text = []
     always_text = []    
@@ -2276,131 +3414,851 @@ def gcluster_script_from_db(system_name,db_path):
     # 拆分后的字符串结果
     crontab_result = "\n".join(crontab_text)
     always_result = "\n".join(always_text)
-    report_data['CRON_RESULT'] = crontab_result
-    report_data['ALWAYS_RESULT'] = always_result
+    ctx.data['CRON_RESULT'] = crontab_result
+    ctx.data['ALWAYS_RESULT'] = always_result
 
-    print(cron_text)
-    print("=============== 集群定时任务和always脚本诊断 ==================")
+    logger.info("%s", cron_text)
+    logger.info("=============== 集群定时任务和always脚本诊断 ==================")
 
-def cluster_get_system_date(system_name,db_path):
+def cluster_get_system_date(ctx):
+    system_name, db_path = ctx.system_name, ctx.db_path
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("select sc.ma_one_ip, f.filename  from sys_clusters sc join files f on sc.system_name = f.system_name where sc.system_name = ?", (system_name,))
+    cursor.execute("select sc.ma_one_ip, r.inspection_date  from current_runs r join sys_clusters sc on sc.run_id = r.run_id where r.system_name = ?", (system_name,))
     row = cursor.fetchone()
     if row:
-        ma_one_ip, filename = row  # 拆包两个值
+        ma_one_ip, inspection_date = row  # 拆包两个值
     else:
-        print("没有找到记录")
+        logger.warning("没有找到记录")
 
     conn.close()
 
-    match = re.search(r'\d{4}-\d{2}-\d{2}', filename)
+    match = re.search(r'\d{4}-\d{2}-\d{2}', inspection_date)
 
-    print("=============== 集群名、MA01和巡检时间获取 ==================")
+    logger.info("=============== 集群名、MA01和巡检时间获取 ==================")
     if match:
         date_str = match.group(0)
         year, month, _ = date_str.split("-")
         date_result = f"{year}年{int(month)}月"
     
-    print(system_name,ma_one_ip,date_result)
+    logger.info("%s %s %s", system_name, ma_one_ip, date_result)
 
-    report_data['SYS_NAME'] = system_name
-    report_data['MA_ONE_IP'] = ma_one_ip
-    report_data['DATE_TEAR'] = date_result
+    ctx.data['SYS_NAME'] = system_name
+    ctx.data['MA_ONE_IP'] = ma_one_ip
+    ctx.data['DATE_TEAR'] = date_result
     
 
 
-def replace_placeholders(doc, replacements: dict):
-    for paragraph in doc.paragraphs:
-        for key, val in replacements.items():
-            placeholder = f"{{{{{key}}}}}"
-            for run in paragraph.runs:
-                if placeholder in run.text:
-                    run.text = run.text.replace(placeholder, str(val))
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for key, val in replacements.items():
-                        placeholder = f"{{{{{key}}}}}"
-                        for run in paragraph.runs:
-                            if placeholder in run.text:
-                                run.text = run.text.replace(placeholder, str(val))
-
+# === 报告模板预编译 === #
+PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+REPORT_TABLES = (2, 3, 4, 5, 7)
 
+class CompiledTemplate:
+    """
+    预编译的报告模板：模板只解析一次，并记下每个 {{KEY}} 所在的 run 和各目标表格的位置。
+    每个系统只复制正文 XML（样式、图片等部件共用），填值时只访问记录下的位置，
+    耗时与占位符个数相关，与文档大小无关。
 
+    替换范围为正文段落和顶层表格单元格中的 run。
+    同一进程内复制出的文档共用一个文档部件，需要保存后再复制下一份。
+    """
 
-def each_auto_inspection(system_name,db_path):
+    def __init__(self, path, table_indexes=REPORT_TABLES):
+        from docx import Document
+        self.path = path
+        self.doc = Document(path)
+        self.part = self.doc.part
+        self.element = copy.deepcopy(self.part.element)  # 未填值的正文，每次复制它
+
+        tree = self.part.element.getroottree()
+        self.placeholders = []  # [(run 路径, [KEY, ...])]
+        seen = set()
+        for paragraph in self._paragraphs():
+            for run in paragraph.runs:
+                keys = PLACEHOLDER_RE.findall(run.text)
+                path = tree.getpath(run._r)
+                if keys and path not in seen:  # 合并单元格会重复返回同一个 run
+                    seen.add(path)
+                    self.placeholders.append((path, list(dict.fromkeys(keys))))
+
+        tables = self.doc.tables
+        self.tables = {i: tree.getpath(tables[i]._tbl) for i in table_indexes if i < len(tables)}
+
+    def _paragraphs(self):
+        yield from self.doc.paragraphs
+        for table in self.doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    yield from cell.paragraphs
+
+    def clone(self):
+        """复制一份未填值的文档"""
+        from docx.document import Document as _Document
+        element = copy.deepcopy(self.element)
+        self.part._element = element
+        return _Document(element, self.part)
+
+    def fill(self, doc, replacements: dict):
+        """按索引替换占位符，没有取值的 KEY 保持原样"""
+        from docx.text.run import Run
+        for path, keys in self.placeholders:
+            run = Run(doc.element.xpath(path)[0], None)
+            text = run.text
+            for key in keys:
+                if key in replacements:
+                    text = text.replace(f"{{{{{key}}}}}", str(replacements[key]))
+            if text != run.text:
+                run.text = text
+
+    def table(self, doc, table_index):
+        from docx.table import Table
+        return Table(doc.element.xpath(self.tables[table_index])[0], doc)
+
+
+_compiled_templates = {}
+
+def load_report_template(path=None):
+    """取预编译模板，同一进程内按路径缓存，模板文件修改后重新编译"""
+    path = str(path or TEMPLATE_FILE)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled_templates.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, CompiledTemplate(path))
+        _compiled_templates[path] = cached
+    return cached[1]
+
+
+def each_auto_inspection(ctx):
+    render_report(ctx, run_diagnostics(ctx))
+
+def run_diagnostics(ctx):
+    """执行各项诊断，结论写入 ctx.data，返回要写入报告的表格 {表格序号: DataFrame}"""
     # 文本头
-    cluster_get_system_date(system_name,db_path)
+    ctx.diagnose(cluster_get_system_date)
     # 总体运行情况
-    operational_status(system_name,db_path)
+    ctx.diagnose(operational_status)
     # 空间可用性
-    df1 = data_cluster_used(system_name,db_path)
+    df1 = ctx.diagnose(data_cluster_used)
 
     # 检查进程
-    df2 = cluster_process_from_db(system_name,db_path)
+    df2 = ctx.diagnose(cluster_process_from_db)
     cols_needed = ["ip_address", "gclusterd", "gcrecover", "gcmonit", "gcmmonit", "gbased", "gc_sync_server"]
     df_filtered = df2[cols_needed].copy()
     df_filtered.insert(0, "序号", range(1, len(df_filtered) + 1))
     df_filtered = df_filtered.replace(0, '')
 
     # 检查日志
-    df3 = cluster_logs_from_db(system_name,db_path)
+    df3 = ctx.diagnose(cluster_logs_from_db)
     all_logs = ["ip_address", "system", "express", "gcrecover", "gc_sync_server", "dump", "core", "loader_logs"]
     df_cluster_logs = df3[all_logs].copy()
     df_cluster_logs.insert(0, "序号", range(1, len(df_cluster_logs) + 1))
 
     # 检查实例
-    df4 = cluster_instance_from_db(system_name,db_path)
+    df4 = ctx.diagnose(cluster_instance_from_db)
     df4.insert(0, "序号", range(1, len(df4) + 1))
     df4 = df4.fillna('')
 
     # 检查自启动
-    df5 = cluster_auto_start_from_db(system_name,db_path)
+    df5 = ctx.diagnose(cluster_auto_start_from_db)
     c2 = ["ip_address", "gcware_services", "gcluster_services"]
     df_auto_start = df5[c2].copy()
     df_auto_start.insert(0, "序号", range(1, len(df_auto_start) + 1))
     df_auto_start = df_auto_start.replace(0, '')
 
-    cluster_variables_from_db(system_name,db_path)
+    ctx.diagnose(cluster_variables_from_db)
+
+    ctx.diagnose(gcluster_script_from_db)
 
-    gcluster_script_from_db(system_name,db_path)
+    return {2: df1, 3: df_filtered, 4: df_cluster_logs, 5: df4, 7: df_auto_start}
 
-    doc = Document(TEMPLATE_FILE)
-    replace_placeholders(doc, report_data)
+def render_report(ctx, tables, template_path=None, out_dir=None):
+    """按预编译模板填入诊断结论和表格，保存报告并返回文件路径"""
+    system_name = ctx.system_name
+    template = load_report_template(template_path)
     # TEMPLATE_FILE_OUT
-    ma01 = report_data["MA_ONE_IP"]
-    inspection_date = report_data["DATE_TEAR"]
+    ma01 = ctx.data["MA_ONE_IP"]
+    inspection_date = ctx.data["DATE_TEAR"]
     # out_file_name = f"ZH-GBase8a集群-{system_name}系统-[{ma01}]-月度巡检报告-{inspection_date}.docx"
     out_file_name = f"ZH-GBase8a集群-{system_name}系统-灾备环境[{ma01}]-月度巡检报告-{inspection_date}.docx"
-    file_path = os.path.join(TEMPLATE_FILE_OUT , out_file_name)
+    file_path = os.path.join(out_dir or TEMPLATE_FILE_OUT , out_file_name)
 
-    write_df_to_table(doc, df1, table_index=2)
-    write_df_to_table(doc, df_filtered, table_index=3)
-    write_df_to_table(doc, df_cluster_logs, table_index=4)
-    write_df_to_table(doc, df4, table_index=5)
-    write_df_to_table(doc, df_auto_start, table_index=7)
+    with ctx.metrics.stage("render.fill", rows=sum(len(df) for df in tables.values())):
+        doc = template.clone()
+        template.fill(doc, ctx.data)
+        for table_index, df in tables.items():
+            write_df_to_table(doc, df, table_index=table_index, template=template)
 
-    doc.save(file_path)
-    print(f"✅ 报告已保存为：{file_path}")
+    with ctx.metrics.stage("render.save") as counts:
+        doc.save(file_path)
+        counts["bytes"] = os.path.getsize(file_path)
+    logger.info(f"✅ 报告已保存为：{file_path}")
+    return file_path
 
 # === 根据每个系统名，进行巡检处理 结束 ===
+
+# === 监视 data 目录 === #
+class DirectoryWatcher:
+    """
+    等待目录变化：Linux 上通过 ctypes 调用 inotify，其他情况退化为按超时轮询。
+    事件内容不解析，只作为重新扫描目录的信号。
+    """
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+
+    def __init__(self, path):
+        self.fd = -1
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            if libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(path)), mask) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+        except (OSError, AttributeError):
+            self.fd = -1  # 非 Linux 或没有 inotify
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd >= 0 else "轮询"
+
+    def wait(self, timeout):
+        """最多等待 timeout 秒，有目录事件时提前返回"""
+        if self.fd < 0:
+            time.sleep(timeout)
+            return
+        import select
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def scan_settled_archives(seen, pending, settle):
+    """
+    扫描 data 目录，返回上传已完成、尚未处理的压缩包。
+    大小和修改时间持续 settle 秒不变才算上传完成；seen 记录已处理的 (大小, 修改时间)，
+    pending 记录正在观察的压缩包及其状态首次出现的时刻。
+    """
+    now = time.monotonic()
+    ready = []
+    for name in sorted(list_zip_files()):
+        path = os.path.join(DATA_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature = (st.st_size, st.st_mtime_ns)
+        if seen.get(path) == signature:
+            continue
+        if path not in pending or pending[path][0] != signature:
+            pending[path] = (signature, now)
+            continue
+        if now - pending[path][1] < settle:
+            continue
+        del pending[path]
+        seen[path] = signature
+        if not zipfile.is_zipfile(path):
+            logger.warning(f"⚠️ 不是完整的ZIP文件，等待其再次变化：{path}")
+            continue
+        ready.append(path)
+    return ready
+
+
+def ingest_watched_archives(session, archives, render_workers=None):
+    """
+    增量入库新到的压缩包，只为有数据写入的系统重新生成报告。
+    只处理本次登记的文件；入库中途出错时删除本次还没入库完的文件记录，
+    避免之后每次事件都重新选中它们。
+    """
+    file_ids = []
+    try:
+        for path in archives:
+            confirm_if_not_expected(os.path.basename(path), assume_yes=True)
+            file_ids += register_archive(DB_PATH, path, os.path.join(EXTRACT_FOLDER, Path(path).stem))
+        systems = process_each_file_from_db(DB_PATH, session=session, file_ids=file_ids)
+    except Exception:
+        session.conn.rollback()
+        session.drop_unfinished(file_ids)
+        raise
+    prune_inspection_runs(DB_PATH)
+    if not systems:
+        logger.info("[✓] 没有新的巡检数据")
+        return
+    logger.info(f"== 重新生成 {len(systems)} 个系统的报告：{', '.join(sorted(systems))} ==")
+    inspection_mppsystem(DB_PATH, workers=render_workers, systems=systems)
+
+
+def watch_folder(interval=None, settle=None, render_workers=None):
+    """
+    常驻监视 data 目录，新压缩包上传完成后增量入库并重新生成受影响系统的报告，Ctrl+C 退出。
+    整个过程共用一个写库会话；报告默认在本进程生成，预编译模板在多次事件之间复用。
+    """
+    interval = interval or WATCH_POLL_SECONDS
+    settle = WATCH_SETTLE_SECONDS if settle is None else settle
+    initialize_project_directories()
+    init_database(DB_PATH)
+
+    watcher = DirectoryWatcher(DATA_DIR)
+    logger.info(f"== 开始监视 {DATA_DIR}（{watcher.mode}），上传完成判定 {settle}s，Ctrl+C 退出 ==")
+    seen, pending = {}, {}
+    try:
+        with WriteSession(DB_PATH, 'file') as session:
+            while True:
+                archives = scan_settled_archives(seen, pending, settle)
+                if archives:
+                    logger.info(f"发现 {len(archives)} 个新压缩包")
+                    try:
+                        ingest_watched_archives(session, archives, render_workers)
+                    except Exception as e:
+                        session.conn.rollback()
+                        logger.error(f"❌ 处理失败：{', '.join(archives)}：{e}")
+                # 还有压缩包在观察期内时按观察期醒来，否则等目录事件或轮询间隔
+                watcher.wait(min(settle, interval) if pending else interval)
+    except KeyboardInterrupt:
+        logger.info("== 已停止监视 ==")
+    finally:
+        watcher.close()
+
+def watch_command(args):
+    watch_folder(args.interval, args.settle, args.render_workers)
+    return 0
+
  
-def main():
+# === 合成巡检数据 === #
+def synthetic_ip(system_name, group, index):
+    """合成节点 IP：每个系统一个网段，每组（管理集群或某个 VC）按 250 个地址一段顺延"""
+    return f"10.{sum(map(ord, system_name)) % 200}.{group * 8 + index // 250}.{index % 250 + 1}"
+
+def generate_inspection_text(system_name, vc_count=2, nodes_per_vc=3, coor_count=3, processes=None,
+                             log_paths=None, date="2025-04-25", seed=0):
+    """
+    生成一份合成巡检文件，返回 (文件名, 文本)。分段标题、逐节点前缀、ps -ef 行、du 输出、
+    拓扑表格和 >> 参数=参考值: 块都与真实巡检脚本的输出格式一致，各提取函数可直接解析。
+    processes 为计算节点上的进程名，log_paths 为计算节点要统计大小的日志路径；
+    同一 seed 生成的内容相同，其中故意带少量异常（组件关闭、参数不一致等）以覆盖告警分支。
+    """
+    import random
+    rng = random.Random(f"{system_name}-{seed}")
+    processes = processes or ["gcmonit", "gcmmonit", "gbased", "gc_sync_server"]
+    log_paths = log_paths or ["/opt/gnode/log/gbase/system.log", "/opt/gnode/log/gbase/express.log",
+                              "/opt/gnode/log/gbase/core"]
+
+    def ps_line(pid, cmd):
+        return f"gbase     {pid}     1  0 Apr01 ?        00:10:00 {cmd}"
+
+    def size(low, high, units="MG"):
+        return f"{rng.uniform(low, high):.1f}{rng.choice(units)}"
+
+    lines = [f"{system_name} GBase 8a Cluster Inspection Report v1", ""]
+    coor_ips = [synthetic_ip(system_name, 0, i) for i in range(coor_count)]
+
+    def per_coor(label, value):
+        lines.append(label)
+        lines.extend(f"coor {ip}: {value(ip)}" for ip in coor_ips)
+
+    lines.append("=" * 30 + "Coordinator Machine Information" + "=" * 30)
+    per_coor("* 管理节点操作系统版本：", lambda ip: "CentOS Linux release 7.9.2009 (Core)")
+    per_coor("* Hostname：", lambda ip: f"{system_name.lower()}-coor{ip.split('.')[-1]}")
+    per_coor("* CPU model name信息:", lambda ip: "model name : Intel(R) Xeon(R) Gold 6230 CPU @ 2.10GHz")
+    per_coor("* CPU 逻辑核数信息：", lambda ip: "80")
+    per_coor("* CPU 物理核数：", lambda ip: "2")
+    lines.append("* 服务器IP地址列表")
+    lines.extend(f"coor {ip}: inet {ip}/24" for ip in coor_ips)
+    per_coor("* 物理内存使用情况：", lambda ip: "Mem:  251G  31G  120G  4.0G  100G  215G")
+    per_coor("* SWAP内存使用情况：", lambda ip: "Swap:  4.0G  0B  4.0G")
+    per_coor("* 管理节点空间使用情况：", lambda ip: "/dev/mapper/vg-opt  1.8T  731G  1.1T  41%  /opt")
+    for label, value in [("管理节点总空间之和", 1932735283 * coor_count), ("管理节点已使用空间之和", 766401331 * coor_count),
+                         ("管理节点剩余用空间之和", 1166333952 * coor_count), ("管理集群空间总使用率", "41%")]:
+        lines += [f"* {label}：", str(value)]
+
+    lines.append("=" * 30 + "Coordinator GBase Cluster Information" + "=" * 30)
+    lines.append("* 管理节点进程状态：")
+    for ip in coor_ips:
+        lines.append(f"----------- {ip} -----------")
+        for j, name in enumerate(["gclusterd", "gcrecover", "gcmonit", "gcmmonit"]):
+            lines.append(ps_line(1000 + j, f"/opt/gcluster/server/bin/{name} --defaults-file=/opt/gcluster/config/gbase_8a_gcluster.cnf"))
+    lines.append("* 管理节点日志大小：")
+    for ip in coor_ips:
+        for path in ["/opt/gcluster/log/gcluster/system.log", "/opt/gcluster/log/gcluster/express.log",
+                     "/opt/gcluster/log/gcluster/gcrecover.log", "/opt/gcluster/log/gcluster/loader_logs"]:
+            lines.append(f"coor {ip}: {size(1, 900)}\t{path}")
+        lines.append(f"coor {ip}: du: cannot access '/opt/core': No such file or directory")
+    lines.append("* 自启动设置：")
+    for i, ip in enumerate(coor_ips):
+        lines.append(f"----------- {ip} -----------")
+        lines.append('/etc/rc.d/rc.local:su - gbase -c "gcware_services all start"')
+        if i != 1:
+            lines.append('/etc/rc.d/rc.local:su - gbase -c "gcluster_services all start"')
+    lines.append("* 监控运维脚本：")
+    lines += ["30 1 * * * sh /opt/gbase_workspace/scripts/check_hole_lean/bin/run_test.sh",
+              "*/5 * * * * sh /opt/gbase_workspace/scripts/monitor/bin/monitor.sh",
+              "30 12 * * * sh /opt/gbase_workspace/scripts/delete_log/crontab_delete_logfile.sh",
+              "0 15 * * * sh /opt/gbase_workspace/scripts/inspection/inspection_gbase2.sh",
+              "*/1 * * * * cd /opt/gbase_workspace/scripts; sh always.sh"]
+
+    lines.append("* Coor Cluster拓扑及状态：")
+    lines.append("CLUSTER STATE:         ACTIVE")
+    lines += ["=" * 50, "|          GBASE GCWARE CLUSTER INFORMATION      |", "=" * 50,
+              "| NodeName |     IpAddress     | gcware |", "-" * 50]
+    for i, ip in enumerate(coor_ips):
+        lines += [f"| gcware{i + 1}  | {ip} |  OPEN  |", "-" * 50]
+    lines.append("|       GBASE COORDINATOR CLUSTER INFORMATION     |")
+    lines.append("|   NodeName   | IpAddress | gcluster | DataState |")
+    for i, ip in enumerate(coor_ips):
+        lines.append(f"| coordinator{i + 1} | {ip} | {'OPEN' if i else 'CLOSE'} | 0 |")
+    lines.append("|       GBASE VIRTUAL CLUSTER INFORMATION     |")
+    lines.append("| VcName | DistributionId | comment |")
+    lines += ["* Coor Cluster Failover信息：", "failover: none",
+              "* GBase版本号：", "GBase8a_MPP_Cluster-License-9.5.3.28.12", "* 结束："]
+
+    lines.append("=" * 30 + "Coordinator GBase Cluster variables" + "=" * 30)
+    for name, ref, act in [("gcluster_max_conn", "300", "300"), ("_gbase_mem", "30G", "32G"), ("gcluster_x", "1", "abc")]:
+        lines.append(f">> {name}={ref}:")
+        lines.extend(f"coor {ip}: /opt/gcluster/config/gbase_8a_gcluster.cnf:{name}={act}" for ip in coor_ips)
+    lines.append("GBase 8a Cluster Coordinator Inscpection End now")
+
+    for v in range(vc_count):
+        vc = f"vc{v + 1}"
+        node_ips = [synthetic_ip(system_name, v + 1, i) for i in range(nodes_per_vc)]
+
+        def per_node(label, value):
+            lines.append(label)
+            lines.extend(f"{vc} {ip}: {value(ip)}" for ip in node_ips)
+
+        lines.append("=" * 30 + f" Data Machine Information '{vc}' " + "=" * 30)
+        per_node("* 计算节点操作系统版本：", lambda ip: "CentOS Linux release 7.9.2009 (Core)")
+        per_node("* Hostname：", lambda ip: f"{system_name.lower()}-{vc}-node{ip.split('.')[-2]}-{ip.split('.')[-1]}")
+        per_node("* CPU model name信息:", lambda ip: "model name : Intel(R) Xeon(R) Gold 6230 CPU @ 2.10GHz")
+        per_node("* CPU 逻辑核数：", lambda ip: "80")
+        per_node("* CPU 物理核数：", lambda ip: "2")
+        per_node("* 计算集群IP列表：", lambda ip: f"inet {ip}/24")
+        per_node("* 物理内存使用情况", lambda ip: "Mem:  503G  131G  20G  4.0G  350G  370G")
+        per_node("* SWAP使用情况：", lambda ip: "Swap:  16G  1.0G  15G")
+        per_node("* 计算集群各节点空间情况：", lambda ip: f"/dev/sdb1  7.0T  {rng.uniform(0.5, 6.5):.1f}T  4.9T  {rng.randint(5, 95)}%  /data")
+        for label, value in [("计算集群空间之和", 7516192768 * nodes_per_vc), ("计算集群已使用空间之和", 2254857830 * nodes_per_vc),
+                             ("计算集群剩余用空间之和", 5261334938 * nodes_per_vc), ("计算集群空间总使用率", "30%")]:
+            lines += [f"* {label}：", str(value)]
+
+        lines.append("=" * 30 + f" Data GBase Cluster Information '{vc}' " + "=" * 30)
+        lines.append("* Data Cluster 拓扑及状态：")
+        lines += ["CLUSTER STATE:         ACTIVE", "VIRTUAL CLUSTER MODE:  NORMAL", "=" * 50,
+                  "| NodeName | IpAddress | DistributionId | gnode | syncserver | DataState |", "-" * 50]
+        for i, ip in enumerate(node_ips):
+            lines.append(f"| node{i + 1} | {ip} | 1 | OPEN | {'OPEN' if i else 'CLOSE'} | 0 |")
+        lines.append("* Data Cluster DDL&DML&DMLSTORAGE Event信息：")
+        lines.append(f"{vc} Vc event count:0 Vc event count:1 Vc event count:0")
+        for label, value in [("库的个数", 5), ("表的个数", rng.randint(50, 5000)), ("视图的个数", 3), ("存储过程的个数", 2), ("函数的个数", 1)]:
+            lines += [f"* {label}：", str(value)]
+        lines.append("* Data Cluster 进程状态:")
+        for ip in node_ips:
+            for j, name in enumerate(processes):
+                lines.append(f"{vc} {ip}: " + ps_line(2000 + j, f"/opt/gnode/server/bin/{name} --defaults-file=/opt/gnode/config/gbase_8a_gbase.cnf"))
+        lines.append("* Data Cluster 日志情况:")
+        for ip in node_ips:
+            lines.extend(f"{vc} {ip}: {size(1, 1000, 'MGT' if 'express' in path else 'MG')}\t{path}" for path in log_paths)
+        lines.append("* Data Cluster 自启动：")
+        for i, ip in enumerate(node_ips):
+            lines.append(f'{vc} {ip}: su - gbase -c "gcluster_services all start"')
+            if i == 0:
+                lines.append(f'{vc} {ip}: su - gbase -c "gcware_services all start"')
+        lines.append("=" * 32 + f" Data GBase Cluster variables {vc} " + "=" * 30)
+        for name, ref, act in [("gbase_buffer_heap", "2G", "2G"), ("gbase_parallel", "8", "8")]:
+            lines.append(f">> {name}={ref}:")
+            lines.extend(f"{vc} {ip}: /opt/gnode/config/gbase_8a_gbase.cnf:{name}={act}" for ip in node_ips)
+        lines.append(f"GBase 8a Cluster Data Cluster '{vc}' Inscpection End")
+
+    return f"{system_name}__inspection_{date}.txt", "\n".join(lines) + "\n"
+
+def write_synthetic_archive(zip_path, systems, **kwargs):
+    """把若干系统的合成巡检文件写入一个压缩包，参数同 generate_inspection_text"""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+        for system_name in systems:
+            filename, text = generate_inspection_text(system_name, **kwargs)
+            z.writestr(filename, text)
+    return zip_path
+
+def write_synthetic_template(path):
+    """生成与正式模板占位符、表格位置一致的简化报告模板（8 个表格，表头加一行样式行）"""
+    from docx import Document
+    doc = Document()
+    doc.add_paragraph("{{SYS_NAME}} 巡检报告 {{DATE_TEAR}} MA01 {{MA_ONE_IP}}")
+    for key in ["ALL_NODE_C", "RELESE", "GSTATE", "GMODE", "PLATFORM", "CPU", "MEMORY", "DBSIZE", "DNUM", "TNUM",
+                "VNUM", "PNUM", "FNUM", "ALARM_DISK_USEING", "NODE_COUNT", "NDOSK_T", "NDOSK_A", "NDISK_U", "PERCENT",
+                "ALARM_PROCE", "ALARM_LOGS_SIZE", "ALARM_INSTANCE", "ALARM_AUTO_START", "ALARM_VARIABLES",
+                "ALARM_ALWAYS", "CRON_TTEXT", "CRON_RESULT", "ALWAYS_RESULT", "ALARM_CRON"]:
+        doc.add_paragraph(f"{key}: {{{{{key}}}}}")
+    for t in range(8):
+        table = doc.add_table(rows=2, cols=9)
+        for c in range(9):
+            table.rows[0].cells[c].text = f"列{c + 1}"
+    doc.save(path)
+    return path
+
+
+# === 端到端性能测试 === #
+# 各阶段按流程顺序排列，结果按此顺序保存和打印
+BENCH_STAGES = ("unzip", "parse", "db_write", "diagnostics", "render")
+
+def run_pipeline_benchmark(nodes, workdir, vc_count=2):
+    """
+    在 workdir 中生成一个有 nodes 个计算节点的合成系统，依次计时解压读取、解析、写库、
+    诊断、生成报告五个阶段（BENCH_STAGES），返回 {阶段: (秒, 数量)}。数量分别为：读取字节数、解析出的数据行、
+    写入的数据行、诊断的系统数、生成的报告数。各阶段的日志收集到内存后丢弃。
+    """
+    nodes_per_vc = max(1, nodes // vc_count)
+    zip_path = write_synthetic_archive(os.path.join(workdir, "bench巡检记录.zip"), ["BENCH"],
+                                       vc_count=vc_count, nodes_per_vc=nodes_per_vc)
+    template_path = write_synthetic_template(os.path.join(workdir, "template.docx"))
+    db_path = os.path.join(workdir, "bench.db")
+    with capture_logs():
+        init_database(db_path, rebuild=True)
+
+    results = {}
+    def timed(stage, func):
+        started = time.perf_counter()
+        with capture_logs():
+            value, count = func()
+        results[stage] = (time.perf_counter() - started, count)
+        return value
+
+    def unzip():
+        with zipfile.ZipFile(zip_path) as z:
+            members = {name: z.read(name) for name in z.namelist()}
+        return members, sum(len(data) for data in members.values())
+    members = timed("unzip", unzip)
+
+    def parse():
+        parsed = []
+        for filename, data in members.items():
+            system_name, batch, error = parse_content(decode_report(data), os.path.join(zip_path, filename))
+            if error:
+                raise RuntimeError(f"合成数据解析失败：{error}")
+            parsed.append((system_name, parse_inspection_date(filename), batch))
+        return parsed, sum(batch.row_count() for _, _, batch in parsed)
+    parsed = timed("parse", parse)
+
+    def db_write():
+        with WriteSession(db_path, 'run') as session:
+            for system_name, inspection_date, batch in parsed:
+                session.write(batch, session.begin_run(None, system_name, inspection_date))
+            session.cursor.execute("ANALYZE")
+        return None, sum(batch.row_count() for _, _, batch in parsed)
+    timed("db_write", db_write)
+
+    contexts = [ReportContext(system_name, db_path) for system_name, _, _ in parsed]
+    tables = timed("diagnostics", lambda: ([run_diagnostics(ctx) for ctx in contexts], len(contexts)))
+    timed("render", lambda: ([render_report(ctx, t, template_path, workdir) for ctx, t in zip(contexts, tables)], len(contexts)))
+    return results
+
+def store_bench_results(results, label=None, db_path=None):
+    """保存本次结果，返回同规模同阶段上一次的耗时 {(节点数, 阶段): 秒}"""
+    db_path = db_path or BENCH_DB_PATH
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bench_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT DEFAULT (datetime('now', 'localtime')),
+            label TEXT,
+            nodes INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            items INTEGER
+        )
+    """)
+    previous = {}
+    for nodes, stage in results:
+        cursor.execute("SELECT seconds FROM bench_results WHERE nodes = ? AND stage = ? ORDER BY id DESC LIMIT 1",
+                       (nodes, stage))
+        row = cursor.fetchone()
+        if row:
+            previous[(nodes, stage)] = row[0]
+    cursor.executemany("INSERT INTO bench_results (label, nodes, stage, seconds, items) VALUES (?, ?, ?, ?, ?)",
+                       [(label, nodes, stage, seconds, items) for (nodes, stage), (seconds, items) in results.items()])
+    conn.commit()
+    conn.close()
+    return previous
+
+def bench_pipeline(sizes=None, label=None):
+    """按各规模跑端到端性能测试，打印每个阶段耗时及与上次结果的对比，返回是否有阶段回退"""
+    import tempfile
+    import pandas, docx  # 预先导入，避免首个规模的诊断、生成阶段计入模块加载耗时
+    sizes = sizes or BENCH_SIZES
+    results = {}
+    for nodes in sizes:
+        with tempfile.TemporaryDirectory(prefix="gbase-bench-") as workdir:
+            timings = run_pipeline_benchmark(nodes, workdir)
+        if set(timings) != set(BENCH_STAGES):
+            raise RuntimeError(f"性能测试阶段不一致：应为 {', '.join(BENCH_STAGES)}，实际为 {', '.join(timings)}")
+        for stage in BENCH_STAGES:
+            results[(nodes, stage)] = timings[stage]
+    previous = store_bench_results(results, label)
+
+    regressed = False
+    print(f"{'节点数':>6} {'阶段':<12} {'耗时(s)':>9} {'数量':>10} {'上次(s)':>9}  变化")
+    for (nodes, stage), (seconds, items) in results.items():
+        last = previous.get((nodes, stage))
+        change = ""
+        if last:
+            ratio = seconds / last - 1
+            change = f"{ratio:+.0%}"
+            if ratio > BENCH_TOLERANCE and seconds - last > 0.05:
+                change += " ⚠️"
+                regressed = True
+        print(f"{nodes:>6} {stage:<12} {seconds:>9.3f} {items:>10} {f'{last:.3f}' if last else '-':>9}  {change}")
+    print(f"[✓] 结果已保存到 {BENCH_DB_PATH}")
+    return regressed
+
+# === 异常输入性能测试 === #
+def generate_malformed_corpus(nodes_per_vc=20, line_chars=200_000):
+    """
+    由合成巡检文件构造异常输入，返回 [(用例名, 文本), ...]：截断的报告、缺少段落结束标记、
+    缺少各子项的结束子项、缺少段落标题、段落重复，以及在各子项中插入 line_chars 个字符的
+    超长行（长数字串、长横线、长空白、无空白的长串等容易让正则回溯的内容）。
+    """
+    _, text = generate_inspection_text("MALFORMED", vc_count=2, nodes_per_vc=nodes_per_vc)
+    lines = text.split("\n")
+
+    def label_of(line):
+        m = inspection_token(line)
+        return m.group("label") if m else None
+
+    def insert_after(label, extra):
+        index = next(i for i, line in enumerate(lines) if label_of(line) == label)
+        return "\n".join(lines[:index + 1] + extra + lines[index + 1:])
+
+    terminators = {field.until for extractor in FILE_EXTRACTORS for field in extractor.fields.values()
+                   if isinstance(field.until, str)}
+    headers = [i for i, line in enumerate(lines) if (m := inspection_token(line)) and m.group("title")]
+    corpus = [(f"截断 {pct}%", "\n".join(lines[:len(lines) * pct // 100])) for pct in (25, 50, 75, 95)]
+    corpus += [
+        ("行中截断", text[:len(text) * 3 // 5]),
+        ("缺段落结束标记", "\n".join(line for line in lines if "Inscpection End" not in line)),
+        ("缺结束子项", "\n".join(line for line in lines if label_of(line) not in terminators)),
+        ("缺段落标题", "\n".join(line for i, line in enumerate(lines) if i not in headers[1:])),
+        ("段落重复", text * 3),
+        ("子项内大量空行", insert_after("监控运维脚本", [""] * line_chars + ["*"])),
+    ]
+    n = line_chars
+    corpus += [
+        ("超长数字串", insert_after("物理内存使用情况", ["coor " + "1" * n])),
+        ("超长点分数字", insert_after("Data Cluster 进程状态", ["vc1 " + "1." * (n // 2)])),
+        ("超长横线", insert_after("管理节点进程状态", ["-" * n])),
+        ("超长无空白串", insert_after("Hostname", ["x" * n])),
+        ("子项标题后超长空白", insert_after("Hostname", ["* " + " " * n + "x"])),
+        ("结束标记后超长空白", insert_after("Hostname", ["GBase 8a Cluster " + " " * n + "x"])),
+        ("IP 列表超长空白", insert_after("计算集群IP列表", ["vc1" + " " * n + "x"])),
+        ("参数行超长空白", insert_after("管理节点进程状态", []).replace(
+            ">> gcluster_max_conn=300:", ">> gcluster_max_conn=300:\ncoor 10.0.0.1:" + " " * n + "x", 1)),
+        ("日志行超长冒号串", insert_after("管理节点日志大小", ["coor 10.0.0.1: " + "a:" * (n // 2)])),
+        ("拓扑表超长竖线", insert_after("Data Cluster 拓扑及状态", ["|" + " |" * (n // 2)])),
+    ]
+    return corpus
+
+def bench_malformed(ceiling=None):
+    """逐个解析异常输入并计时，打印耗时和解析结果，返回是否有文件超过 ceiling 秒"""
+    ceiling = ceiling or MALFORMED_PARSE_SECONDS
+    exceeded = False
+    print(f"{'用例':<16} {'大小(KB)':>9} {'耗时(s)':>9} {'数据行':>7}  结果")
+    for name, text in generate_malformed_corpus():
+        started = time.perf_counter()
+        with capture_logs():
+            _, batch, error = parse_content(text, name)
+        seconds = time.perf_counter() - started
+        mark = ""
+        if seconds > ceiling:
+            mark = " ❌"
+            exceeded = True
+        print(f"{name:<16} {len(text) / 1024:>9.0f} {seconds:>9.3f} {batch.row_count():>7}  {error or 'ok'}{mark}")
+    if exceeded:
+        print(f"❌ 有文件解析超过 {ceiling}s")
+    else:
+        print(f"[✓] 所有异常输入均在 {ceiling}s 内解析完成")
+    return exceeded
+
+
+COMMANDS = ("run", "ingest", "report", "watch", "query", "bench")
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # 不写子命令时与以前一样：入库后生成报告
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
+
+    ingest_opts = argparse.ArgumentParser(add_help=False)
+    ingest_opts.add_argument("archives", nargs="*",
+                             help="巡检记录压缩包路径或通配符（如 'data/2024-*.zip'），可给多个；不指定时从 data 目录选择")
+    ingest_opts.add_argument("-y", "--yes", action="store_true",
+                             help="不做任何交互确认，适合定时任务和批量补录")
+    ingest_opts.add_argument("-j", "--workers", type=int, default=None,
+                             help=f"文件解析进程数，默认 {PARSE_WORKERS}")
+    report_opts = argparse.ArgumentParser(add_help=False)
+    report_opts.add_argument("--render-workers", type=int, default=None,
+                             help=f"报告生成进程数，默认 {RENDER_WORKERS}")
+    log_opts = argparse.ArgumentParser(add_help=False)
+    log_opts.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default=None,
+                          help=f"日志级别，默认 {LOG_LEVEL}；DEBUG 时输出各项诊断的完整数据表")
+    log_opts.add_argument("--log-file", default=None,
+                          help=f"run/ingest/report 的日志文件，默认 {LOG_FILE}")
+    profile_opts = argparse.ArgumentParser(add_help=False)
+    profile_opts.add_argument("--profile", action="store_true",
+                              help=f"用 cProfile 和 tracemalloc 剖析每个解析、诊断和报告阶段，结果写入 {PROFILE_DIR}；"
+                                   "解析和报告改为串行，剖析开销会计入 stage_metrics 的耗时")
+
+    parser = argparse.ArgumentParser(description="GBase 8a 集群巡检记录入库并生成月度巡检报告")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("run", parents=[ingest_opts, report_opts, profile_opts, log_opts],
+                       help="入库后生成报告（不写子命令时的默认行为）")
+    p.add_argument("--no-report", action="store_true",
+                   help="只入库，不生成报告")
+    sub.add_parser("ingest", parents=[ingest_opts, profile_opts, log_opts],
+                   help="只入库，不加载 pandas / python-docx")
+    sub.add_parser("report", parents=[report_opts, profile_opts, log_opts],
+                   help="按数据库中各系统最新一次巡检生成报告")
+    p = sub.add_parser("watch", parents=[report_opts, log_opts],
+                       help="常驻监视 data 目录，新压缩包上传完成后增量入库并更新相关系统的报告")
+    p.add_argument("--interval", type=float, default=None,
+                   help=f"没有目录事件时的轮询间隔（秒），默认 {WATCH_POLL_SECONDS}")
+    p.add_argument("--settle", type=float, default=None,
+                   help=f"压缩包多少秒不再变化算上传完成，默认 {WATCH_SETTLE_SECONDS}")
+    p = sub.add_parser("query", parents=[log_opts], help="在终端列出某个系统历次巡检的指标")
+    p.add_argument("system_name", help="系统名")
+    p = sub.add_parser("bench", parents=[log_opts],
+                       help="性能测试：startup 测量 ingest 启动耗时，pipeline 用合成数据分阶段计时，malformed 测异常输入的解析耗时")
+    p.add_argument("target", nargs="?", choices=("startup", "pipeline", "malformed"), default="startup",
+                   help=f"startup：超出 {INGEST_STARTUP_BUDGET}s 预算时返回非 0；"
+                        f"pipeline：按规模分阶段计时并与 {BENCH_DB_PATH} 中上次结果对比；"
+                        f"malformed：截断、超长行等异常文件任一解析超过 {MALFORMED_PARSE_SECONDS}s 时返回非 0")
+    p.add_argument("-n", "--repeat", type=int, default=5,
+                   help="startup 重复启动次数，取中位数，默认 5")
+    p.add_argument("--sizes", type=int, nargs="+", default=None,
+                   help=f"pipeline 的计算节点规模，默认 {' '.join(map(str, BENCH_SIZES))}")
+    p.add_argument("--label", default=None,
+                   help="pipeline 结果的标注（如版本号），随结果一起保存")
+    return parser.parse_args(argv)
+
+
+def measure_ingest_startup(repeat=5):
+    """
+    在子进程里运行 `ingest --help`（加载完整个脚本后即退出），返回每次耗时（秒，含解释器启动），
+    以及启动期间被导入的重量级依赖（用 -X importtime 检查）。
+    """
+    cmd = [os.path.abspath(__file__), "ingest", "--help"]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + cmd, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - started)
+
+    trace = subprocess.run([sys.executable, "-X", "importtime"] + cmd, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE, text=True, check=True).stderr
+    loaded = {line.rsplit("|", 1)[-1].strip() for line in trace.splitlines() if "|" in line}
+    heavy = [name for name in ("pandas", "numpy", "docx", "difflib") if name in loaded]
+    return timings, heavy
+
+def bench_command(args):
+    if args.target == "pipeline":
+        return 1 if bench_pipeline(args.sizes, args.label) else 0
+    if args.target == "malformed":
+        return 1 if bench_malformed() else 0
+
+    timings, heavy = measure_ingest_startup(args.repeat)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    print(f"ingest 启动耗时：中位数 {median:.3f}s，最快 {timings[0]:.3f}s（{len(timings)} 次，预算 {INGEST_STARTUP_BUDGET}s）")
+    if heavy:
+        print(f"⚠️ ingest 启动时导入了 {', '.join(heavy)}")
+    if median > INGEST_STARTUP_BUDGET or heavy:
+        print("❌ ingest 启动超出预算")
+        return 1
+    print("[✓] ingest 启动耗时在预算内")
+    return 0
+
+def query_command(args):
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库不存在：{DB_PATH}")
+        return 1
+    df = query_system_trend(args.system_name, DB_PATH)
+    if df.empty:
+        print(f"⚠️ 数据库中没有系统 {args.system_name} 的巡检记录")
+        return 1
+    print(df.to_string(index=False))
+    return 0
+
+
+def ingest_archives(args):
+    """登记压缩包、解析入库，并按保留策略清理历史批次"""
     initialize_project_directories()
-    get_zip_file_path()
-    print("== 自动化解压并写入数据库 ==")
-    extract_zip(ZIP_FILE_PATH, EXTRACT_FOLDER)
-    files = get_all_files(EXTRACT_FOLDER)
+    archives = resolve_archives(args.archives, args.yes)
+
     init_database(DB_PATH)
-    insert_files_to_db(DB_PATH, files, EXTRACT_FOLDER)
-    print("== 现在开始处理每个文件内容 ==")
-    process_each_file_from_db(DB_PATH)
-    print("== 现在开始巡检每个系统内容 ==")
-    inspection_mppsystem(DB_PATH)
-    print("== 所有步骤执行完毕 ✅ ==")
+    if INGEST_MODE == 'zip':
+        logger.info("== 直接读取压缩包并写入数据库 ==")
+    else:
+        logger.info("== 自动化解压并写入数据库 ==")
+        # 多个压缩包分别解压到各自的子目录，避免同名文件互相覆盖
+        if len(archives) > 1:
+            clear_folder(EXTRACT_FOLDER)
+    for archive in archives:
+        extract_to = EXTRACT_FOLDER
+        if len(archives) > 1:
+            extract_to = os.path.join(EXTRACT_FOLDER, Path(archive).stem)
+        register_archive(DB_PATH, archive, extract_to)
+
+    # 所有压缩包登记完后一起解析，共用一个写库会话和进程池
+    logger.info("== 现在开始处理每个文件内容 ==")
+    process_each_file_from_db(DB_PATH, workers=args.workers)
+    prune_inspection_runs(DB_PATH)
+
+def main(args=None):
+    args = args if args is not None else parse_args([])
+    if args.command == "query":
+        return query_command(args)
+    if args.command == "bench":
+        return bench_command(args)
+    if args.command == "watch":
+        return watch_command(args)
+
+    if args.profile:
+        enable_profiling()
+        # 剖析只在本进程内进行
+        args.workers = args.render_workers = 1
+        if args.command != "ingest":
+            import pandas, docx  # 预先导入，避免首个系统的诊断剖析结果被模块加载占满
+        logger.info(f"== 已开启性能剖析，解析和报告改为串行，结果写入 {PROFILE_DIR} ==")
+    try:
+        return run_command(args)
+    finally:
+        disable_profiling()
+
+def run_command(args):
+    if args.command in ("run", "ingest"):
+        ingest_archives(args)
+    if args.command == "run" and args.no_report:
+        logger.info("== 已指定 --no-report，跳过报告生成 ==")
+    elif args.command in ("run", "report"):
+        if not os.path.exists(DB_PATH):
+            logger.error(f"❌ 数据库不存在：{DB_PATH}，请先执行 ingest")
+            return 1
+        logger.info("== 现在开始巡检每个系统内容 ==")
+        inspection_mppsystem(DB_PATH, workers=args.render_workers)
+    logger.info("== 所有步骤执行完毕 ✅ ==")
 
     # # 显示所有列和行
     # pd.set_option('display.max_columns', None)  # 显示所有列
@@ -2411,9 +4269,15 @@ def main():
 
 if __name__ == '__main__':
     # main()
-    with open("output.txt", "w", encoding="utf-8") as f:
-        sys.stdout = f  # 重定向 print 到文件
-        main()
-        sys.stdout = sys.__stdout__  # 可选：恢复标准输出
+    args = parse_args()  # 先解析参数，--help 和参数错误直接显示在终端
+    # 常驻监视、查询和测量的输出直接显示在终端，其余写入日志文件
+    log_file = None if args.command in ("watch", "query", "bench") else (args.log_file or LOG_FILE)
+    setup_logging(args.log_level, log_file)
+    try:
+        code = main(args)
+    finally:
+        stop_logging()
 
-    print("✅ 所有输出已写入 output.txt")
\ No newline at end of file
+    if log_file:
+        print(f"✅ 所有输出已写入 {log_file}")
+    sys.exit(code)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "ZH-NDTY自动巡检.py"
+
+
+@pytest.fixture(scope="session")
+def inspection(tmp_path_factory):
+    """加载巡检脚本模块；模块导入时会创建输出目录，所以在临时目录里导入"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("import"))
+    try:
+        spec = importlib.util.spec_from_file_location("inspection", SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
+
+
+@pytest.fixture
+def db_path(inspection, tmp_path):
+    path = str(tmp_path / "files_info.db")
+    inspection.init_database(path, rebuild=True)
+    return path
+
+
+def write_archive(inspection, zip_path, reports, date="2025-04-25"):
+    """reports 为 {系统名: 对合成文本的修改函数或 None}，写成一个压缩包"""
+    import zipfile
+    with zipfile.ZipFile(zip_path, "w") as z:
+        for system_name, change in reports.items():
+            filename, text = inspection.generate_inspection_text(system_name, vc_count=1, nodes_per_vc=2, date=date)
+            z.writestr(filename, change(text) if change else text)
+    return str(zip_path)
+
+
+def drop_table_count(text):
+    """去掉「表的个数」子项，data_clusters 只剩 4 个计数"""
+    return text.replace("* 表的个数：\n", "", 1)
+
+
+def table_rows(db_path, sql, params=()):
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
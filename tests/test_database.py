@@ -0,0 +1,19 @@
+import sqlite3
+
+
+def test_rebuild_of_a_version_2_database_skips_the_migration(inspection, tmp_path):
+    path = str(tmp_path / "files_info.db")
+    inspection.init_database(path, rebuild=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+
+    inspection.init_database(path, rebuild=True)
+
+    conn = sqlite3.connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(machine_using)")]
+    conn.close()
+    assert version == inspection.SCHEMA_VERSION
+    assert columns.count("mem_total_bytes") == 1
@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import drop_table_count, table_rows, write_archive
+
+
+def systems_in(db_path, table):
+    return {name for (name,) in table_rows(db_path, f"SELECT DISTINCT system_name FROM {table}")}
+
+
+def test_malformed_report_does_not_stop_the_batch(inspection, db_path, tmp_path):
+    archive = write_archive(inspection, tmp_path / "202504巡检记录.zip", {"BAD": drop_table_count, "GOOD": None})
+    inspection.register_archive(db_path, archive, str(tmp_path / "unzipped"))
+
+    written = inspection.process_each_file_from_db(db_path)
+
+    assert written == {"BAD", "GOOD"}
+    assert systems_in(db_path, "data_clusters") == {"GOOD"}
+    assert "BAD" in systems_in(db_path, "machines")
+    hashed = {name for name, content_hash in table_rows(db_path, "SELECT system_name, content_hash FROM files")
+              if content_hash}
+    assert hashed == {"GOOD"}
+
+
+def test_missing_count_is_reported_when_building_rows(inspection):
+    _, text = inspection.generate_inspection_text("BAD", vc_count=1, nodes_per_vc=2)
+    _, _, error = inspection.parse_content(drop_table_count(text), "BAD")
+    assert "缺少「表的个数」" in error
+
+
+@pytest.mark.parametrize("granularity", ["file", "run"])
+def test_write_failure_rolls_back_only_that_file(inspection, db_path, tmp_path, granularity):
+    archive = write_archive(inspection, tmp_path / "202504巡检记录.zip", {"BAD": None, "GOOD": None})
+    inspection.register_archive(db_path, archive, str(tmp_path / "unzipped"))
+    rows = table_rows(db_path, "SELECT id, filename, fullpath, archive FROM files ORDER BY id")
+    results = [inspection.parse_file_job(row) for row in rows]
+    inspection.close_cached_zips()
+    # 参数个数与 SQL 不符的数据只在写库时才会失败
+    bad = next(result for result in results if result.system_name == "BAD")
+    bad.batch.executemany(inspection.insert_ignore_sql("data_clusters", ["system_name", "cluster_name"]), [("BAD",)])
+
+    with inspection.WriteSession(db_path, granularity) as session:
+        ingested = session.ingested_files()
+        written = {inspection.write_parsed_file(session, result, ingested) for result in results}
+
+    assert written == {"GOOD", None}
+    assert systems_in(db_path, "inspection_runs") == {"GOOD"}
+    assert systems_in(db_path, "machines") == {"GOOD"}
+    assert systems_in(db_path, "files") == {"GOOD"}
+
+
+def test_partially_parsed_report_is_not_rendered(inspection, db_path, tmp_path, monkeypatch):
+    archive = write_archive(inspection, tmp_path / "202504巡检记录.zip", {"BAD": drop_table_count, "GOOD": None})
+    inspection.register_archive(db_path, archive, str(tmp_path / "unzipped"))
+    inspection.process_each_file_from_db(db_path)
+    rendered = []
+    monkeypatch.setattr(inspection, "each_auto_inspection", lambda ctx: rendered.append(ctx.system_name))
+
+    inspection.inspection_mppsystem(db_path, workers=1)
+
+    assert "BAD" in systems_in(db_path, "sys_clusters")
+    assert rendered == ["GOOD"]
@@ -0,0 +1,39 @@
+def row_counts(batch):
+    counts = {}
+    for sql, rows in batch.statements:
+        table = sql.split(" INTO ")[1].split()[0]
+        counts[table] = counts.get(table, 0) + len(rows)
+    return counts
+
+
+def synthetic_text(inspection):
+    return inspection.generate_inspection_text("CUT", vc_count=2, nodes_per_vc=2)[1]
+
+
+def test_truncated_report_keeps_the_sections_before_the_cut(inspection):
+    text = synthetic_text(inspection)
+    cut = text[:text.index(" Data GBase Cluster Information 'vc2' ")]
+    _, batch, error = inspection.parse_content(cut, "cut")
+
+    counts = row_counts(batch)
+    assert counts["machines"] > 0 and counts["machine_using"] > 0
+    assert counts["clusters_disk_using"] == 3
+    assert error is not None and "IndexError" not in error
+
+
+def test_short_usage_row_names_the_section_and_node(inspection):
+    text = synthetic_text(inspection)
+    lines = text.split("\n")
+    start = lines.index("* SWAP使用情况：")
+    lines[start + 1] = lines[start + 1].split("Swap:")[0] + "Swap: 4.0G"
+    _, batch, error = inspection.parse_content("\n".join(lines), "short")
+
+    assert "Data Machine Information vc1 节点" in error and "应为 15" in error
+    assert "machines" not in row_counts(batch)
+    assert row_counts(batch)["data_clusters"] == 2
+
+
+def test_missing_disk_summary_names_the_keyword(inspection):
+    text = synthetic_text(inspection).replace("* 管理集群空间总使用率：", "* 其他：", 1)
+    _, _, error = inspection.parse_content(text, "disk")
+    assert "缺少「管理集群空间总使用率」" in error
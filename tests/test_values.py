@@ -0,0 +1,33 @@
+import math
+
+import pytest
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("8", 8.0),
+    ("2G", 2 * 1024 ** 3),
+    (" 4k ", 4096.0),
+    ("512MB", 512 * 1024 ** 2),
+    ("1.5T", 1.5 * 1024 ** 4),
+    ("10B", None),
+    ("1Gi", None),
+    ("on", None),
+])
+def test_parameter_values_accept_only_plain_numbers_and_unit_suffixes(inspection, text, expected):
+    assert inspection.smart_convert(text) == expected
+    series_value = inspection.parse_size_series([text], pattern=inspection.PARAM_VALUE_RE)[0]
+    if expected is None:
+        assert math.isnan(series_value)
+    else:
+        assert series_value == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("31Gi", 31 * 1024 ** 3),
+    ("0B", 0),
+    ("731M", 731 * 1024 ** 2),
+    ("4.0K", 4096),
+])
+def test_capacity_outputs_keep_the_free_and_df_forms(inspection, text, expected):
+    assert inspection.parse_size(text) == expected
+    assert inspection.parse_size_series([text])[0] == expected
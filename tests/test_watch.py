@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import drop_table_count, table_rows, write_archive
+
+
+@pytest.fixture
+def rendered(inspection, db_path, monkeypatch):
+    """watch 用临时库，报告生成只记录每次事件要重新生成的系统"""
+    calls = []
+    monkeypatch.setattr(inspection, "DB_PATH", db_path)
+    monkeypatch.setattr(inspection, "inspection_mppsystem", lambda db, workers=None, systems=None: calls.append(systems))
+    return calls
+
+
+def unfinished_files(db_path):
+    return {name for (name,) in table_rows(db_path, "SELECT system_name FROM files WHERE content_hash IS NULL")}
+
+
+def test_malformed_archive_is_not_reprocessed_by_later_events(inspection, db_path, tmp_path, rendered):
+    bad = write_archive(inspection, tmp_path / "202505巡检记录.zip", {"BAD": drop_table_count}, date="2025-05-25")
+    good = write_archive(inspection, tmp_path / "202506巡检记录.zip", {"GOOD": None}, date="2025-06-25")
+
+    with inspection.WriteSession(db_path, 'file') as session:
+        inspection.ingest_watched_archives(session, [bad])
+        inspection.ingest_watched_archives(session, [good])
+
+    assert rendered == [{"BAD"}, {"GOOD"}]
+
+
+def test_failed_event_does_not_wedge_the_watcher(inspection, db_path, tmp_path, rendered, monkeypatch):
+    bad = write_archive(inspection, tmp_path / "202505巡检记录.zip", {"BAD": None}, date="2025-05-25")
+    good = write_archive(inspection, tmp_path / "202506巡检记录.zip", {"GOOD": None}, date="2025-06-25")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("模拟入库失败")
+
+    with inspection.WriteSession(db_path, 'file') as session:
+        with monkeypatch.context() as patch:
+            patch.setattr(inspection, "process_each_file_from_db", fail)
+            with pytest.raises(RuntimeError):
+                inspection.ingest_watched_archives(session, [bad])
+        assert unfinished_files(db_path) == set()
+
+        inspection.ingest_watched_archives(session, [good])
+
+    assert rendered == [{"GOOD"}]
+    assert {name for (name,) in table_rows(db_path, "SELECT system_name FROM inspection_runs")} == {"GOOD"}